@@ -1,19 +1,39 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 
+import array
 import ast
+import base64
+import bisect
+import codecs
+import collections
+import csv
 import datetime
+import importlib
+import io
 import logging
 import os
+import random
 import re
 import socket
+import struct
 import time
+import zlib
+from concurrent import futures
 # We can remove ExpatError when we drop support for Python 2.6:
 from xml.parsers.expat import ExpatError
 
-from tornado import gen, httpclient
+from tornado import gen, httpclient, locks
 from tornado import ioloop as ioloop_module
 from tornado import log as tornado_log
+from tornado import simple_httpclient
+from tornado.concurrent import Future
+
+try:
+    # Needs pycurl.
+    from tornado import curl_httpclient
+except ImportError:
+    curl_httpclient = None
 
 try:
     from xml.etree import ElementTree as ET
@@ -46,6 +66,14 @@ except ImportError:
     # Python 2.X
     import htmlentitydefs as htmlentities
 
+try:
+    # Python 3.5+
+    from builtins import StopAsyncIteration
+except ImportError:
+    # Older Pythons don't have asynchronous iterators, so this is never raised.
+    class StopAsyncIteration(Exception):
+        pass
+
 try:
     # Python 2.X
     unicode_char = unichr
@@ -63,6 +91,17 @@ def get_version():
     return "%s.%s.%s" % __version__[:3]
 
 
+_XML_CONTENT_TYPE = 'text/xml; charset=utf-8'
+_JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+# How many bytes Solr.add_stream() buffers before writing them to the connection.
+_STREAM_CHUNK_SIZE = 65536
+
+# Shared encoder for JSON update messages. Solr accepts raw UTF-8, so we skip the \uXXXX escapes.
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+# for LazyResults and _DocStreamParser, which need raw_decode()
+_JSON_DECODER = json.JSONDecoder()
+
 DATETIME_REGEX = re.compile(r'^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})T(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2})(\.\d+)?Z$')
 
 
@@ -182,6 +221,14 @@ def safe_urlencode(params, doseq=0):
     return urlencode(new_params, doseq)
 
 
+def _handler_name(path):
+    """
+    Returns the name of the request handler in a path for :meth:`Solr._send_request`, like
+    ``'select'`` for ``'select/?q=*:*'``.
+    """
+    return path.lstrip('/').split('?', 1)[0].split('/', 1)[0]
+
+
 def is_valid_xml_char_ordinal(i):
     """
     Defines whether char is valid to use in xml document
@@ -198,6 +245,22 @@ def is_valid_xml_char_ordinal(i):
         )
 
 
+# the characters that is_valid_xml_char_ordinal() rejects, for str.translate()
+_XML_INVALID_CHARS = dict.fromkeys(i for i in list(range(0x20)) + list(range(0xD800, 0xE000)) + [0xFFFE, 0xFFFF]
+                                   if not is_valid_xml_char_ordinal(i))
+
+# For Solr._write_xml_add(), which removes the invalid characters and escapes the text like
+# ElementTree in one pass.
+_XML_TEXT_TABLE = dict(_XML_INVALID_CHARS)
+_XML_TEXT_TABLE.update({ord('&'): '&amp;', ord('<'): '&lt;', ord('>'): '&gt;'})
+
+# For text from an overridden Solr._from_python(), which may have any characters. ElementTree writes
+# surrogates as character references, then sanitize() removes the control characters.
+_XML_ANY_TEXT_TABLE = dict.fromkeys(i for i in range(0x20) if i not in (0x9, 0xA, 0xD))
+_XML_ANY_TEXT_TABLE.update((i, '&#{};'.format(i)) for i in range(0xD800, 0xE000))
+_XML_ANY_TEXT_TABLE.update({ord('&'): '&amp;', ord('<'): '&lt;', ord('>'): '&gt;'})
+
+
 def clean_xml_string(s):
     """
     Cleans string from invalid xml chars
@@ -206,11 +269,932 @@ def clean_xml_string(s):
 
     http://stackoverflow.com/questions/8733233/filtering-out-certain-bytes-in-python
     """
-    return ''.join(c for c in s if is_valid_xml_char_ordinal(ord(c)))
+    return s.translate(_XML_INVALID_CHARS)
+
+
+_XML_TAGS = {}  # (tag, attributes) to (start tag, empty element), for _xml_tags()
+_XML_TAGS_MAX = 10000
+
+
+def _xml_tags(tag, attrs):
+    """
+    Returns the start tag and the empty element for an XML element with the attributes in the
+    ``attrs`` dictionary, exactly as ElementTree and :func:`sanitize` write them. They're cached, so
+    we only ask ElementTree once for every field.
+    """
+    key = (tag,) + tuple(attrs.items())
+    try:
+        return _XML_TAGS[key]
+    except KeyError:
+        pass
+
+    elem = ET.Element(tag, **attrs)
+    empty = force_unicode(_sanitize_bytes(ET.tostring(elem, encoding='utf-8')))
+    elem.text = 'x'
+    full = force_unicode(_sanitize_bytes(ET.tostring(elem, encoding='utf-8')))
+    tags = (full[:-len('x</{}>'.format(tag))], empty)
+    if len(_XML_TAGS) >= _XML_TAGS_MAX:
+        _XML_TAGS.clear()
+    _XML_TAGS[key] = tags
+    return tags
+
+
+def _xml_text(value):
+    """
+    Returns the escaped XML text for a field ``value``, like the text that
+    :meth:`Solr._from_python` returns after ElementTree and :func:`sanitize`.
+    """
+    if type(value) is str:
+        return value.translate(_XML_TEXT_TABLE)
+
+    if hasattr(value, 'strftime'):
+        if hasattr(value, 'hour'):
+            value = "%sZ" % value.isoformat()
+        else:
+            value = "%sT00:00:00Z" % value.isoformat()
+    elif isinstance(value, bool):
+        value = 'true' if value else 'false'
+    else:
+        if isinstance(value, bytes):
+            value = str(value, errors='replace')
+        value = "{0}".format(value)
+    return value.translate(_XML_TEXT_TABLE)
+
+
+def _parse_datetime(value):
+    """
+    Parses a date as Solr writes it, like ``'2016-01-02T03:04:05.678Z'``, into a timezone-aware UTC
+    :class:`datetime.datetime`, keeping the fractional seconds. Returns anything else unchanged.
+    """
+    try:
+        if value[-1] == 'Z' and value[10] == 'T':
+            microsecond = 0
+            if len(value) > 20 and value[19] == '.':
+                microsecond = int(value[20:-1][:6].ljust(6, '0'))
+            elif len(value) != 20:
+                return value
+            return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]),
+                                     int(value[14:16]), int(value[17:19]), microsecond, datetime.timezone.utc)
+    except (IndexError, TypeError, ValueError):
+        pass
+    return value
+
+
+def _convert_int(value):
+    return value if type(value) is int else int(value)
+
+
+def _convert_float(value):
+    return value if type(value) is float else float(value)
+
+
+def _convert_bool(value):
+    return value if value is True or value is False else value == 'true'
+
+
+def _convert_date(value):
+    return _parse_datetime(value) if isinstance(value, str) else value
 
 
 class SolrError(Exception):
-    pass
+    """
+    Raised when a request to Solr fails.
+
+    The ``code`` attribute holds the HTTP status code, or ``599`` if there was no response at all,
+    or ``None`` if the request never reached the network.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.code = kwargs.pop('code', None)
+        super(SolrError, self).__init__(*args, **kwargs)
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed requests :class:`Solr` retries, and how long it waits before each retry.
+
+    A request is retried if it failed with one of the ``statuses``, it may be repeated safely
+    (either its method is one of ``methods`` or its handler is one of ``handlers``), it hasn't
+    used up ``max_attempts``, and there's enough retry budget left.
+
+    Optionally accepts ``max_attempts``, the most times to try a request, including the first
+    time. Default is ``3``.
+
+    Optionally accepts ``backoff`` and ``max_backoff``. The wait before the n-th retry is chosen at
+    random between zero and ``backoff * 2 ** (n - 1)`` seconds, but never more than
+    ``max_backoff``. Defaults are ``0.1`` and ``2.0``. Pass ``jitter=False`` to always wait the
+    longest time instead of a random time.
+
+    Optionally accepts ``statuses``, the HTTP status codes worth retrying. ``599`` means there was
+    no response, as with timeouts and refused connections. Default is ``(502, 503, 504, 599)``.
+
+    Optionally accepts ``methods`` and ``handlers``, the HTTP methods and Solr request handlers
+    that are safe to repeat. Defaults are ``('GET', 'HEAD')`` and ``('select', 'mlt', 'terms')``,
+    so reads are retried but updates aren't.
+
+    Optionally accepts ``budget`` and ``max_budget``. Every request adds ``budget`` to the retry
+    budget, up to ``max_budget``, and every retry uses one. This limits retries to a fraction of
+    all requests, so an outage doesn't turn into a retry storm. Defaults are ``0.2`` and ``10``.
+
+    The ``retries`` attribute counts the retries, and ``exhausted`` counts the failed requests
+    that weren't retried because the budget ran out. One policy may be shared by several
+    :class:`Solr` instances, which then share a budget.
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=2.0, jitter=True, statuses=None,
+                 methods=None, handlers=None, budget=0.2, max_budget=10):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses or (502, 503, 504, 599))
+        self.methods = frozenset(methods or ('GET', 'HEAD'))
+        self.handlers = frozenset(handlers or ('select', 'mlt', 'terms'))
+        self.budget = budget
+        self.max_budget = max_budget
+        self.retries = 0
+        self.exhausted = 0
+        self._tokens = float(max_budget)
+
+    def stats(self):
+        "Returns a dictionary with the ``retries`` and ``exhausted`` counters, and the budget left."
+        return {'retries': self.retries, 'exhausted': self.exhausted, 'budget': self._tokens}
+
+    def record_request(self):
+        "Called for every request, to top up the retry budget."
+        self._tokens = min(self._tokens + self.budget, self.max_budget)
+
+    def retry_delay(self, method, path, error, attempt):
+        """
+        Returns how many seconds to wait before retrying a request that failed with ``error`` on
+        its ``attempt``-th try, or ``None`` if the request shouldn't be retried.
+        """
+        if attempt >= self.max_attempts or error.code not in self.statuses:
+            return None
+        if method not in self.methods and _handler_name(path) not in self.handlers:
+            return None
+        if self._tokens < 1:
+            self.exhausted += 1
+            return None
+
+        self._tokens -= 1
+        self.retries += 1
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+class HedgePolicy(object):
+    """
+    Decides when :class:`Solr` sends a duplicate ("hedged") read request, to cut the tail latency
+    caused by an occasional slow Solr node.
+
+    If a request to one of the ``handlers`` hasn't finished after a delay, we send the same request
+    again, to another node if there is one (see :class:`SolrPool`), and use whichever response
+    arrives first. Tornado can't abort a request once it's sent, so the slower request runs to the
+    end in the background and its response is thrown away.
+
+    Optionally accepts ``delay``, the seconds to wait before hedging. Default is ``0.1``.
+
+    Optionally accepts ``percentile``. If given, the delay is instead this percentile of the
+    latencies of the last ``window`` requests, like ``95`` for the p95 latency. We use ``delay``
+    until there are at least ten latencies. Default ``window`` is ``100``.
+
+    Optionally accepts ``handlers``, the read-only Solr request handlers that may be hedged.
+    Default is ``('select', 'mlt', 'terms')``.
+
+    Optionally accepts ``budget`` and ``max_budget``, which limit the hedged requests to a
+    fraction of all requests, like the retry budget of :class:`RetryPolicy`. Defaults are
+    ``0.05`` and ``10``.
+
+    The ``hedges`` attribute counts the hedged requests, and ``wins`` counts those that finished
+    before the original request.
+    """
+
+    MIN_SAMPLES = 10
+
+    def __init__(self, delay=0.1, percentile=None, window=100, handlers=None, budget=0.05, max_budget=10):
+        self.delay = delay
+        self.percentile = percentile
+        self.handlers = frozenset(handlers or ('select', 'mlt', 'terms'))
+        self.budget = budget
+        self.max_budget = max_budget
+        self.hedges = 0
+        self.wins = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._tokens = float(max_budget)
+
+    def stats(self):
+        "Returns a dictionary with the ``hedges`` and ``wins`` counters, and the current delay."
+        return {'hedges': self.hedges, 'wins': self.wins, 'delay': self.hedge_delay()}
+
+    def applies_to(self, path):
+        "Whether requests to this path may be hedged."
+        return _handler_name(path) in self.handlers
+
+    def hedge_delay(self):
+        "Returns how many seconds to wait for a response before sending the hedged request."
+        if self.percentile is None or len(self._latencies) < HedgePolicy.MIN_SAMPLES:
+            return self.delay
+        latencies = sorted(self._latencies)
+        index = min(int(len(latencies) * self.percentile / 100.0), len(latencies) - 1)
+        return latencies[index]
+
+    def record_latency(self, seconds):
+        "Called with the latency of every successful request that may be hedged."
+        self._latencies.append(seconds)
+        self._tokens = min(self._tokens + self.budget, self.max_budget)
+
+    def take(self):
+        "Returns whether there's budget for one more hedged request, and uses it if so."
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self.hedges += 1
+        return True
+
+
+class ResponseCache(object):
+    """
+    An in-memory cache of decoded Solr responses, for :class:`Solr` to skip repeated queries.
+
+    Entries are keyed on the request handler and the URL-encoded query parameters, and hold the
+    decoded response. Cached responses are shared by every caller that gets them, so treat the
+    :class:`Results` of a cached query as read-only.
+
+    Optionally accepts ``max_entries``, the most responses to keep. Default is ``1000``.
+
+    Optionally accepts ``max_bytes``, the most response bytes to keep, as measured before
+    decoding. Default is ``None``, for no limit.
+
+    Optionally accepts ``ttl``, the seconds a response stays valid. Default is ``60``. Use
+    ``None`` to keep responses until they're evicted.
+
+    When the cache is full, the least recently used responses are evicted. The ``hits``,
+    ``misses``, and ``evictions`` attributes count what happened so far.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None, ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0  # in bytes
+        self._entries = collections.OrderedDict()  # key to (value, size, expiry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        "Returns a dictionary with the counters, and the number and size of the entries."
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'bytes': self.size}
+
+    def get(self, key):
+        "Returns the value cached for ``key``, or ``None`` if it's missing or expired."
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.time():
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, value, size):
+        "Caches ``value`` for ``key``. The ``size`` in bytes counts toward ``max_bytes``."
+        if key in self._entries:
+            self._remove(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        expiry = None if self.ttl is None else time.time() + self.ttl
+        self._entries[key] = (value, size, expiry)
+        self.size += size
+
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        "Removes every entry."
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[1]
+
+
+class SchemaConverter(object):
+    """
+    Converts the field values in Solr documents to Python types, according to the Solr schema.
+    Get one with :meth:`Solr.load_schema`.
+
+    Integer, floating-point, boolean, and date fields become ``int``, ``float``, ``bool``, and
+    timezone-aware UTC :class:`datetime.datetime` values, and multivalued fields become lists of
+    those. All other fields, and fields that aren't in the schema, are left alone, so unlike
+    :meth:`Solr._to_python`, a string field that looks like a number stays a string.
+
+    Requires the ``fields``, ``fieldTypes``, and ``dynamicFields`` lists from the Schema API.
+    """
+
+    # the last part of Solr's field type classes
+    TYPE_CONVERTERS = {
+        'IntPointField': _convert_int, 'TrieIntField': _convert_int, 'IntField': _convert_int,
+        'LongPointField': _convert_int, 'TrieLongField': _convert_int, 'LongField': _convert_int,
+        'FloatPointField': _convert_float, 'TrieFloatField': _convert_float, 'FloatField': _convert_float,
+        'DoublePointField': _convert_float, 'TrieDoubleField': _convert_float, 'DoubleField': _convert_float,
+        'BoolField': _convert_bool,
+        'DatePointField': _convert_date, 'TrieDateField': _convert_date, 'DateField': _convert_date,
+    }
+
+    def __init__(self, fields, field_types, dynamic_fields=()):
+        types = {}
+        for field_type in field_types:
+            types[field_type['name']] = field_type
+
+        self._converters = {}  # field name to converter, or None for no conversion
+        self._multi_valued = {}  # field name to whether it's multivalued
+        for field in fields:
+            self._converters[field['name']] = self._make_converter(field, types)
+            self._multi_valued[field['name']] = self._is_multi_valued(field, types)
+
+        # Solr matches the longest dynamic field pattern first
+        self._dynamic = []  # (prefix, suffix, converter, multivalued)
+        for field in sorted(dynamic_fields, key=lambda field: len(field['name']), reverse=True):
+            pattern = field['name']
+            prefix, suffix = ('', pattern[1:]) if pattern.startswith('*') else (pattern[:-1], '')
+            self._dynamic.append((prefix, suffix, self._make_converter(field, types),
+                                  self._is_multi_valued(field, types)))
+
+    @staticmethod
+    def _is_multi_valued(field, types):
+        return field.get('multiValued', types.get(field.get('type'), {}).get('multiValued', False))
+
+    @staticmethod
+    def _make_converter(field, types):
+        field_type = types.get(field.get('type'), {})
+        converter = SchemaConverter.TYPE_CONVERTERS.get(field_type.get('class', '').rsplit('.', 1)[-1])
+        if converter is None:
+            return None
+
+        if not SchemaConverter._is_multi_valued(field, types):
+            return converter
+
+        def convert_list(values):
+            if isinstance(values, list):
+                return [converter(value) for value in values]
+            return converter(values)
+
+        return convert_list
+
+    def converter(self, name):
+        "Returns the function that converts the values of field ``name``, or ``None`` if there isn't one."
+        try:
+            return self._converters[name]
+        except KeyError:
+            self._match_dynamic(name)
+            return self._converters[name]
+
+    def multi_valued(self, name):
+        "Returns whether the field ``name`` is multivalued."
+        try:
+            return self._multi_valued[name]
+        except KeyError:
+            self._match_dynamic(name)
+            return self._multi_valued[name]
+
+    def _match_dynamic(self, name):
+        converter, multi_valued = None, False
+        for prefix, suffix, dynamic_converter, dynamic_multi_valued in self._dynamic:
+            if name.startswith(prefix) and name.endswith(suffix):
+                converter, multi_valued = dynamic_converter, dynamic_multi_valued
+                break
+        self._converters[name] = converter
+        self._multi_valued[name] = multi_valued
+
+    def convert_value(self, name, value):
+        "Returns ``value`` of the field ``name``, converted."
+        converter = self.converter(name)
+        return value if converter is None else converter(value)
+
+    def convert_docs(self, docs):
+        "Converts the values in a list of documents, in place."
+        converters = self._converters
+        for doc in docs:
+            for name, value in doc.items():
+                converter = converters[name] if name in converters else self.converter(name)
+                if converter is not None:
+                    doc[name] = converter(value)
+
+    def convert_response(self, decoded):
+        "Converts the values in the documents of a decoded Solr response, in place."
+        docs = (decoded.get('response') or {}).get('docs')
+        if docs:
+            self.convert_docs(docs)
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# the array typecode and NumPy dtype for every kind of Column, except "object"
+_COLUMN_TYPES = {'int': ('q', 'int64'), 'float': ('d', 'float64'), 'bool': ('b', 'int8'),
+                 'datetime': ('q', 'int64')}
+
+
+class Column(object):
+    """
+    The values of one field in many documents, from :meth:`Results.to_columns`.
+
+    - ``kind`` is ``'int'``, ``'float'``, ``'bool'``, ``'datetime'``, or ``'object'`` (for
+      strings, and fields with mixed types).
+    - ``values`` holds the values. For every kind but ``'object'``, this is an :class:`array.array`
+      (or a NumPy array), and dates are microseconds since 1970-01-01 UTC. Otherwise, it's a list.
+    - ``valid`` is ``None`` if every document has this field. Otherwise it's a :class:`bytearray`
+      (or a NumPy boolean array) with ``1`` for the documents that have it, and the other documents
+      have ``0`` (or ``None``) in ``values``.
+    - ``offsets`` is ``None``, except for multivalued fields. Then the values of document ``i``
+      are ``values[offsets[i]:offsets[i + 1]]``.
+
+    Indexing a column returns the value for that document as it was in the document, like
+    ``column[0]``. Use :meth:`to_list` to get them all.
+    """
+
+    __slots__ = ('kind', 'values', 'valid', 'offsets')
+
+    def __init__(self, kind, values, valid=None, offsets=None):
+        self.kind = kind
+        self.values = values
+        self.valid = valid
+        self.offsets = offsets
+
+    def __len__(self):
+        if self.offsets is not None:
+            return len(self.offsets) - 1
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if self.valid is not None and not self.valid[i]:
+            return None
+        if self.offsets is None:
+            return self._to_python(self.values[i])
+        return [self._to_python(value) for value in self.values[self.offsets[i]:self.offsets[i + 1]]]
+
+    def to_list(self):
+        "Returns the values as a list, with ``None`` for documents without the field."
+        return [self[i] for i in range(len(self))]
+
+    def _to_python(self, value):
+        if self.kind == 'object':
+            return value
+        if hasattr(value, 'item'):
+            # a NumPy scalar
+            value = value.astype('int64').item() if self.kind == 'datetime' else value.item()
+        if self.kind == 'datetime':
+            return _EPOCH + value * _ONE_MICROSECOND
+        elif self.kind == 'bool':
+            return bool(value)
+        return value
+
+
+def _column_kind(values):
+    "Returns the Column kind that suits all these values."
+    kind = None
+    for value in values:
+        value_type = type(value)
+        if value_type is bool:
+            this_kind = 'bool'
+        elif value_type is int:
+            this_kind = 'int'
+        elif value_type is float:
+            this_kind = 'float'
+        elif isinstance(value, datetime.datetime):
+            this_kind = 'datetime'
+        else:
+            return 'object'
+
+        if kind is None or kind == this_kind:
+            kind = this_kind
+        elif (kind == 'int' and this_kind == 'float') or (kind == 'float' and this_kind == 'int'):
+            kind = 'float'
+        else:
+            return 'object'
+    return kind or 'object'
+
+
+def _make_column(raw, numpy=None):
+    """
+    Builds a Column from a list with the value (or list of values, or None) of every document.
+    With the ``numpy`` module, the arrays are NumPy arrays.
+    """
+    valid = None
+    offsets = None
+    if None in raw:
+        valid = bytearray(value is not None for value in raw)
+
+    if any(isinstance(value, list) for value in raw):
+        offsets = array.array('q', [0])
+        values = []
+        for value in raw:
+            if isinstance(value, list):
+                values.extend(value)
+            elif value is not None:
+                values.append(value)
+            offsets.append(len(values))
+        kind = _column_kind(values)
+    else:
+        kind = _column_kind(value for value in raw if value is not None)
+        values = raw
+
+    if kind != 'object':
+        plain = values
+        if kind == 'datetime':
+            values = [0 if value is None else _datetime_micros(value) for value in values]
+        elif valid is not None and offsets is None:
+            values = [0 if value is None else value for value in values]
+        try:
+            values = array.array(_COLUMN_TYPES[kind][0], values)
+        except OverflowError:
+            # integers too big for 64 bits
+            kind = 'object'
+            values = plain
+
+    if numpy is not None:
+        if kind != 'object':
+            values = numpy.frombuffer(values, dtype=_COLUMN_TYPES[kind][1])
+            if kind == 'bool':
+                values = values.astype(bool)
+            elif kind == 'datetime':
+                values = values.view('datetime64[us]')
+        if valid is not None:
+            valid = numpy.frombuffer(valid, dtype='uint8').astype(bool)
+        if offsets is not None:
+            offsets = numpy.frombuffer(offsets, dtype='int64')
+
+    return Column(kind, values, valid, offsets)
+
+
+def _datetime_micros(value):
+    "Microseconds since the epoch. Naive datetimes are taken to be UTC."
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+
+def _to_columns(docs, fields, use_numpy=False):
+    "Implements :meth:`Results.to_columns` for any iterable of documents."
+    numpy = None
+    if use_numpy:
+        # imported here, since it's slow to import and most callers never need it
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('to_columns(use_numpy=True) requires NumPy')
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',')]
+
+    raw = [[] for _ in fields]
+    for doc in docs:
+        get = doc.get
+        for column, field in zip(raw, fields):
+            column.append(get(field))
+
+    return collections.OrderedDict((field, _make_column(column, numpy)) for field, column in zip(fields, raw))
+
+
+_END = object()  # the end of a javabin iterator
+_JAVABIN_FLOAT = struct.Struct('>f')
+
+
+def _shortest_float32(value):
+    "Returns the shortest decimal with the same single-precision value, as Solr writes floats in JSON."
+    if value != value:
+        return value
+    packed = _JAVABIN_FLOAT.pack(value)
+    for digits in (6, 7, 8):
+        candidate = float('%.*g' % (digits, value))
+        if _JAVABIN_FLOAT.pack(candidate) == packed:
+            return candidate
+    return value
+
+
+class JavabinDecoder(object):
+    """
+    Decodes responses in Solr's binary "javabin" format (``wt=javabin``) into the same structures
+    as JSON responses, so :class:`Results` can't tell the difference.
+
+    Like the JSON response writer with the default ``json.nl=flat``, named lists become flat lists
+    of names and values, ordered maps become dictionaries, and dates become ISO 8601 strings.
+
+    Usage::
+
+        decoded = JavabinDecoder().decode(body)
+    """
+
+    VERSION = 2
+
+    # the tags that are the whole byte
+    NULL, BOOL_TRUE, BOOL_FALSE, BYTE, SHORT, DOUBLE, INT, LONG, FLOAT, DATE, MAP, SOLRDOC, SOLRDOCLST, \
+        BYTEARR, ITERATOR, END, SOLRINPUTDOC, MAP_ENTRY_ITER, ENUM_FIELD_VALUE, MAP_ENTRY = range(20)
+    # the tags in the first three bits, with a size or value in the rest
+    STR, SINT, SLONG, ARR, ORDERED_MAP, NAMED_LST, EXTERN_STRING = range(1, 8)
+
+    _BYTE = struct.Struct('>b')
+    _SHORT = struct.Struct('>h')
+    _INT = struct.Struct('>i')
+    _LONG = struct.Struct('>q')
+    _DOUBLE = struct.Struct('>d')
+
+    def __init__(self):
+        self._data = b''
+        self._pos = 0
+        self._strings = []  # for EXTERN_STRING
+
+    def decode(self, data):
+        "Returns the decoded ``data``. Raises :exc:`ValueError` if it isn't a javabin response."
+        if not data or bytearray(data[:1])[0] != JavabinDecoder.VERSION:
+            raise ValueError('Not a javabin response')
+        self._data = bytes(data)
+        self._pos = 1
+        self._strings = []
+        try:
+            decoded = self._read()
+        except (IndexError, KeyError, struct.error, UnicodeDecodeError) as exc:
+            raise ValueError('Invalid javabin response: {!r}'.format(exc))
+
+        if isinstance(decoded, list):
+            # the response is a named list, but the JSON writer always makes it an object
+            decoded = dict(zip(decoded[0::2], decoded[1::2]))
+        return decoded
+
+    def _read(self):
+        tag = self._data[self._pos]
+        self._pos += 1
+        if tag >> 5:
+            return JavabinDecoder._TAG_AND_SIZE[tag >> 5](self, tag)
+        return JavabinDecoder._TAGS[tag](self)
+
+    def _vint(self):
+        data = self._data
+        byte = data[self._pos]
+        self._pos += 1
+        value = byte & 0x7f
+        shift = 7
+        while byte & 0x80:
+            byte = data[self._pos]
+            self._pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        return value
+
+    def _size(self, tag):
+        size = tag & 0x1f
+        if size == 0x1f:
+            size += self._vint()
+        return size
+
+    def _unpack(self, unpacker):
+        value = unpacker.unpack_from(self._data, self._pos)[0]
+        self._pos += unpacker.size
+        return value
+
+    def _read_str(self, tag):
+        size = self._size(tag)
+        start = self._pos
+        self._pos += size
+        if self._pos > len(self._data):
+            raise IndexError('string runs past the end of the response')
+        return self._data[start:self._pos].decode('utf-8')
+
+    def _read_small_int(self, tag):
+        value = tag & 0x0f
+        if tag & 0x10:
+            value |= self._vint() << 4
+        return value
+
+    def _read_array(self, tag):
+        return [self._read() for _ in range(self._size(tag))]
+
+    def _read_ordered_map(self, tag):
+        result = {}
+        for _ in range(self._size(tag)):
+            key = self._read()
+            result[key] = self._read()
+        return result
+
+    def _read_named_list(self, tag):
+        result = []
+        for _ in range(self._size(tag)):
+            result.append(self._read())
+            result.append(self._read())
+        return result
+
+    def _read_extern_string(self, tag):
+        index = self._size(tag)
+        if index:
+            return self._strings[index - 1]
+        value = self._read()
+        self._strings.append(value)
+        return value
+
+    def _read_null(self):
+        return None
+
+    def _read_true(self):
+        return True
+
+    def _read_false(self):
+        return False
+
+    def _read_end(self):
+        return _END
+
+    def _read_byte(self):
+        return self._unpack(JavabinDecoder._BYTE)
+
+    def _read_short(self):
+        return self._unpack(JavabinDecoder._SHORT)
+
+    def _read_int(self):
+        return self._unpack(JavabinDecoder._INT)
+
+    def _read_long(self):
+        return self._unpack(JavabinDecoder._LONG)
+
+    def _read_double(self):
+        return self._unpack(JavabinDecoder._DOUBLE)
+
+    def _read_float(self):
+        return _shortest_float32(self._unpack(_JAVABIN_FLOAT))
+
+    def _read_date(self):
+        millis = self._unpack(JavabinDecoder._LONG)
+        try:
+            value = _EPOCH + datetime.timedelta(milliseconds=millis)
+        except OverflowError:
+            # Solr allows years that datetime doesn't, like 0 and 10000
+            raise ValueError('Date out of range: {} ms since the epoch'.format(millis))
+        text = '%04d-%02d-%02dT%02d:%02d:%02d' % (value.year, value.month, value.day, value.hour,
+                                                   value.minute, value.second)
+        if millis % 1000:
+            text += '.%03d' % (millis % 1000)
+        return text + 'Z'
+
+    def _read_map(self):
+        result = {}
+        for _ in range(self._vint()):
+            key = self._read()
+            result[key] = self._read()
+        return result
+
+    def _read_solr_doc(self):
+        tag = self._data[self._pos]
+        self._pos += 1
+        doc = {}
+        for _ in range(self._size(tag)):
+            name = self._read()
+            if isinstance(name, dict):
+                # a child document
+                doc.setdefault('_childDocuments_', []).append(name)
+            else:
+                doc[name] = self._read()
+        return doc
+
+    def _read_solr_doc_list(self):
+        meta = self._read()
+        result = {'numFound': meta[0], 'start': meta[1]}
+        if meta[2] is not None:
+            result['maxScore'] = meta[2]
+        if len(meta) > 3:
+            result['numFoundExact'] = meta[3]
+        result['docs'] = self._read()
+        return result
+
+    def _read_byte_array(self):
+        size = self._vint()
+        start = self._pos
+        self._pos += size
+        if self._pos > len(self._data):
+            raise IndexError('byte array runs past the end of the response')
+        # like the JSON writer
+        return base64.b64encode(self._data[start:self._pos]).decode('ascii')
+
+    def _read_iterator(self):
+        result = []
+        while True:
+            value = self._read()
+            if value is _END:
+                return result
+            result.append(value)
+
+    def _read_map_entry_iter(self):
+        result = {}
+        while True:
+            key = self._read()
+            if key is _END:
+                return result
+            result[key] = self._read()
+
+    def _read_enum(self):
+        self._read()  # the number
+        return self._read()
+
+    def _read_map_entry(self):
+        key = self._read()
+        return {key: self._read()}
+
+    def _unsupported(self):
+        raise ValueError('Unsupported javabin tag {}'.format(self._data[self._pos - 1]))
+
+
+JavabinDecoder._TAGS = [
+    JavabinDecoder._read_null,
+    JavabinDecoder._read_true,
+    JavabinDecoder._read_false,
+    JavabinDecoder._read_byte,
+    JavabinDecoder._read_short,
+    JavabinDecoder._read_double,
+    JavabinDecoder._read_int,
+    JavabinDecoder._read_long,
+    JavabinDecoder._read_float,
+    JavabinDecoder._read_date,
+    JavabinDecoder._read_map,
+    JavabinDecoder._read_solr_doc,
+    JavabinDecoder._read_solr_doc_list,
+    JavabinDecoder._read_byte_array,
+    JavabinDecoder._read_iterator,
+    JavabinDecoder._read_end,
+    JavabinDecoder._unsupported,  # SOLRINPUTDOC only appears in update requests
+    JavabinDecoder._read_map_entry_iter,
+    JavabinDecoder._read_enum,
+    JavabinDecoder._read_map_entry,
+] + [JavabinDecoder._unsupported] * 12
+JavabinDecoder._TAG_AND_SIZE = [
+    None,
+    JavabinDecoder._read_str,
+    JavabinDecoder._read_small_int,
+    JavabinDecoder._read_small_int,  # SLONG is the same, but Python doesn't care how long it is
+    JavabinDecoder._read_array,
+    JavabinDecoder._read_ordered_map,
+    JavabinDecoder._read_named_list,
+    JavabinDecoder._read_extern_string,
+]
+
+
+class BytesJSONDecoder(object):
+    """
+    A JSON decoder that parses the response bytes from Solr directly, with a fast JSON library.
+    Pass it as ``Solr(decoder=...)``, or pass the name of the ``backend`` as the ``decoder``.
+
+    The ``backend`` is one of ``'orjson'``, ``'ujson'``, ``'simplejson'``, ``'json'``, or
+    ``'auto'`` (the default) for the first of those that's installed. Only orjson and ujson parse
+    bytes without decoding them to a Unicode string first; with the others, this saves nothing
+    but still works.
+
+    Any decoder with an ``accepts_bytes`` attribute that's ``True`` gets bytes from :class:`Solr`
+    instead of Unicode strings. Its :meth:`decode` must accept both.
+    """
+
+    BACKENDS = ('orjson', 'ujson', 'simplejson', 'json')
+    accepts_bytes = True
+
+    def __init__(self, backend='auto'):
+        if backend == 'auto':
+            for backend in BytesJSONDecoder.BACKENDS:
+                try:
+                    importlib.import_module(backend)
+                    break
+                except ImportError:
+                    pass
+        elif backend not in BytesJSONDecoder.BACKENDS:
+            raise ValueError('Unknown JSON backend "{}"'.format(backend))
+        self.backend = backend
+        self._loads = importlib.import_module(backend).loads
+
+    def __reduce__(self):
+        # for a process pool; the module functions can't always be pickled
+        return BytesJSONDecoder, (self.backend, )
+
+    def __repr__(self):
+        return '<BytesJSONDecoder: {}>'.format(self.backend)
+
+    def decode(self, data):
+        "Returns the decoded ``data``, which may be bytes or a Unicode string."
+        if self.backend == 'orjson':
+            return self._loads(data)
+        elif isinstance(data, memoryview):
+            data = data.tobytes()
+        if self.backend == 'json' and isinstance(data, bytes):
+            # only Python 3.6+ accepts bytes
+            data = data.decode('utf-8')
+        return self._loads(data)
 
 
 class Results(object):
@@ -264,41 +1248,1046 @@ class Results(object):
     - grouped
     - nextCursorMark
 
-    You may add more attributes by extending the :class:`Results` class. For example:::
+    You may add more attributes by extending the :class:`Results` class. For example:::
+
+        class CustomResults(pysolrtornado.Results):
+            def __init__(self, decoded):
+                 super(self, CustomResults).__init__(decoded)
+                 self.some_new_attribute = decoded.get('not_covered_key' None)
+    """
+
+    def __init__(self, decoded):
+        # main response part of decoded Solr response
+        response_part = decoded.get('response') or {}
+        self.docs = response_part.get('docs', ())
+        self.hits = int(response_part.get('numFound', 0))
+
+        # other response metadata
+        self.debug = decoded.get('debug', {})
+        self.highlighting = decoded.get('highlighting', {})
+        self.facets = decoded.get('facet_counts', {})
+        self.spellcheck = decoded.get('spellcheck', {})
+        self.stats = decoded.get('stats', {})
+        self.qtime = decoded.get('responseHeader', {}).get('QTime', None)
+        self.grouped = decoded.get('grouped', {})
+        self.nextCursorMark = decoded.get('nextCursorMark', None)
+
+    def __bool__(self):
+        return self.hits > 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __getitem__(self, i):
+        return self.docs[i]
+
+    def to_columns(self, fields, use_numpy=False):
+        """
+        Returns the documents as columns: an ordered dictionary from each of the ``fields`` to a
+        :class:`Column` with the values of that field in every document. Numbers, booleans, and
+        dates are stored in compact arrays rather than as Python objects. The ``fields`` may be a
+        list or a comma-separated string, like the ``fl`` parameter.
+
+        With ``use_numpy=True``, the arrays are NumPy arrays, and dates are ``datetime64[us]``.
+        This requires NumPy.
+
+        Usage::
+
+            results = yield solr.search('*:*', fl='id,price', rows=10000)
+            prices = results.to_columns(['price'])['price'].values
+        """
+        return _to_columns(self.docs, fields, use_numpy)
+
+
+class LazyResults(object):
+    """
+    A results class that only decodes as much of the response as you use. Choose it with
+    ``Solr(results_cls=LazyResults)``.
+
+    It has the same attributes as :class:`Results`, but :class:`Solr` gives it the response text
+    instead of the decoded response. Reading :attr:`hits` or :attr:`qtime` decodes only the
+    response header, and iterating or indexing decodes one document at a time, so counting the
+    results or showing the first few costs little, however many ``rows`` there are. The other
+    attributes, :attr:`docs`, and ``len()`` decode the whole response the first time you use them.
+
+    Given a decoded response, like :class:`Results`, it simply looks up the attributes when you
+    use them.
+
+    It always decodes with the standard :mod:`json` (or :mod:`simplejson`) decoder, not with the
+    ``decoder`` given to :class:`Solr`. Subclasses that add attributes must declare them in
+    ``__slots__``.
+    """
+
+    __slots__ = ('_text', '_decoded', '_header', '_docs', '_pos', '_docs_done')
+
+    # Solr gives the response text to results classes with this set
+    raw_payload = True
+
+    def __init__(self, decoded):
+        self._pos = None  # index in the text after the last decoded document
+        if isinstance(decoded, dict):
+            self._text = None
+            self._decoded = self._header = decoded
+            self._docs = (decoded.get('response') or {}).get('docs', ())
+            self._docs_done = True
+        else:
+            self._text = decoded
+            self._decoded = self._header = None
+            self._docs = []
+            self._docs_done = False
+
+    def _full(self):
+        "Returns the whole decoded response."
+        if self._decoded is None:
+            self._decoded = _JSON_DECODER.decode(self._text)
+            self._text = None
+            response_part = self._decoded.get('response') or {}
+            if self._docs and 'docs' in response_part:
+                # keep the documents we already returned
+                response_part['docs'][:len(self._docs)] = self._docs
+            self._docs = response_part.get('docs', ())
+            self._docs_done = True
+            if self._header is None:
+                # the text is gone, so the header comes from the whole response too
+                self._header = self._decoded
+        return self._decoded
+
+    def _head(self):
+        "Returns the decoded response up to the documents."
+        if self._header is None:
+            start = _DocStreamParser.docs_start(self._text)
+            if start is None:
+                self._header = self._full()
+            else:
+                # close the "docs" list, the "response" object, and the whole response
+                self._header = _JSON_DECODER.decode(self._text[:start] + ']}}')
+                self._pos = start
+        return self._header
+
+    def _decode_docs(self, count=None):
+        "Decodes documents until there are ``count`` of them, or all of them."
+        if self._docs_done:
+            return
+        if self._pos is None:
+            self._head()
+            if self._docs_done:
+                return
+
+        text = self._text
+        pos = self._pos
+        docs = self._docs
+        while count is None or len(docs) < count:
+            while text[pos] in ' \t\r\n,':
+                pos += 1
+            if text[pos] == ']':
+                self._docs_done = True
+                break
+            doc, pos = _JSON_DECODER.raw_decode(text, pos)
+            docs.append(doc)
+        self._pos = pos
+
+    def _iter_docs(self):
+        "Yields every document, without keeping the ones that weren't decoded yet."
+        if self._pos is None and not self._docs_done:
+            self._head()
+        for doc in self._docs:
+            yield doc
+        if self._docs_done:
+            return
+
+        text = self._text
+        pos = self._pos
+        while True:
+            while text[pos] in ' \t\r\n,':
+                pos += 1
+            if text[pos] == ']':
+                return
+            doc, pos = _JSON_DECODER.raw_decode(text, pos)
+            yield doc
+
+    def to_columns(self, fields, use_numpy=False):
+        """
+        Returns the documents as columns, like :meth:`Results.to_columns`. The documents not yet
+        decoded are decoded one at a time, and not kept.
+        """
+        return _to_columns(self._iter_docs(), fields, use_numpy)
+
+    @property
+    def docs(self):
+        self._decode_docs()
+        return self._docs
+
+    @property
+    def hits(self):
+        return int((self._head().get('response') or {}).get('numFound', 0))
+
+    @property
+    def qtime(self):
+        return self._head().get('responseHeader', {}).get('QTime', None)
+
+    @property
+    def debug(self):
+        return self._full().get('debug', {})
+
+    @property
+    def highlighting(self):
+        return self._full().get('highlighting', {})
+
+    @property
+    def facets(self):
+        return self._full().get('facet_counts', {})
+
+    @property
+    def spellcheck(self):
+        return self._full().get('spellcheck', {})
+
+    @property
+    def stats(self):
+        return self._full().get('stats', {})
+
+    @property
+    def grouped(self):
+        return self._full().get('grouped', {})
+
+    @property
+    def nextCursorMark(self):
+        return self._full().get('nextCursorMark', None)
+
+    def __bool__(self):
+        return self.hits > 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self._docs):
+                yield self._docs[i]
+                i += 1
+            elif self._docs_done:
+                return
+            else:
+                self._decode_docs(i + 1)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if i.stop is not None and i.stop >= 0 and (i.start or 0) >= 0:
+                self._decode_docs(i.stop)
+            else:
+                self._decode_docs()
+        elif i >= 0:
+            self._decode_docs(i + 1)
+        else:
+            self._decode_docs()
+        return self._docs[i]
+
+
+class _DocIterator(object):
+    """
+    Base class for the asynchronous iterators over documents, with the Motor cursor API and the
+    Python 3.5 asynchronous iterator protocol. Subclasses put documents in ``self._buffer`` and
+    implement ``_fetch_next()``.
+    """
+
+    @property
+    def fetch_next(self):
+        """
+        A Future that resolves to ``True`` if there's another document (or page) to get from
+        :meth:`next_object`, or to ``False`` if there isn't. Fetches more documents if needed.
+        """
+        return self._fetch_next()
+
+    def next_object(self):
+        "Returns the next document (or page), once :attr:`fetch_next` resolved to ``True``."
+        return self._buffer.popleft()
+
+    def __aiter__(self):
+        return self
+
+    @gen.coroutine
+    def __anext__(self):
+        if (yield self.fetch_next):
+            return self.next_object()
+        raise StopAsyncIteration()
+
+
+class SearchIterator(_DocIterator):
+    """
+    Iterates over every document that matches a query, fetching them page by page with Solr's
+    ``cursorMark`` deep paging. Don't create these directly, but call :meth:`Solr.search_iter`.
+
+    Use it like a Motor cursor::
+
+        results = solr.search_iter('*:*', sort='id asc', rows=1000)
+        while (yield results.fetch_next):
+            doc = results.next_object()
+
+    Or, with Python 3.5 or newer::
+
+        async for doc in solr.search_iter('*:*', sort='id asc', rows=1000):
+            print(doc)
+
+    With ``pages=True``, the iterator produces a :class:`Results` instance for every page, instead
+    of the documents one at a time.
+
+    With ``prefetch=True`` (the default), the next page is requested as soon as the current page
+    arrives, so it's usually ready by the time the caller is done with the current page.
+
+    The ``cursor_mark`` attribute holds the cursor for the next page, so you can continue later.
+    """
+
+    def __init__(self, solr, q, pages=False, prefetch=True, **kwargs):
+        self.pages = pages
+        self.prefetch = prefetch
+        self.cursor_mark = kwargs.pop('cursorMark', '*')
+        kwargs.setdefault('sort', 'id asc')
+        self._solr = solr
+        self._q = q
+        self._params = kwargs
+        self._buffer = collections.deque()
+        self._next_page = None  # Future with the next Results
+        self._done = False
+
+    def _fetch_page(self):
+        return self._solr.search(self._q, use_cache=False, cursorMark=self.cursor_mark, **self._params)
+
+    @gen.coroutine
+    def _fetch_next(self):
+        while not self._buffer and not self._done:
+            if self._next_page is None:
+                self._next_page = self._fetch_page()
+            results = yield self._next_page
+            self._next_page = None
+
+            if results.docs:
+                if self.pages:
+                    self._buffer.append(results)
+                else:
+                    self._buffer.extend(results.docs)
+
+            # Solr returns the same cursor when there's nothing after this page
+            if results.nextCursorMark is None or results.nextCursorMark == self.cursor_mark:
+                self._done = True
+            else:
+                self.cursor_mark = results.nextCursorMark
+                if self.prefetch:
+                    self._next_page = self._fetch_page()
+
+        return len(self._buffer) > 0
+
+
+class _DocStreamParser(object):
+    """
+    Parses a JSON response from Solr as it arrives, producing the documents in ``response.docs``
+    one at a time, so the whole response is never held in memory.
+
+    Call :meth:`feed` with every chunk of the body (as bytes), which returns the documents that
+    arrived completely. Then call :meth:`close`, which returns the last documents and the rest of
+    the response, with an empty ``docs`` list.
+    """
+
+    _PREFIX, _DOCS, _SUFFIX = range(3)
+    _LARGE_DOC = 8192  # characters
+
+    def __init__(self, decoder=None):
+        # we need raw_decode(), which the json and simplejson decoders have
+        self._decoder = decoder if hasattr(decoder, 'raw_decode') else _JSON_DECODER
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._state = _DocStreamParser._PREFIX
+        self._buffer = ''
+        self._prefix = ''  # everything before the docs, up to and including the "["
+        self._suffix = []  # everything after the docs, starting with the "]"
+        self._tried = 0  # length of the incomplete document at the last try
+        self._retry_at = 0  # don't retry a large incomplete document until it's at least this long
+        # for finding the docs
+        self._scan_pos = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._key = None
+        self._keys = []  # key of every open object and array
+
+    @classmethod
+    def docs_start(cls, text):
+        """
+        Returns the index after the "[" that starts ``response.docs`` in the complete response
+        ``text``, or ``None`` if there are no docs.
+        """
+        parser = cls()
+        parser._buffer = text
+        return parser._find_docs()
+
+    def feed(self, chunk):
+        "Parses another ``chunk`` of the response, and returns a list of the new documents."
+        return self._parse(self._utf8.decode(chunk))
+
+    def close(self):
+        """
+        Returns a list of the documents not yet returned by :meth:`feed`, and the decoded response
+        without the documents. Raises :exc:`ValueError` if the response was incomplete.
+        """
+        docs = self._parse(self._utf8.decode(b'', True), final=True)
+        if self._state == _DocStreamParser._PREFIX:
+            # there were no docs, like in an error response
+            return docs, self._decoder.decode(self._buffer)
+        elif self._state == _DocStreamParser._DOCS:
+            raise ValueError('The response ended in the middle of the documents')
+        return docs, self._decoder.decode(self._prefix + ''.join(self._suffix))
+
+    def _parse(self, text, final=False):
+        docs = []
+        if self._state == _DocStreamParser._SUFFIX:
+            self._suffix.append(text)
+            return docs
+
+        self._buffer += text
+        if self._state == _DocStreamParser._PREFIX:
+            start = self._find_docs()
+            if start is None:
+                return docs
+            self._prefix = self._buffer[:start]
+            self._buffer = self._buffer[start:]
+            self._state = _DocStreamParser._DOCS
+
+        buf = self._buffer
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buf):
+                break
+            elif buf[pos] == ']':
+                self._suffix.append(buf[pos:])
+                self._state = _DocStreamParser._SUFFIX
+                pos = len(buf)
+                break
+            elif not final and (len(buf) - pos < self._retry_at or buf.find('}', pos + self._tried) == -1):
+                # an incomplete document can't be complete until another "}" arrives
+                break
+            try:
+                doc, pos = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                # The document is incomplete. Trying again after every chunk would be quadratic
+                # for large documents, so we wait until there's twice as much of those.
+                self._tried = len(buf) - pos
+                if self._tried > _DocStreamParser._LARGE_DOC:
+                    self._retry_at = 2 * self._tried
+                if final:
+                    raise
+                break
+            docs.append(doc)
+            self._tried = self._retry_at = 0
+
+        self._buffer = buf[pos:]
+        return docs
+
+    def _find_docs(self):
+        """
+        Scans the buffer for the "[" that starts the ``response.docs`` list, and returns the index
+        after it, or ``None`` if it hasn't arrived yet.
+        """
+        buf = self._buffer
+        for i in range(self._scan_pos, len(buf)):
+            char = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buf[self._string_start:i]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char == ':':
+                self._key = self._last_string
+            elif char == '{' or char == '[':
+                self._keys.append(self._key)
+                self._key = None
+                if char == '[' and self._keys == [None, 'response', 'docs']:
+                    return i + 1
+            elif char == '}' or char == ']':
+                if self._keys:
+                    self._keys.pop()
+                self._key = None
+            elif char == ',':
+                self._key = None
+        self._scan_pos = len(buf)
+        return None
+
+
+# converters for the Python types given to Solr.search_csv(), when calling the type won't do
+_CSV_CONVERTERS = {bool: _convert_bool, datetime.datetime: _convert_date, str: None}
+
+
+class _CsvStreamParser(object):
+    """
+    Parses a CSV response from Solr as it arrives, producing a document for every row.
+
+    The first row holds the field names. The value of a field is converted by its entry in
+    ``types``, a dictionary from field names to a type like ``int`` or ``datetime.datetime`` (or
+    any function that converts the text), or a list with one of those for a multivalued field.
+    Fields without an entry are converted by the ``schema``, if there is one, and otherwise stay
+    strings, except for ``score``. Multivalued values are split on ``mv_separator``, unless it's
+    escaped with ``mv_escape``. Empty values are left out of the document, like missing fields.
+
+    Call :meth:`feed` with every chunk of the body (as bytes), which returns the documents that
+    arrived completely. Then call :meth:`close`, which returns the last documents.
+    """
+
+    def __init__(self, types=None, schema=None, mv_separator=',', mv_escape='\\'):
+        self._types = types or {}
+        self._schema = schema
+        self._mv_separator = mv_separator
+        self._mv_escape = mv_escape
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._scan_pos = 0  # where to look for the next line break
+        self._quoted = False  # whether the buffer up to _scan_pos ends inside a quoted value
+        self._columns = None  # (name, converter, multivalued) for every column
+
+    def feed(self, chunk):
+        "Parses another ``chunk`` of the response, and returns a list of the new documents."
+        return self._parse(self._utf8.decode(chunk))
+
+    def close(self):
+        "Returns a list of the documents not yet returned by :meth:`feed`."
+        docs = self._parse(self._utf8.decode(b'', True))
+        if self._buffer.strip():
+            # an odd number of quotes after _scan_pos closes a value that's still open there
+            if self._quoted != bool(self._buffer.count('"', self._scan_pos) % 2):
+                raise ValueError('The response ended in the middle of a quoted value')
+            docs.extend(self._rows_to_docs(self._buffer))
+            self._buffer = ''
+        return docs
+
+    def _parse(self, text):
+        buf = self._buffer + text
+        # A record ends at a line break outside quotes. Solr doubles the quotes inside quoted
+        # values, so we're outside quotes wherever we've seen an even number of them.
+        pos = self._scan_pos
+        end = 0  # the end of the complete records
+        quoted = self._quoted
+        while True:
+            newline = buf.find('\n', pos)
+            if newline == -1:
+                break
+            if buf.count('"', pos, newline) % 2:
+                quoted = not quoted
+            pos = newline + 1
+            if not quoted:
+                end = pos
+
+        self._buffer = buf[end:]
+        self._scan_pos = pos - end
+        self._quoted = quoted
+        if end == 0:
+            return []
+        return self._rows_to_docs(buf[:end])
+
+    def _rows_to_docs(self, text):
+        docs = []
+        rows = csv.reader(io.StringIO(text, newline=''))
+        if self._columns is None:
+            self._columns = [self._column(name) for name in next(rows, ())]
+        for row in rows:
+            doc = {}
+            for (name, converter, multi_valued), value in zip(self._columns, row):
+                if not value:
+                    continue
+                elif multi_valued:
+                    value = self._split(value)
+                    if converter is not None:
+                        value = [converter(each) for each in value]
+                elif converter is not None:
+                    value = converter(value)
+                doc[name] = value
+            docs.append(doc)
+        return docs
+
+    def _column(self, name):
+        if name in self._types:
+            converter = self._types[name]
+            multi_valued = isinstance(converter, list)
+            if multi_valued:
+                converter = converter[0]
+            return name, _CSV_CONVERTERS.get(converter, converter), multi_valued
+        elif self._schema is not None and (self._schema.converter(name) or self._schema.multi_valued(name)):
+            # the schema's converters for multivalued fields take single values too
+            return name, self._schema.converter(name), self._schema.multi_valued(name)
+        elif name == 'score':
+            return name, _convert_float, False
+        return name, None, False
+
+    def _split(self, value):
+        if self._mv_escape not in value:
+            return value.split(self._mv_separator)
+
+        values = []
+        current = []
+        escaped = False
+        for char in value:
+            if escaped:
+                current.append(char)
+                escaped = False
+            elif char == self._mv_escape:
+                escaped = True
+            elif char == self._mv_separator:
+                values.append(''.join(current))
+                current = []
+            else:
+                current.append(char)
+        values.append(''.join(current))
+        return values
+
+
+class ExportIterator(_DocIterator):
+    """
+    Iterates over the documents from Solr's ``/export`` handler as they arrive. Don't create these
+    directly, but call :meth:`Solr.export`.
+
+    It supports the same Motor cursor API and ``async for`` as :class:`SearchIterator`.
+
+    The request starts the first time you use :attr:`fetch_next`. Documents are parsed as soon as
+    they arrive, and wait in memory until you take them with :meth:`next_object`. Tornado can't
+    slow down the response for a slow consumer, so keep up to keep the memory use low.
+
+    If the request fails, or Solr reports an error in the middle of the export, :attr:`fetch_next`
+    raises :exc:`SolrError` after the documents that arrived before it.
+    """
+
+    def __init__(self, solr, path):
+        self._solr = solr
+        self._path = path
+        self._parser = _DocStreamParser(solr.decoder)
+        self._buffer = collections.deque()
+        self._request = None  # Future of the request
+        self._waiter = None  # Future that wakes up _fetch_next()
+        self._error = None
+        self._finished = False
+
+    @gen.coroutine
+    def _fetch_next(self):
+        if self._request is None:
+            self._request = self._solr._send_request('get', self._path, streaming_callback=self._on_chunk)
+            self._request.add_done_callback(self._on_done)
+
+        while not self._buffer and not self._finished:
+            self._waiter = Future()
+            yield self._waiter
+
+        if not self._buffer and self._error is not None:
+            raise self._error
+        return len(self._buffer) > 0
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _on_chunk(self, chunk):
+        if self._error is None:
+            try:
+                self._add_docs(self._parser.feed(chunk))
+            except ValueError as exc:
+                self._error = SolrError('Cannot parse the export: {}'.format(exc))
+        self._wake()
+
+    def _on_done(self, future):
+        self._finished = True
+        if future.exception() is not None:
+            # the request failed, so the body is probably an error message
+            self._error = future.exception()
+        elif self._error is None:
+            try:
+                self._add_docs(self._parser.close()[0])
+            except ValueError as exc:
+                self._error = SolrError('Cannot parse the export: {}'.format(exc))
+        self._wake()
+
+    def _add_docs(self, docs):
+        for doc in docs:
+            if 'EXCEPTION' in doc:
+                # the /export handler reports errors as a document
+                self._error = SolrError(doc['EXCEPTION'])
+                break
+            self._buffer.append(doc)
+
+
+class RequestRecord(object):
+    """
+    Describes one request to Solr, for the observers added with :meth:`Solr.add_observer`.
+
+    Times are in seconds and sizes in bytes. Attributes that don't apply, or that we couldn't
+    measure, are ``None``.
+
+    - ``handler``: the request handler, like ``'select'`` or ``'update'``
+    - ``method``: the HTTP method
+    - ``url``: the full URL of the last attempt
+    - ``status``: the HTTP status code, ``599`` if there was no response, or ``None`` if the
+      request never reached the network
+    - ``attempts``: how many times the request was sent, with a :class:`RetryPolicy`
+    - ``hedged``: whether a duplicate was sent to another node, with a :class:`HedgePolicy`
+    - ``queue_time``: time spent waiting for a connection, with a private connection pool
+    - ``request_time``: time spent on the HTTP request, as Tornado measured it
+    - ``time_info``: the network phases of the request from Tornado's curl client, like
+      ``'namelookup'``, ``'connect'``, ``'pretransfer'``, and ``'starttransfer'``, or an empty
+      dictionary with the simple client
+    - ``bytes_sent``: the size of the request body
+    - ``bytes_received``: the size of the response body as received, so before decompressing it
+      with ``compress_responses``
+    - ``qtime``: the ``QTime`` that Solr reported, for queries
+    - ``decode_time``: time spent decoding the response, for queries
+    - ``error``: the name of the exception class if the request failed, like ``'HTTPError'`` or
+      ``'ConnectionError'``
+    - ``total_time``: time from the start of the first attempt until the response was decoded
+    """
+
+    __slots__ = ('handler', 'method', 'url', 'status', 'attempts', 'hedged', 'queue_time', 'request_time',
+                 'time_info', 'bytes_sent', 'bytes_received', 'qtime', 'decode_time', 'error', 'total_time',
+                 'start_time')
+
+    # what a single attempt measures, for copying the winner of a hedged request
+    _ATTEMPT_ATTRS = ('url', 'status', 'queue_time', 'request_time', 'time_info', 'bytes_sent', 'bytes_received',
+                      'error')
+
+    def __init__(self, handler=None, method=None):
+        for name in RequestRecord.__slots__:
+            setattr(self, name, None)
+        self.handler = handler
+        self.method = method
+        self.attempts = 1
+        self.hedged = False
+        self.time_info = {}
+        self.start_time = time.time()
+
+    def __repr__(self):
+        return '<RequestRecord: {} {} {} in {}>'.format(self.method, self.handler, self.status, self.total_time)
+
+    def as_dict(self):
+        "Returns the attributes in a dictionary."
+        return dict((name, getattr(self, name)) for name in RequestRecord.__slots__)
+
+    def _copy_attempt(self, other):
+        for name in RequestRecord._ATTEMPT_ATTRS:
+            setattr(self, name, getattr(other, name))
+
+
+class LatencyHistogram(object):
+    """
+    Counts times in logarithmic buckets, so recording one costs the same however many there are,
+    and percentiles are estimated within about 10%.
+
+    The buckets go from half a millisecond to about two minutes, each 19% (a quarter of a doubling)
+    wider than the one before. ``counts[i]`` is how many times were at most ``BOUNDS[i]`` seconds,
+    and more than the bound before; the last count is for longer times.
+
+    The ``count``, ``sum``, and ``max`` attributes are exact.
+    """
+
+    # upper bounds of the buckets, in seconds
+    BOUNDS = tuple(0.0005 * 2 ** (i / 4.0) for i in range(73))
+
+    def __init__(self):
+        self.counts = [0] * (len(LatencyHistogram.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        "Counts a time, in seconds."
+        self.counts[bisect.bisect_left(LatencyHistogram.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+        Returns an estimate of the ``percent``-th percentile, like ``99`` for the p99, or ``None``
+        if nothing was recorded. This is the upper bound of the bucket it's in, or :attr:`max` if
+        that's less.
+        """
+        if self.count == 0:
+            return None
+        rank = max(self.count * percent / 100.0, 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index == len(LatencyHistogram.BOUNDS):
+            return self.max
+        return min(LatencyHistogram.BOUNDS[index], self.max)
+
+    def snapshot(self):
+        "Returns a dictionary with the ``count``, ``sum``, ``mean``, ``max``, and some percentiles."
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+        }
+
+
+class _HandlerStats(object):
+    "What :class:`RequestStats` knows about the requests to one handler."
+
+    __slots__ = ('requests', 'errors', 'retries', 'hedged', 'bytes_sent', 'bytes_received', 'decode_time',
+                 'latency', 'qtime')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = {}  # exception class name to count
+        self.retries = 0
+        self.hedged = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.decode_time = 0.0
+        self.latency = LatencyHistogram()
+        self.qtime = LatencyHistogram()
+
+
+class RequestStats(object):
+    """
+    An observer for :meth:`Solr.add_observer` that keeps statistics about the requests to each
+    request handler (``'select'``, ``'mlt'``, ``'terms'``, ``'update'``, and so on): the number of
+    requests and errors, retries, bytes sent and received, and histograms of the latency and of
+    Solr's ``QTime``. :class:`Solr` makes one with ``collect_stats=True``.
+
+    Recording a request only increments a few counters, so it's cheap enough to leave on. Like
+    :class:`Solr`, it isn't thread-safe, and doesn't need locks since it's only updated from the
+    IOLoop.
+
+    Usage::
+
+        stats = RequestStats()
+        solr.add_observer(stats)
+        ...
+        print(stats.snapshot()['select']['latency']['p99'])
+    """
 
-        class CustomResults(pysolrtornado.Results):
-            def __init__(self, decoded):
-                 super(self, CustomResults).__init__(decoded)
-                 self.some_new_attribute = decoded.get('not_covered_key' None)
+    def __init__(self):
+        self.start_time = time.time()
+        self._handlers = {}  # handler name to _HandlerStats
+
+    def __call__(self, record):
+        stats = self._handlers.get(record.handler)
+        if stats is None:
+            stats = self._handlers[record.handler] = _HandlerStats()
+        stats.requests += 1
+        if record.error is not None:
+            stats.errors[record.error] = stats.errors.get(record.error, 0) + 1
+        stats.retries += record.attempts - 1
+        if record.hedged:
+            stats.hedged += 1
+        stats.bytes_sent += record.bytes_sent or 0
+        stats.bytes_received += record.bytes_received or 0
+        if record.decode_time is not None:
+            stats.decode_time += record.decode_time
+        stats.latency.record(record.total_time)
+        if record.qtime is not None:
+            stats.qtime.record(record.qtime / 1000.0)
+
+    def reset(self):
+        "Forgets every request so far."
+        self.start_time = time.time()
+        self._handlers = {}
+
+    def snapshot(self):
+        """
+        Returns a dictionary with a dictionary for each handler, with these keys. Times are in
+        seconds, and the result may be serialized to JSON.
+
+        - ``requests``: requests finished, including failed requests
+        - ``throughput``: requests per second, since we started counting
+        - ``errors``: the number of failed requests for each exception class name
+        - ``retries``: how many times a request was retried
+        - ``hedged``: how many requests were hedged
+        - ``bytes_sent`` and ``bytes_received``: the total size of the requests and responses
+        - ``decode_seconds``: time spent decoding the responses
+        - ``latency``: a :meth:`LatencyHistogram.snapshot` of the time until the response was
+          decoded
+        - ``qtime``: a :meth:`LatencyHistogram.snapshot` of the ``QTime`` reported by Solr
+        """
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        snapshot = {}
+        for name, stats in self._handlers.items():
+            snapshot[name] = {
+                'requests': stats.requests,
+                'throughput': stats.requests / elapsed,
+                'errors': dict(stats.errors),
+                'retries': stats.retries,
+                'hedged': stats.hedged,
+                'bytes_sent': stats.bytes_sent,
+                'bytes_received': stats.bytes_received,
+                'decode_seconds': stats.decode_time,
+                'latency': stats.latency.snapshot(),
+                'qtime': stats.qtime.snapshot(),
+            }
+        return snapshot
+
+    def render_prometheus(self, prefix='pysolrtornado', labels=None):
+        """
+        Returns the statistics in the Prometheus text format, as a list of lines. Every metric
+        name starts with ``prefix``, and has the ``labels`` from a dictionary, if given, besides
+        the ``handler`` label.
+
+        The histograms have a bucket for every doubling, from half a millisecond.
+        """
+        lines = []
+        handlers = sorted(self._handlers.items(), key=lambda item: item[0])
+
+        def label_set(name, **more):
+            return _prometheus_labels(dict(labels or {}, handler=name, **more))
+
+        for metric, attr, help_text in (
+                ('request_duration_seconds', 'latency', 'Time from sending a request until its response was decoded.'),
+                ('server_qtime_seconds', 'qtime', 'QTime reported by Solr.')):
+            lines.append('# HELP {}_{} {}'.format(prefix, metric, help_text))
+            lines.append('# TYPE {}_{} histogram'.format(prefix, metric))
+            for name, stats in handlers:
+                histogram = getattr(stats, attr)
+                seen = 0
+                for index, count in enumerate(histogram.counts[:-1]):
+                    seen += count
+                    if index % 4 == 0:
+                        lines.append('{}_{}_bucket{} {}'.format(
+                            prefix, metric, label_set(name, le=repr(LatencyHistogram.BOUNDS[index])), seen))
+                lines.append('{}_{}_bucket{} {}'.format(prefix, metric, label_set(name, le='+Inf'), histogram.count))
+                lines.append('{}_{}_sum{} {!r}'.format(prefix, metric, label_set(name), histogram.sum))
+                lines.append('{}_{}_count{} {}'.format(prefix, metric, label_set(name), histogram.count))
+
+        for metric, attr, help_text in (
+                ('request_retries_total', 'retries', 'Requests retried.'),
+                ('requests_hedged_total', 'hedged', 'Requests hedged.'),
+                ('request_bytes_sent_total', 'bytes_sent', 'Size of the request bodies.'),
+                ('request_bytes_received_total', 'bytes_received', 'Size of the response bodies.'),
+                ('decode_seconds_total', 'decode_time', 'Time spent decoding responses.')):
+            lines.append('# HELP {}_{} {}'.format(prefix, metric, help_text))
+            lines.append('# TYPE {}_{} counter'.format(prefix, metric))
+            for name, stats in handlers:
+                lines.append('{}_{}{} {!r}'.format(prefix, metric, label_set(name), getattr(stats, attr)))
+
+        lines.append('# HELP {}_request_errors_total Failed requests.'.format(prefix))
+        lines.append('# TYPE {}_request_errors_total counter'.format(prefix))
+        for name, stats in handlers:
+            for error, count in sorted(stats.errors.items()):
+                lines.append('{}_request_errors_total{} {}'.format(prefix, label_set(name, error=error), count))
+        return lines
+
+
+def _prometheus_labels(labels):
+    "Formats a dictionary of labels for the Prometheus text format."
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                               .replace('\n', '\\n'))
+                          for key, value in sorted(labels.items())) + '}'
+
+
+def _decode_response(response, response_format='json', decoder=None):
     """
+    Decodes a Solr ``response`` in ``response_format``, with ``decoder`` for JSON or our own
+    decoder if it's ``None``. This is a module-level function so that :meth:`Solr._decode` can
+    run it in a process pool.
+    """
+    if response_format == 'javabin':
+        return JavabinDecoder().decode(response)
+    return (decoder or _JSON_DECODER).decode(response)
 
-    def __init__(self, decoded):
-        # main response part of decoded Solr response
-        response_part = decoded.get('response') or {}
-        self.docs = response_part.get('docs', ())
-        self.hits = int(response_part.get('numFound', 0))
 
-        # other response metadata
-        self.debug = decoded.get('debug', {})
-        self.highlighting = decoded.get('highlighting', {})
-        self.facets = decoded.get('facet_counts', {})
-        self.spellcheck = decoded.get('spellcheck', {})
-        self.stats = decoded.get('stats', {})
-        self.qtime = decoded.get('responseHeader', {}).get('QTime', None)
-        self.grouped = decoded.get('grouped', {})
-        self.nextCursorMark = decoded.get('nextCursorMark', None)
+def _build_add_message(solr, update_format, docs, boost=None, fieldUpdates=None, commitWithin=None):
+    """
+    Builds an add message for :meth:`Solr.add` with the serializers of ``solr``, a :class:`Solr`
+    instance. For a process pool, where the instance can't be pickled, ``solr`` may instead be
+    :class:`Solr` or a subclass, and we use a bare instance that never ran ``__init__()``.
+    """
+    if isinstance(solr, type):
+        solr = object.__new__(solr)
+    if update_format == 'json':
+        return solr._build_json_add(docs, boost=boost, fieldUpdates=fieldUpdates, commitWithin=commitWithin)
+    return solr._write_xml_add(docs, boost=boost, fieldUpdates=fieldUpdates, commitWithin=commitWithin)
 
-    def __bool__(self):
-        return self.hits > 0
 
-    def __len__(self):
-        return len(self.docs)
+class _ResponseDecompressor(object):
+    """
+    Decompresses a gzip or deflate response for :meth:`Solr._send_once`, which turns off Tornado's
+    own decompression so that we can count the bytes. Pass :meth:`on_header` as the request's
+    ``header_callback``, and :meth:`on_chunk` as its ``streaming_callback`` if there's a
+    ``streaming_callback``, which then receives the decompressed chunks. Then call :meth:`finish`
+    with the response.
 
-    def __iter__(self):
-        return iter(self.docs)
+    The counts go into ``stats``, the dictionary behind :meth:`Solr.compression_stats`.
+    """
 
-    def __getitem__(self, i):
-        return self.docs[i]
+    ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+    def __init__(self, stats, streaming_callback=None):
+        self._stats = stats
+        self._callback = streaming_callback
+        self._decompressor = None
+        self._received = 0
+
+    def on_header(self, line):
+        if line.startswith('HTTP/'):
+            # a new response, like after "100 Continue"
+            self._decompressor = None
+            return
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-encoding' and value.strip().lower() in self.ENCODINGS:
+            # MAX_WBITS | 32 accepts both the gzip and zlib headers
+            self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+
+    def on_chunk(self, chunk):
+        if self._decompressor is not None:
+            chunk = self._decompress(chunk)
+        self._callback(chunk)
+
+    def finish(self, resp):
+        "Returns the response with its body decompressed."
+        if self._callback is not None:
+            if self._decompressor is not None:
+                tail = self._decompress(b'', flush=True)
+                if tail:
+                    self._callback(tail)
+                self._count_response()
+            return resp
+
+        encoding = resp.headers.get('Content-Encoding', '').lower()
+        if encoding not in self.ENCODINGS or not resp.body:
+            return resp
+        self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        body = self._decompress(resp.body, flush=True)
+        self._count_response()
+        return httpclient.HTTPResponse(resp.request, resp.code, headers=resp.headers, buffer=io.BytesIO(body),
+                                       effective_url=resp.effective_url, reason=resp.reason,
+                                       request_time=resp.request_time)
+
+    def _decompress(self, data, flush=False):
+        start = time.time()
+        try:
+            decompressed = self._decompressor.decompress(data)
+            if flush:
+                decompressed += self._decompressor.flush()
+        except zlib.error as exc:
+            raise SolrError('Cannot decompress the response: {}'.format(exc))
+        self._stats['decompress_seconds'] += time.time() - start
+        self._stats['response_bytes_received'] += len(data)
+        self._stats['response_bytes'] += len(decompressed)
+        return decompressed
+
+    def _count_response(self):
+        self._stats['responses'] += 1
 
 
 class Solr(object):
@@ -306,7 +2295,8 @@ class Solr(object):
     The main object for working with Solr.
 
     Optionally accepts ``decoder`` for an alternate JSON decoder instance.
-    Default is ``json.JSONDecoder()``.
+    Default is ``json.JSONDecoder()``. Use a :class:`BytesJSONDecoder`, or just the name of its
+    backend like ``'orjson'`` or ``'auto'``, to parse responses from bytes with a faster library.
 
     Optionally accepts ``timeout`` for wait seconds until giving up on a
     request. Default is ``60`` seconds.
@@ -316,7 +2306,115 @@ class Solr(object):
 
     Optionally accepts ``results_cls`` that specifies class of results object
     returned by ``.search()`` and ``.more_like_this()`` methods.
-    Default is ``pysolr.Results``.
+    Default is ``pysolr.Results``. Use :class:`LazyResults` to decode only what you use.
+
+    Optionally accepts ``stream_decode``. If ``True``, :meth:`search` and :meth:`more_like_this`
+    decode the documents in a response while it arrives, rather than waiting for the whole response
+    then decoding it all at once. This saves memory for large responses, and avoids blocking the
+    IOLoop for one long decode. These requests aren't retried or hedged. Default is ``False``.
+
+    Optionally accepts ``response_format``, the format Solr uses for the responses of
+    :meth:`search`, :meth:`more_like_this`, and :meth:`suggest_terms`. Use ``'javabin'`` for
+    Solr's binary format, which is smaller than JSON, or ``'json'``. You can also choose the format
+    for one query by passing ``wt`` to those methods. Default is ``'json'``. Responses in javabin
+    format are never decoded incrementally, and :class:`LazyResults` get them already decoded.
+
+    Call :meth:`load_schema` to have :meth:`search` and :meth:`more_like_this` convert the values
+    in the documents according to the Solr schema.
+
+    Optionally accepts ``update_format`` that specifies how :meth:`add` serializes documents for
+    Solr. Use ``'xml'`` for XML update messages or ``'json'`` for JSON update commands, which skip
+    the ElementTree round-trip and are considerably faster to build. Default is ``'xml'``.
+
+    **Connection Pool**
+
+    By default, every :class:`Solr` shares Tornado's default ``AsyncHTTPClient``, which queues
+    requests quietly once ten are running. These arguments give a :class:`Solr` its own client:
+
+    - ``max_clients``: the most requests to run at once. Further requests wait in a queue.
+    - ``http_backend``: ``'simple'`` for Tornado's own client, ``'curl'`` for the pycurl-based
+      client, or ``'auto'`` to use curl when pycurl is installed. The curl client keeps connections
+      alive between requests; the simple client opens a new connection for every request.
+    - ``queue_timeout``: the most seconds a request waits in the queue before it fails. This is
+      separate from ``timeout``, which only starts once the request leaves the queue.
+    - ``connect_timeout``: the most seconds to wait while connecting to Solr.
+
+    Giving any of ``max_clients``, ``http_backend``, or ``queue_timeout`` creates a private client.
+    Default ``max_clients`` is ``10`` and default ``http_backend`` is ``'auto'``. Use
+    :meth:`pool_stats` to see how busy the pool is.
+
+    **Compression**
+
+    Optionally accepts ``compress_responses``. If ``True``, every request asks Solr for a gzip or
+    deflate response, and we decompress it ourselves, chunk by chunk for streamed responses, and
+    count the bytes. Solr (or the web server in front of it) must be set up to compress responses.
+    Default is ``False``, which leaves it to Tornado: its simple client asks for gzip too, but
+    doesn't count anything.
+
+    Optionally accepts ``compress_updates``, a size in bytes. Update messages from :meth:`add`,
+    :meth:`delete`, and the other update methods that are at least this large are gzipped and sent
+    with ``Content-Encoding: gzip``. Stock Solr (and its Jetty) doesn't decompress request bodies,
+    so the server must be set up to do that, for example with Jetty's ``GzipHandler`` inflating
+    requests or a proxy in front of Solr; otherwise Solr fails to parse the updates. Compressing
+    costs CPU time, so it pays off when the network is slow, like between data centres. Default is
+    ``None``, so nothing is compressed. :meth:`add_stream` doesn't know the size of its stream in
+    advance, so it only compresses when called with ``compress=True``.
+
+    Use :meth:`compression_stats` to see the bytes saved and the time spent compressing.
+
+    **Metrics**
+
+    Call :meth:`add_observer` with a function, and it's called with a :class:`RequestRecord` for
+    every request, with the timing of its phases, its size, and its outcome.
+
+    Optionally accepts ``collect_stats``. If ``True``, a :class:`RequestStats` observer keeps
+    latency histograms and counters for each request handler, in the ``request_stats`` attribute.
+    :meth:`stats` returns them with the other statistics, and :meth:`render_prometheus` formats
+    them for Prometheus. Default is ``False``.
+
+    **Executor**
+
+    Decoding a large response or building a large update message takes long enough to hold up
+    everything else on the IOLoop. Optionally accepts ``executor``, a
+    :class:`concurrent.futures.Executor` that does this work instead, while the IOLoop waits for
+    the result. A ``ThreadPoolExecutor`` works for everything, though the GIL still limits how much
+    runs at once. A ``ProcessPoolExecutor`` avoids the GIL, but copies the work to another process
+    and back, so it only pays off for large messages; it needs a ``decoder`` that can be pickled,
+    if you give one. It also builds add messages with a bare instance of your :class:`Solr` class
+    that never ran ``__init__()``, so a subclass whose ``_from_python()`` or other serializers use
+    instance attributes needs a thread pool. Default is ``None``, so everything runs on the IOLoop.
+
+    These arguments decide what's large enough to go to the ``executor``:
+
+    - ``executor_min_bytes``: responses of at least this many bytes are decoded by the executor.
+      Default is ``1048576``. Responses decoded while they arrive (``stream_decode``) and responses
+      for :class:`LazyResults` are never sent to the executor, and the :attr:`schema` conversion
+      still runs on the IOLoop.
+    - ``executor_min_docs``: :meth:`add` builds the message in the executor if there are at least
+      this many documents in a list or tuple. Default is ``1000``.
+
+    **Retries**
+
+    Optionally accepts ``retry_policy``, a :class:`RetryPolicy` that decides which failed requests
+    to retry, like searches that time out while a Solr node restarts. With a :class:`SolrPool`,
+    each retry goes to another node if possible. Default is ``None``, so nothing is retried.
+
+    Optionally accepts ``hedge_policy``, a :class:`HedgePolicy` that decides when to send a
+    duplicate of a slow search to another node, and use whichever response arrives first.
+    Default is ``None``, so nothing is hedged.
+
+    **Caching**
+
+    Optionally accepts ``cache``, a :class:`ResponseCache` for the responses of :meth:`search`,
+    :meth:`more_like_this`, and :meth:`suggest_terms`. Identical queries are then answered from
+    memory until the cached response expires. Pass ``use_cache=False`` to any of those methods to
+    skip the cache for one query. Default is ``None``, so nothing is cached.
+
+    Optionally accepts ``coalesce``. If ``True``, a query that's identical to one still waiting for
+    its response doesn't send another request, but shares the response of the first. Every caller
+    still gets its own :class:`Results` instance, but they share the decoded response, so treat it
+    as read-only. The ``coalesced`` attribute counts the queries that shared a response. Default
+    is ``False``.
 
     Usage::
 
@@ -328,8 +2426,20 @@ class Solr(object):
         # with a dict as a default results class instead of pysolr.Results
         solr = pysolr.Solr('http://localhost:8983/solr', results_cls=dict)
 
+        # send JSON update commands from add() instead of XML
+        solr = pysolr.Solr('http://localhost:8983/solr', update_format='json')
+
+        # run up to 50 requests at once on kept-alive connections
+        solr = pysolr.Solr('http://localhost:8983/solr', max_clients=50, http_backend='curl')
+
     """
 
+    # Formats accepted for the "update_format" argument.
+    UPDATE_FORMATS = ('xml', 'json')
+    RESPONSE_FORMATS = ('json', 'javabin')
+    # Values accepted for the "http_backend" argument.
+    HTTP_BACKENDS = ('auto', 'simple', 'curl')
+
     # Error messages for Solr._send_request()
     # They're class-level so they may be translated easier.
     _FETCH_VALUE_ERROR = 'URL is empty or protocol missing: {}'
@@ -337,29 +2447,324 @@ class Solr(object):
     _FETCH_SOCKET_ERROR = 'Socket error (DNS?) connecting to {}'
     _FETCH_KEY_ERROR = 'Unknown HTTP method "{}"'
     _FETCH_CONN_ERROR = 'Connection error with {}'
-
-    def __init__(self, url, decoder=None, timeout=None, ioloop=None, results_cls=None):
-        self.decoder = decoder or json.JSONDecoder()
+    _FETCH_QUEUE_ERROR = 'Timed out in the request queue for {}'
+    _DEADLINE_ERROR = 'The deadline passed before the query "{}" finished'
+    _UPDATE_FORMAT_ERROR = 'Unknown update format "{}"'
+    _RESPONSE_FORMAT_ERROR = 'Unknown response format "{}"'
+    _HTTP_BACKEND_ERROR = 'Unknown HTTP backend "{}"'
+    _NO_CURL_ERROR = 'The "curl" HTTP backend requires pycurl'
+
+    def __init__(self, url, decoder=None, timeout=None, ioloop=None, results_cls=None,
+                 update_format=None, max_clients=None, http_backend=None, queue_timeout=None,
+                 connect_timeout=None, retry_policy=None, hedge_policy=None, cache=None, coalesce=False,
+                 stream_decode=False, response_format=None, compress_responses=False, compress_updates=None,
+                 executor=None, executor_min_bytes=None, executor_min_docs=None, collect_stats=False):
+        self._default_decoder = json.JSONDecoder()
+        if isinstance(decoder, str):
+            decoder = BytesJSONDecoder(decoder)
+        self.decoder = decoder or self._default_decoder
         self.url = url
         self.timeout = timeout or 60
+        self.connect_timeout = connect_timeout
+        self.queue_timeout = queue_timeout
         self.log = self._get_log()
         self._ioloop = ioloop or ioloop_module.IOLoop.instance()
-        self._client = httpclient.AsyncHTTPClient(self._ioloop)
         self.results_cls = results_cls or Results
+        self.stream_decode = stream_decode
+        self.response_format = self._check_response_format(response_format or 'json')
+        self.schema = None
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self.cache = cache
+        self.coalesce = coalesce
+        self.coalesced = 0
+        self._in_flight = {}  # query key to the Future of its decoded response
+        self._observers = []
+        self.request_stats = None
+        if collect_stats:
+            self.request_stats = RequestStats()
+            self.add_observer(self.request_stats)
+        self.executor = executor
+        self.executor_min_bytes = 1048576 if executor_min_bytes is None else executor_min_bytes
+        self.executor_min_docs = 1000 if executor_min_docs is None else executor_min_docs
+        self.compress_responses = compress_responses
+        self.compress_updates = compress_updates
+        self._compression = {
+            'responses': 0,
+            'response_bytes_received': 0,
+            'response_bytes': 0,
+            'decompress_seconds': 0.0,
+            'requests': 0,
+            'request_bytes_sent': 0,
+            'request_bytes': 0,
+            'compress_seconds': 0.0,
+        }
+
+        # the connection pool
+        self._active = 0  # requests sent to the HTTP client and not finished
+        self._queued = 0  # requests waiting for a slot in self._slots
+        self._queue_timeouts = 0
+        if max_clients is None and http_backend is None and queue_timeout is None:
+            # Tornado's shared client, and it does the queueing
+            self._client = httpclient.AsyncHTTPClient(self._ioloop)
+            self._slots = None
+        else:
+            max_clients = max_clients or 10
+            client_class = self._http_client_class(http_backend or 'auto')
+            self._client = client_class(self._ioloop, force_instance=True, max_clients=max_clients)
+            # we queue requests ourselves, so the client never does and we know the queue depth
+            self._slots = locks.Semaphore(max_clients)
+        self.max_clients = max_clients
+        self.update_format = self._check_update_format(update_format or 'xml')
+        # set by the CommitScheduler constructor
+        self.commit_scheduler = None
 
     def _get_log(self):
         return LOG
 
-    def _create_full_url(self, path=''):
+    @staticmethod
+    def _http_client_class(http_backend):
+        "Returns the AsyncHTTPClient subclass for an ``http_backend`` argument."
+        if http_backend not in Solr.HTTP_BACKENDS:
+            raise ValueError(Solr._HTTP_BACKEND_ERROR.format(http_backend))
+        elif http_backend == 'simple' or (http_backend == 'auto' and curl_httpclient is None):
+            return simple_httpclient.SimpleAsyncHTTPClient
+        elif curl_httpclient is None:
+            raise ValueError(Solr._NO_CURL_ERROR)
+        else:
+            return curl_httpclient.CurlAsyncHTTPClient
+
+    def pool_stats(self):
+        """
+        Returns a dictionary describing how busy the connection pool is:
+
+        - ``backend``: ``'simple'`` or ``'curl'``
+        - ``max_clients``: the most requests that run at once
+        - ``active``: requests running now
+        - ``queued``: requests waiting for one of the running requests to finish
+        - ``queue_timeouts``: requests that failed because they waited too long in the queue
+        """
+        if curl_httpclient is not None and isinstance(self._client, curl_httpclient.CurlAsyncHTTPClient):
+            backend = 'curl'
+        else:
+            backend = 'simple'
+
+        if self._slots is None:
+            # Tornado's shared client counts its queue as active, and it may have other users
+            max_clients = getattr(self._client, 'max_clients', 10)
+            active = min(self._active, max_clients)
+            queued = self._active - active
+        else:
+            max_clients = self.max_clients
+            active = self._active
+            queued = self._queued
+
+        return {
+            'backend': backend,
+            'max_clients': max_clients,
+            'active': active,
+            'queued': queued,
+            'queue_timeouts': self._queue_timeouts,
+        }
+
+    def add_observer(self, observer):
+        """
+        Calls ``observer`` with a :class:`RequestRecord` after every request, once it succeeds or
+        fails. For queries, that's after the response is decoded. Exceptions from the ``observer``
+        are logged and otherwise ignored.
+
+        Usage::
+
+            def count(record):
+                histogram.labels(record.handler, record.status).observe(record.total_time)
+
+            solr.add_observer(count)
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        "Stops calling an ``observer`` added with :meth:`add_observer`."
+        self._observers.remove(observer)
+
+    def stats(self):
+        """
+        Returns a dictionary with a snapshot of every statistic we keep, which may be serialized to
+        JSON. Keys for features that aren't used are left out.
+
+        - ``requests``: the :meth:`RequestStats.snapshot`, with ``collect_stats``
+        - ``pool``: the :meth:`pool_stats`
+        - ``cache``: the :meth:`ResponseCache.stats`, with a ``cache``
+        - ``coalesced``: queries that shared a response, with ``coalesce``
+        - ``retries``: the :meth:`RetryPolicy.stats`, with a ``retry_policy``
+        - ``hedges``: the :meth:`HedgePolicy.stats`, with a ``hedge_policy``
+        - ``compression``: the :meth:`compression_stats`, with ``compress_responses`` or
+          ``compress_updates``
+        """
+        stats = {'pool': self.pool_stats()}
+        if self.request_stats is not None:
+            stats['requests'] = self.request_stats.snapshot()
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        if self.coalesce:
+            stats['coalesced'] = self.coalesced
+        if self.retry_policy is not None:
+            stats['retries'] = self.retry_policy.stats()
+        if self.hedge_policy is not None:
+            stats['hedges'] = self.hedge_policy.stats()
+        if self.compress_responses or self.compress_updates is not None:
+            stats['compression'] = self.compression_stats()
+        return stats
+
+    def render_prometheus(self, prefix='pysolrtornado', labels=None):
+        """
+        Returns the statistics of :meth:`stats` in the Prometheus text format, for an HTTP handler
+        that Prometheus scrapes. Every metric name starts with ``prefix``, and has the ``labels``
+        from a dictionary, if given, like ``{'collection': 'books'}`` to tell several
+        :class:`Solr` instances apart.
+
+        Usage::
+
+            class MetricsHandler(tornado.web.RequestHandler):
+                def get(self):
+                    self.set_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.write(solr.render_prometheus())
+        """
+        lines = []
+        if self.request_stats is not None:
+            lines.extend(self.request_stats.render_prometheus(prefix, labels))
+
+        label_set = _prometheus_labels(labels)
+        pool = self.pool_stats()
+        gauges = [
+            ('pool_active', 'gauge', 'Requests running now.', pool['active']),
+            ('pool_queued', 'gauge', 'Requests waiting for a connection.', pool['queued']),
+            ('pool_queue_timeouts_total', 'counter', 'Requests that waited too long for a connection.',
+             pool['queue_timeouts']),
+        ]
+        if self.cache is not None:
+            cache = self.cache.stats()
+            gauges.extend([
+                ('cache_hits_total', 'counter', 'Queries answered from the cache.', cache['hits']),
+                ('cache_misses_total', 'counter', 'Queries not in the cache.', cache['misses']),
+                ('cache_evictions_total', 'counter', 'Responses evicted from the cache.', cache['evictions']),
+                ('cache_entries', 'gauge', 'Responses in the cache.', cache['entries']),
+                ('cache_bytes', 'gauge', 'Size of the responses in the cache.', cache['bytes']),
+            ])
+        if self.coalesce:
+            gauges.append(('coalesced_total', 'counter', 'Queries that shared a response.', self.coalesced))
+        for metric, kind, help_text, value in gauges:
+            lines.append('# HELP {}_{} {}'.format(prefix, metric, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, metric, kind))
+            lines.append('{}_{}{} {}'.format(prefix, metric, label_set, value))
+        return '\n'.join(lines) + '\n'
+
+    def _notify(self, record):
+        record.total_time = time.time() - record.start_time
+        for observer in self._observers:
+            try:
+                observer(record)
+            except Exception:
+                self.log.exception("Observer %r failed.", observer)
+
+    def compression_stats(self):
+        """
+        Returns a dictionary describing the compression of responses (with ``compress_responses``)
+        and of update messages (with ``compress_updates``):
+
+        - ``responses``: compressed responses received
+        - ``response_bytes_received``: their size as received
+        - ``response_bytes``: their size after decompressing
+        - ``response_bytes_saved``: the difference
+        - ``decompress_seconds``: time spent decompressing
+        - ``requests``: compressed update messages sent
+        - ``request_bytes_sent``: their size as sent
+        - ``request_bytes``: their size before compressing
+        - ``request_bytes_saved``: the difference
+        - ``compress_seconds``: time spent compressing
+        """
+        stats = dict(self._compression)
+        stats['response_bytes_saved'] = stats['response_bytes'] - stats['response_bytes_received']
+        stats['request_bytes_saved'] = stats['request_bytes'] - stats['request_bytes_sent']
+        return stats
+
+    def _compress(self, data, compressor=None, flush=False):
+        """
+        Returns ``data`` gzipped, counting it in :meth:`compression_stats`. With a ``compressor``
+        from :func:`zlib.compressobj`, compresses part of a stream, which ends with ``flush``.
+        """
+        start = time.time()
+        if compressor is None:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            flush = True
+        compressed = compressor.compress(data)
+        if flush:
+            compressed += compressor.flush()
+        self._compression['compress_seconds'] += time.time() - start
+        self._compression['request_bytes'] += len(data)
+        self._compression['request_bytes_sent'] += len(compressed)
+        return compressed
+
+    def _compress_producer(self, body_producer):
+        "Returns a Tornado body producer that gzips the output of ``body_producer``."
+        @gen.coroutine
+        def producer(write):
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+            def compressed_write(data):
+                compressed = self._compress(data, compressor)
+                if compressed:
+                    return write(compressed)
+                return gen.moment
+
+            yield body_producer(compressed_write)
+            yield write(self._compress(b'', compressor, flush=True))
+            self._compression['requests'] += 1
+
+        return producer
+
+    def _check_update_format(self, update_format):
+        if update_format not in Solr.UPDATE_FORMATS:
+            raise ValueError(Solr._UPDATE_FORMAT_ERROR.format(update_format))
+        return update_format
+
+    def _check_response_format(self, response_format):
+        if response_format not in Solr.RESPONSE_FORMATS:
+            raise ValueError(Solr._RESPONSE_FORMAT_ERROR.format(response_format))
+        return response_format
+
+    def _create_full_url(self, path='', base_url=None):
+        base_url = self.url if base_url is None else base_url
         if len(path):
-            return '/'.join([self.url.rstrip('/'), path.lstrip('/')])
+            return '/'.join([base_url.rstrip('/'), path.lstrip('/')])
 
         # No path? No problem.
+        return base_url
+
+    def _select_node(self, path, exclude=()):
+        """
+        Choose the base URL for a request to ``path``, avoiding the URLs in ``exclude`` if possible.
+
+        Every call is paired with a call to :meth:`_node_done`. A :class:`Solr` only has one URL;
+        :class:`SolrPool` overrides this to balance requests across its nodes.
+        """
         return self.url
 
+    def _node_done(self, base_url, elapsed, failed):
+        """
+        Called when a request to ``base_url`` finishes, after ``elapsed`` seconds. ``failed`` is
+        ``True`` if there was no response, or Solr returned an error.
+        """
+        pass
+
     @gen.coroutine
-    def _send_request(self, method, path='', body=None, headers=None, files=None):
-        url = self._create_full_url(path)
+    def _send_request(self, method, path='', body=None, headers=None, files=None, body_producer=None,
+                      streaming_callback=None, binary=False, record=None):
+        """
+        Sends a request to Solr, with retries and hedging, and returns the response body.
+
+        With a ``record``, the :class:`RequestRecord` is filled in, and the caller tells the
+        observers. Otherwise we make one if there are observers, and tell them.
+        """
         method = method.upper()
         log_body = body
 
@@ -369,11 +2774,8 @@ class Solr(object):
         if log_body is None:
             log_body = ''
         elif not isinstance(log_body, str):
-            log_body = repr(body)
-
-        self.log.debug("Starting request to '%s' (%s) with body '%s'...",
-                       url, method, log_body[:10])
-        start_time = time.time()
+            # only repr() what we log; update bodies may be many megabytes
+            log_body = repr(body[:10])
 
         if files is not None:
             raise NotImplementedError('The "files" parameter in _send_request() does not work in Tornado yet')
@@ -385,13 +2787,197 @@ class Solr(object):
         if bytes_body is not None:
             bytes_body = force_bytes(body)
 
-        # prepare the request
-        request = httpclient.HTTPRequest(url, method=method, headers=headers, body=bytes_body,
-                                            request_timeout=self.timeout)
+        if self.retry_policy is not None:
+            self.retry_policy.record_request()
+
+        # a body producer can only run once, and a streaming callback would get the body twice
+        one_shot = body_producer is not None or streaming_callback is not None
+        hedge = (self.hedge_policy is not None and not one_shot and
+                 self.hedge_policy.applies_to(path))
+
+        own_record = record is None and len(self._observers) > 0
+        if own_record:
+            record = RequestRecord()
+        if record is not None:
+            record.handler = _handler_name(path)
+            record.method = method
+
+        attempt = 1
+        tried = []  # base URLs
+        while True:
+            if record is not None:
+                record.attempts = attempt
+            try:
+                if hedge:
+                    resp = yield self._send_hedged(method, path, headers, bytes_body, log_body, tried, record)
+                else:
+                    resp = yield self._send_once(method, path, headers, bytes_body, body_producer, log_body, tried,
+                                                 streaming_callback, record)
+            except SolrError as the_error:
+                delay = None
+                if self.retry_policy is not None and not one_shot:
+                    delay = self.retry_policy.retry_delay(method, path, the_error, attempt)
+                if delay is None:
+                    if record is not None:
+                        record.error = record.error or type(the_error).__name__
+                        if own_record:
+                            self._notify(record)
+                    raise
+                self.log.warning("Retrying '%s' (%s) in %0.3f seconds after: %s", path, method, delay, the_error)
+                yield gen.sleep(delay)
+                attempt += 1
+            else:
+                if own_record:
+                    self._notify(record)
+                return resp.body if binary else force_unicode(resp.body)
+
+    @gen.coroutine
+    def _send_hedged(self, method, path, headers, bytes_body, log_body, tried, record=None):
+        """
+        Make one attempt at a request for :meth:`_send_request` like :meth:`_send_once`, but send
+        a second copy of the request if the first is slow, according to the :class:`HedgePolicy`.
+
+        The ``record`` gets the measurements of whichever copy is used.
+        """
+        policy = self.hedge_policy
+        start_time = time.time()
+        # each copy has its own record, since the loser finishes whenever it likes
+        records = [None, None] if record is None else [RequestRecord(), RequestRecord()]
+        first = self._send_once(method, path, headers, bytes_body, None, log_body, tried, record=records[0])
+        try:
+            resp = yield gen.with_timeout(datetime.timedelta(seconds=policy.hedge_delay()), first,
+                                          quiet_exceptions=SolrError)
+        except gen.TimeoutError:
+            pass
+        except SolrError:
+            if record is not None:
+                record._copy_attempt(records[0])
+            raise
+        else:
+            policy.record_latency(time.time() - start_time)
+            if record is not None:
+                record._copy_attempt(records[0])
+            return resp
+
+        if not policy.take():
+            try:
+                resp = yield first
+            finally:
+                if record is not None:
+                    record._copy_attempt(records[0])
+            policy.record_latency(time.time() - start_time)
+            return resp
+
+        self.log.info("Hedging '%s' (%s) after %0.3f seconds.", path, method, time.time() - start_time)
+        if record is not None:
+            record.hedged = True
+        second = self._send_once(method, path, headers, bytes_body, None, log_body, tried, record=records[1])
+        for future in (first, second):
+            # the loser's error is nobody's business
+            future.add_done_callback(lambda future: future.exception())
+
+        waiter = gen.WaitIterator(first, second)
+        the_error = None
+        while not waiter.done():
+            try:
+                resp = yield waiter.next()
+            except SolrError as exc:
+                the_error = exc
+                if record is not None:
+                    record._copy_attempt(records[waiter.current_index])
+            else:
+                if waiter.current_index == 1:
+                    policy.wins += 1
+                policy.record_latency(time.time() - start_time)
+                if record is not None:
+                    record._copy_attempt(records[waiter.current_index])
+                return resp
+        raise the_error
 
+    @gen.coroutine
+    def _send_once(self, method, path, headers, bytes_body, body_producer, log_body, tried,
+                   streaming_callback=None, record=None):
+        """
+        Make one attempt at a request for :meth:`_send_request`, and return the response.
+
+        With a ``streaming_callback``, the response body goes to the callback, chunk by chunk.
+
+        The base URL of the node we choose is appended to ``tried``. The measurements of this
+        attempt go in the ``record``, if there is one.
+        """
+        if record is not None:
+            record.url = record.status = record.request_time = record.error = None
+            record.time_info = {}
+            record.bytes_sent = 0 if bytes_body is None else len(bytes_body)
+            record.bytes_received = 0
+            queue_start = time.time()
+
+        if self._slots is not None:
+            self._queued += 1
+            try:
+                if self.queue_timeout is None:
+                    yield self._slots.acquire()
+                else:
+                    yield self._slots.acquire(datetime.timedelta(seconds=self.queue_timeout))
+            except gen.TimeoutError as exc:
+                self._queue_timeouts += 1
+                if record is not None:
+                    record.error = type(exc).__name__
+                raise SolrError(Solr._FETCH_QUEUE_ERROR.format(self._create_full_url(path)))
+            finally:
+                self._queued -= 1
+
+        # from here on, the "finally" clause gives back the slot and the node
+        self._active += 1
+        failed = True
+        base_url = None
+        url = path
+        start_time = time.time()
         try:
+            base_url = self._select_node(path, exclude=tried)
+            tried.append(base_url)
+            url = self._create_full_url(path, base_url=base_url)
+            if record is not None:
+                record.url = url
+                record.queue_time = time.time() - queue_start
+                if body_producer is not None:
+                    body_producer = self._counting_producer(body_producer, record)
+
+            self.log.debug("Starting request to '%s' (%s) with body '%s'...",
+                           url, method, log_body[:10])
+
+            # prepare the request
+            # NOTE: with a "body_producer" and no Content-Length header, Tornado sends the body with
+            #       chunked transfer encoding, so we never need to know its size in advance
+            decompressor = None
+            header_callback = None
+            if self.compress_responses:
+                decompressor = _ResponseDecompressor(self._compression, streaming_callback)
+                header_callback = decompressor.on_header
+                headers = dict(headers, **{'Accept-Encoding': 'gzip, deflate'})
+                if streaming_callback is not None:
+                    streaming_callback = decompressor.on_chunk
+            if record is not None and streaming_callback is not None:
+                streaming_callback = self._counting_callback(streaming_callback, record)
+            request = httpclient.HTTPRequest(url, method=method, headers=headers, body=bytes_body,
+                                             body_producer=body_producer, request_timeout=self.timeout,
+                                             connect_timeout=self.connect_timeout,
+                                             streaming_callback=streaming_callback,
+                                             header_callback=header_callback,
+                                             decompress_response=decompressor is None)
+
             # run the request
-            resp = yield self._client.fetch(request)
+            try:
+                resp = yield self._client.fetch(request)
+            except Exception as exc:
+                if record is not None:
+                    self._record_response(record, getattr(exc, 'response', None), exc, start_time)
+                raise
+            if record is not None:
+                self._record_response(record, resp, None, start_time)
+            if decompressor is not None:
+                resp = decompressor.finish(resp)
+            failed = False
         except UnicodeError:
             # when the URL is empty or too long or something
             # NOTE: must come before ValueError, since UnicodeError is a subclass of ValueError
@@ -406,56 +2992,244 @@ class Solr(object):
             # unknown HTTP method
             raise SolrError(Solr._FETCH_KEY_ERROR.format(method))
         except ConnectionError:
-            # could be various things
-            raise SolrError(Solr._FETCH_CONN_ERROR.format(url))
+            # could be various things, but there was no HTTP response
+            raise SolrError(Solr._FETCH_CONN_ERROR.format(url), code=599)
         except httpclient.HTTPError as the_error:
-            # Solr returned an error
-            # TODO: this fails with a 599 (timeout, or something else when there was no HTTP response at all)
-            error_message = '{}: {}'.format(the_error.code, the_error.response.reason)
+            # Solr returned an error, or there was no response at all (code 599, like a timeout)
+            if the_error.response is None:
+                error_message = '{}: {}'.format(the_error.code, the_error.message)
+            else:
+                error_message = '{}: {}'.format(the_error.code, the_error.response.reason)
             self.log.error(error_message, extra={'data': {'headers': the_error.response,
                                                           'response': the_error.response}})
-            raise SolrError(error_message)
+            raise SolrError(error_message, code=the_error.code)
+        finally:
+            self._active -= 1
+            if self._slots is not None:
+                self._slots.release()
+            if base_url is not None:
+                self._node_done(base_url, time.time() - start_time, failed)
 
         end_time = time.time()
         self.log.info("Finished '%s' (%s) with body '%s' in %0.3f seconds.",
                       url, method, log_body[:10], end_time - start_time)
 
-        return force_unicode(resp.body)
+        return resp
+
+    @staticmethod
+    def _record_response(record, resp, error, start_time):
+        "For :meth:`_send_once`, fills in the ``record`` with the response or ``error``."
+        if error is not None:
+            record.error = type(error).__name__
+            record.status = getattr(error, 'code', None)
+            if isinstance(error, ConnectionError):
+                record.status = 599
+        if resp is not None:
+            record.status = resp.code
+            record.request_time = resp.request_time
+            record.time_info = dict(resp.time_info or {})
+            if resp.request.streaming_callback is None:
+                record.bytes_received = len(resp.body or b'')
+        if record.request_time is None:
+            record.request_time = time.time() - start_time
+
+    @staticmethod
+    def _counting_callback(streaming_callback, record):
+        "Wraps a ``streaming_callback`` to count the bytes received in the ``record``."
+        def counting_callback(chunk):
+            record.bytes_received += len(chunk)
+            streaming_callback(chunk)
+        return counting_callback
+
+    @staticmethod
+    def _counting_producer(body_producer, record):
+        "Wraps a ``body_producer`` to count the bytes sent in the ``record``."
+        def counting_producer(write):
+            def counting_write(chunk):
+                record.bytes_sent += len(chunk)
+                return write(chunk)
+            return body_producer(counting_write)
+        return counting_producer
 
     @gen.coroutine
-    def _select(self, params):
-        # specify json encoding of results
-        params['wt'] = 'json'
+    def _select(self, params, streaming_callback=None, record=None):
+        # specify json encoding of results, unless we were asked for javabin
+        params.setdefault('wt', 'json')
+        binary = self._binary_response(params['wt'])
         params_encoded = safe_urlencode(params, True)
 
         if len(params_encoded) < 1024:
             # Typical case.
             path = 'select/?%s' % params_encoded
-            return (yield self._send_request('get', path))
+            return (yield self._send_request('get', path, streaming_callback=streaming_callback, binary=binary,
+                                             record=record))
         else:
             # Handles very long queries by submitting as a POST.
             path = 'select/'
             headers = {
                 'Content-type': 'application/x-www-form-urlencoded; charset=utf-8',
             }
-            return (yield self._send_request('post', path, body=params_encoded, headers=headers))
+            return (yield self._send_request('post', path, body=params_encoded, headers=headers,
+                                             streaming_callback=streaming_callback, binary=binary, record=record))
+
+    @gen.coroutine
+    def _query(self, handler, params, use_cache=True, stream=False, raw=False):
+        """
+        Runs a read-only query with ``handler`` (like :meth:`_select`) and returns the decoded
+        response, from :attr:`cache` if possible. With ``stream``, the documents are decoded while
+        the response arrives. With ``raw``, returns the response text without decoding it.
+        """
+        params.setdefault('wt', self.response_format)
+        self._check_response_format(params['wt'])
+
+        cache = self.cache if use_cache else None
+        if cache is not None or self.coalesce:
+            key = (handler.__name__, raw, safe_urlencode(sorted(params.items(), key=lambda item: item[0]), True))
+
+        if cache is not None:
+            decoded = cache.get(key)
+            if decoded is not None:
+                return decoded
+
+        if not self.coalesce:
+            decoded, size = yield self._fetch_decoded(handler, params, stream, raw)
+        elif key in self._in_flight:
+            self.coalesced += 1
+            decoded, size = yield self._in_flight[key]
+            return decoded
+        else:
+            future = self._in_flight[key] = self._fetch_decoded(handler, params, stream, raw)
+            future.add_done_callback(lambda future: self._in_flight.pop(key, None))
+            decoded, size = yield future
+
+        if cache is not None:
+            cache.set(key, decoded, size)
+        return decoded
+
+    @gen.coroutine
+    def _fetch_decoded(self, handler, params, stream=False, raw=False):
+        "For :meth:`_query`, returns the decoded response and its size before decoding."
+        if not self._observers:
+            return (yield self._fetch_and_decode(handler, params, stream, raw))
+
+        record = RequestRecord()
+        try:
+            decoded, size = yield self._fetch_and_decode(handler, params, stream, raw, record)
+        except Exception as exc:
+            record.error = record.error or type(exc).__name__
+            self._notify(record)
+            raise
+        if not raw and isinstance(decoded, dict):
+            record.qtime = decoded.get('responseHeader', {}).get('QTime')
+        self._notify(record)
+        return decoded, size
+
+    @gen.coroutine
+    def _fetch_and_decode(self, handler, params, stream=False, raw=False, record=None):
+        """
+        For :meth:`_fetch_decoded`, returns the decoded response and its size before decoding.
+        With a ``record``, the request is measured too.
+        """
+        # handlers only take a record if there is one, so subclasses don't have to
+        kwargs = {} if record is None else {'record': record}
+        if raw:
+            response = force_unicode((yield handler(params, **kwargs)))
+            return response, len(response)
+        elif not stream or params['wt'] == 'javabin':
+            response = yield handler(params, **kwargs)
+            decode_start = time.time()
+            if params['wt'] == 'javabin':
+                try:
+                    decoded = yield self._decode(response, 'javabin')
+                except ValueError as exc:
+                    raise SolrError('Cannot parse the response: {}'.format(exc))
+            else:
+                decoded = yield self._decode(response)
+            if self.schema is not None:
+                self.schema.convert_response(decoded)
+            if record is not None:
+                record.decode_time = time.time() - decode_start
+            return decoded, len(response)
+
+        parser = _DocStreamParser(self.decoder)
+        docs = []
+        state = {'size': 0, 'error': None, 'decode_time': 0.0}
+
+        def on_chunk(chunk):
+            state['size'] += len(chunk)
+            if state['error'] is None:
+                decode_start = time.time()
+                try:
+                    docs.extend(parser.feed(chunk))
+                except ValueError as exc:
+                    state['error'] = exc
+                state['decode_time'] += time.time() - decode_start
+
+        # a failed request raises SolrError here, even if the error body couldn't be parsed
+        yield handler(params, streaming_callback=on_chunk, **kwargs)
+        decode_start = time.time()
+        try:
+            if state['error'] is not None:
+                raise state['error']
+            last_docs, decoded = parser.close()
+        except ValueError as exc:
+            raise SolrError('Cannot parse the response: {}'.format(exc))
+
+        docs.extend(last_docs)
+        response_part = decoded.get('response')
+        if isinstance(response_part, dict) and 'docs' in response_part:
+            response_part['docs'] = docs
+        if self.schema is not None:
+            self.schema.convert_response(decoded)
+        if record is not None:
+            record.decode_time = state['decode_time'] + time.time() - decode_start
+        return decoded, state['size']
+
+    @gen.coroutine
+    def _decode(self, response, response_format='json'):
+        "Decodes a response for :meth:`_fetch_decoded`, with the :attr:`executor` if it's large."
+        # our own decoder can't be pickled for a process pool, but it's the same as the default
+        decoder = None if self.decoder is self._default_decoder else self.decoder
+        if self.executor is not None and len(response) >= self.executor_min_bytes:
+            return (yield self.executor.submit(_decode_response, response, response_format, decoder))
+        return _decode_response(response, response_format, decoder)
 
     @gen.coroutine
-    def _mlt(self, params):
-        # specify json encoding of results
-        params['wt'] = 'json'
+    def _build_add(self, docs, update_format, boost=None, fieldUpdates=None, commitWithin=None):
+        "Builds the message for :meth:`add`, with the :attr:`executor` if there are many ``docs``."
+        if (self.executor is not None and isinstance(docs, (list, tuple)) and
+                len(docs) >= self.executor_min_docs):
+            # another process only gets our class, since we can't be pickled
+            solr = type(self) if isinstance(self.executor, futures.ProcessPoolExecutor) else self
+            return (yield self.executor.submit(_build_add_message, solr, update_format, docs, boost, fieldUpdates,
+                                               commitWithin))
+        return _build_add_message(self, update_format, docs, boost, fieldUpdates, commitWithin)
+
+    @gen.coroutine
+    def _mlt(self, params, streaming_callback=None, record=None):
+        # specify json encoding of results, unless we were asked for javabin
+        params.setdefault('wt', 'json')
         path = 'mlt/?%s' % safe_urlencode(params, True)
-        return (yield self._send_request('get', path))
+        return (yield self._send_request('get', path, streaming_callback=streaming_callback,
+                                         binary=self._binary_response(params['wt']), record=record))
 
     @gen.coroutine
-    def _suggest_terms(self, params):
-        # specify json encoding of results
-        params['wt'] = 'json'
+    def _suggest_terms(self, params, record=None):
+        # specify json encoding of results, unless we were asked for javabin
+        params.setdefault('wt', 'json')
         path = 'terms/?%s' % safe_urlencode(params, True)
-        return (yield self._send_request('get', path))
+        return (yield self._send_request('get', path, binary=self._binary_response(params['wt']), record=record))
+
+    def _binary_response(self, response_format):
+        """
+        Whether the query handlers should return the response as bytes rather than a Unicode
+        string: for javabin, and for JSON if the :attr:`decoder` accepts bytes.
+        """
+        return response_format == 'javabin' or getattr(self.decoder, 'accepts_bytes', False)
 
     @gen.coroutine
-    def _update(self, message, clean_ctrl_chars=True, commit=True, softCommit=False, waitFlush=None, waitSearcher=None):
+    def _update(self, message, clean_ctrl_chars=True, commit=True, softCommit=False, waitFlush=None, waitSearcher=None,
+                content_type=None, body_producer=None, commitWithin=None, compress_stream=False):
         """
         Posts the given xml message to http://<self.url>/update and
         returns the result.
@@ -464,6 +3238,19 @@ class Solr(object):
         of control characters (default True). This is done by default because
         these characters would cause Solr to fail to parse the XML. Only pass
         False if you're positive your data is clean.
+
+        Passing ``content_type`` lets you post a message that isn't XML, like the JSON update
+        commands built by :meth:`_build_json_add`. Default is ``'text/xml; charset=utf-8'``.
+
+        Passing ``body_producer`` instead of ``message`` streams the message to Solr. It must be a
+        Tornado body producer, as for :class:`tornado.httpclient.HTTPRequest`, and it is
+        responsible for cleaning its own output.
+
+        Passing ``commitWithin`` (in milliseconds) asks Solr to commit the whole update within
+        that time, whatever kind of update it is.
+
+        Passing ``compress_stream`` as True gzips the output of ``body_producer``. A ``message``
+        is gzipped if it's at least ``compress_updates`` bytes.
         """
         path = 'update/'
 
@@ -483,14 +3270,28 @@ class Solr(object):
         if waitSearcher is not None:
             query_vars.append('waitSearcher=%s' % str(bool(waitSearcher)).lower())
 
+        if commitWithin is not None:
+            query_vars.append('commitWithin=%d' % int(commitWithin))
+
         if query_vars:
             path = '%s?%s' % (path, '&'.join(query_vars))
 
         # Clean the message of ctrl characters.
-        if clean_ctrl_chars:
+        if clean_ctrl_chars and message is not None:
             message = sanitize(message)
 
-        return (yield self._send_request('post', path, message, {'Content-type': 'text/xml; charset=utf-8'}))
+        content_type = content_type or _XML_CONTENT_TYPE
+        headers = {'Content-type': content_type}
+        if body_producer is not None and compress_stream:
+            headers['Content-Encoding'] = 'gzip'
+            body_producer = self._compress_producer(body_producer)
+        elif message is not None and self.compress_updates is not None:
+            message = force_bytes(message)
+            if len(message) >= self.compress_updates:
+                headers['Content-Encoding'] = 'gzip'
+                message = self._compress(message)
+                self._compression['requests'] += 1
+        return (yield self._send_request('post', path, message, headers, body_producer=body_producer))
 
     # TODO: convert to @staticmethod
     def _extract_error(self, resp):
@@ -610,10 +3411,33 @@ class Solr(object):
         return clean_xml_string(value)
 
     # TODO: convert to @staticmethod
-    def _to_python(self, value):
+    def _to_json_value(self, value):
+        """
+        Converts python values to a form suitable for a JSON update command.
+
+        This is the JSON counterpart to :meth:`_from_python`. Numbers and booleans are left alone,
+        since JSON has native types for them.
+        """
+        if hasattr(value, 'strftime'):
+            if hasattr(value, 'hour'):
+                return "%sZ" % value.isoformat()
+            else:
+                return "%sT00:00:00Z" % value.isoformat()
+        elif isinstance(value, (bool, int, long, float)):
+            return value
+
+        return force_unicode(value)
+
+    def _to_python(self, value, field=None):
         """
         Converts values from Solr to native Python values.
+
+        If you give the ``field`` name, and called :meth:`load_schema`, the value is converted
+        according to the schema. Otherwise we guess the type from the value.
         """
+        if field is not None and self.schema is not None:
+            return self.schema.convert_value(field, value)
+
         if isinstance(value, (int, float, long, complex)):
             return value
 
@@ -681,56 +3505,253 @@ class Solr(object):
             if isinstance(value, basestring) and len(value) == 0:
                 return True
 
-        # TODO: This should probably be removed when solved in core Solr level?
-        return False
+        # TODO: This should probably be removed when solved in core Solr level?
+        return False
+
+    # API Methods ############################################################
+
+    @gen.coroutine
+    def search(self, q, use_cache=True, **kwargs):
+        """
+        Performs a search and returns the results.
+
+        Requires a ``q`` for a string version of the query to run.
+
+        Optionally accepts ``use_cache``. Pass ``False`` to skip the :class:`ResponseCache`.
+
+        Optionally accepts ``**kwargs`` for additional options to be passed
+        through the Solr URL.
+
+        Using the ``df`` keyword argument (specifying a default field) is strongly recommended, and
+        indeed required for Solr 5.
+
+        Returns ``self.results_cls`` class object (defaults to
+        ``pysolr.Results``)
+
+        Usage::
+
+            # All docs.
+            results = solr.search('*:*')
+
+            # Search with highlighting.
+            results = solr.search('ponies', **{
+                'hl': 'true',
+                'hl.fragsize': 10,
+            })
+
+        """
+        params = {'q': q}
+        params.update(kwargs)
+        params.setdefault('wt', self.response_format)
+
+        if getattr(self.results_cls, 'raw_payload', False) and params['wt'] == 'json':
+            # the results class decodes the response itself
+            results = self.results_cls((yield self._query(self._select, params, use_cache, raw=True)))
+            self.log.debug("Found '%s' search results.", results.hits)
+            return results
+
+        decoded = yield self._query(self._select, params, use_cache, self.stream_decode)
+
+        self.log.debug(
+            "Found '%s' search results.",
+            # cover both cases: there is no response key or value is None
+            (decoded.get('response', {}) or {}).get('numFound', 0)
+        )
+        return self.results_cls(decoded)
+
+    @gen.coroutine
+    def search_many(self, queries, concurrency=None, deadline=None):
+        """
+        Runs several searches at once, and returns a list with the result of each, in order.
+
+        Requires ``queries``, a list of queries for :meth:`search`. Each is either a ``q`` string,
+        or a two-tuple of ``q`` and a dictionary of the other arguments.
+
+        Optionally accepts ``concurrency``, the most searches to run at once. The others wait their
+        turn. Default is ``max_clients``, or ``10`` with the shared client.
+
+        Optionally accepts ``deadline``, in seconds, for the whole batch. Searches that haven't
+        finished by then fail. Tornado can't cancel a request, so a search that's already running
+        continues in the background, but no more searches start.
+
+        A search that fails doesn't stop the others: its place in the list holds the
+        :exc:`SolrError` instead of the results.
+
+        Usage::
+
+            results, counts, related = yield solr.search_many([
+                ('ponies', {'rows': 20}),
+                ('ponies', {'rows': 0, 'facet': 'true', 'facet.field': 'colour'}),
+                'horses',
+            ], concurrency=5, deadline=0.5)
+        """
+        queries = [(query, {}) if isinstance(query, str) else query for query in queries]
+        slots = locks.Semaphore(concurrency or self.max_clients or 10)
+        end = None if deadline is None else self._ioloop.time() + deadline
+
+        @gen.coroutine
+        def run(q, kwargs):
+            try:
+                yield slots.acquire(end)
+            except gen.TimeoutError:
+                return SolrError(Solr._DEADLINE_ERROR.format(q))
+
+            search = self.search(q, **kwargs)
+            # the slot stays taken until the request really finishes
+            search.add_done_callback(lambda future: slots.release())
+            try:
+                if end is None:
+                    return (yield search)
+                return (yield gen.with_timeout(end, search, quiet_exceptions=SolrError))
+            except gen.TimeoutError:
+                return SolrError(Solr._DEADLINE_ERROR.format(q))
+            except SolrError as exc:
+                return exc
+
+        results = yield [run(q, kwargs) for q, kwargs in queries]
+        failed = sum(1 for result in results if isinstance(result, SolrError))
+        if failed:
+            self.log.warning("%d of %d searches failed.", failed, len(results))
+        return results
+
+    @gen.coroutine
+    def search_csv(self, q, types=None, **kwargs):
+        """
+        Performs a search like :meth:`search`, but asks Solr for CSV, which is much smaller than
+        JSON for wide, flat results. The rows are parsed while the response arrives.
+
+        Requires a ``q`` for a string version of the query to run.
+
+        Optionally accepts ``types``, a dictionary from field names to the type of their values:
+        ``int``, ``float``, ``bool``, ``str``, ``datetime.datetime``, or any function that converts
+        the text. Put the type in a list, like ``[int]``, for a multivalued field. Fields that
+        aren't in ``types`` are converted with the :attr:`schema` if it's loaded, and otherwise
+        stay strings. Empty values are left out, like missing fields in :meth:`search`.
+
+        Optionally accepts ``**kwargs`` for additional options to be passed through the Solr URL,
+        like ``fl``, ``rows``, and the ``csv.*`` options of Solr's CSV writer.
+
+        Returns a :class:`Results` instance, or ``self.results_cls`` if that accepts decoded
+        responses. CSV has no highlighting, facets, or other response sections, and no total
+        number of matches, so :attr:`Results.hits` is the number of rows received.
+
+        Usage::
+
+            results = yield solr.search_csv('*:*', fl='id,price,tags', rows=100000,
+                                            types={'price': float, 'tags': [str]})
+        """
+        params = {'q': q}
+        params.update(kwargs)
+        params['wt'] = 'csv'
+        mv_separator = params.get('csv.mv.separator', params.get('csv.separator', ','))
+        mv_escape = params.get('csv.mv.escape', '\\')
+        parser = _CsvStreamParser(types, self.schema, mv_separator, mv_escape)
+        docs = []
+        state = {'error': None}
+
+        def on_chunk(chunk):
+            if state['error'] is None:
+                try:
+                    docs.extend(parser.feed(chunk))
+                except (ValueError, csv.Error) as exc:
+                    state['error'] = exc
+
+        # a failed request raises SolrError here
+        yield self._select(params, streaming_callback=on_chunk)
+        try:
+            if state['error'] is not None:
+                raise state['error']
+            docs.extend(parser.close())
+        except (ValueError, csv.Error) as exc:
+            raise SolrError('Cannot parse the response: {}'.format(exc))
+
+        self.log.debug("Found '%s' search results.", len(docs))
+        results_cls = Results if getattr(self.results_cls, 'raw_payload', False) else self.results_cls
+        return results_cls({'response': {'numFound': len(docs), 'start': int(params.get('start', 0)), 'docs': docs}})
+
+    @gen.coroutine
+    def load_schema(self):
+        """
+        Fetches the field definitions from Solr's Schema API, and returns a
+        :class:`SchemaConverter` for them. It's also saved as :attr:`schema`, so that
+        :meth:`search` and :meth:`more_like_this` use it to convert the documents they return.
+
+        Call this again after changing the schema. :class:`LazyResults` aren't converted.
+
+        Requires Solr 5+.
+        """
+        responses = yield [self._send_request('get', 'schema/fields?wt=json&showDefaults=true'),
+                           self._send_request('get', 'schema/fieldtypes?wt=json'),
+                           self._send_request('get', 'schema/dynamicfields?wt=json&showDefaults=true')]
+        fields, field_types, dynamic_fields = [self.decoder.decode(response) for response in responses]
+        self.schema = SchemaConverter(fields.get('fields', ()), field_types.get('fieldTypes', ()),
+                                      dynamic_fields.get('dynamicFields', ()))
+        self.log.debug("Loaded the schema with %d fields.", len(fields.get('fields', ())))
+        return self.schema
+
+    def search_iter(self, q, pages=False, prefetch=True, **kwargs):
+        """
+        Returns a :class:`SearchIterator` over every document that matches a query.
+
+        This uses Solr's ``cursorMark`` deep paging, which stays fast however deep you go, unlike
+        paging with ``start`` and ``rows``.
+
+        Requires a ``q`` for a string version of the query to run.
+
+        Optionally accepts ``pages``. If ``True``, the iterator produces a :class:`Results`
+        instance for every page, instead of the documents one at a time. Default is ``False``.
+
+        Optionally accepts ``prefetch``. If ``True``, the next page is requested while the
+        caller works through the current page. Default is ``True``.
+
+        Optionally accepts ``**kwargs`` for additional options to be passed through the Solr URL,
+        as for :meth:`search`. Set ``rows`` to choose the page size. Solr requires a ``sort`` that
+        includes the uniqueKey field, which is ``'id asc'`` if you don't give one. To continue
+        from an earlier cursor, give it as ``cursorMark``.
+
+        Requires Solr 4.7+.
+
+        Usage::
 
-    # API Methods ############################################################
+            results = solr.search_iter('*:*', sort='id asc', rows=1000)
+            while (yield results.fetch_next):
+                doc = results.next_object()
+        """
+        return SearchIterator(self, q, pages=pages, prefetch=prefetch, **kwargs)
 
-    @gen.coroutine
-    def search(self, q, **kwargs):
+    def export(self, q, fl, sort, **kwargs):
         """
-        Performs a search and returns the results.
+        Returns an :class:`ExportIterator` over every document that matches a query, from Solr's
+        ``/export`` handler.
 
-        Requires a ``q`` for a string version of the query to run.
+        The export is much cheaper than a search for dumping large result sets, and the documents
+        are parsed as they arrive, so the whole response is never held in memory.
 
-        Optionally accepts ``**kwargs`` for additional options to be passed
-        through the Solr URL.
+        Requires a ``q`` for a string version of the query to run, a ``fl`` with the fields to
+        export, and a ``sort``. Solr requires that all of these fields have docValues.
 
-        Using the ``df`` keyword argument (specifying a default field) is strongly recommended, and
-        indeed required for Solr 5.
+        Optionally accepts ``**kwargs`` for additional options to be passed through the Solr URL,
+        like ``fq``.
 
-        Returns ``self.results_cls`` class object (defaults to
-        ``pysolr.Results``)
+        Requires Solr 5+.
 
         Usage::
 
-            # All docs.
-            results = solr.search('*:*')
-
-            # Search with highlighting.
-            results = solr.search('ponies', **{
-                'hl': 'true',
-                'hl.fragsize': 10,
-            })
-
+            docs = solr.export('*:*', 'id,price', 'id asc')
+            while (yield docs.fetch_next):
+                doc = docs.next_object()
         """
-        params = {'q': q}
+        params = {'q': q, 'fl': fl, 'sort': sort, 'wt': 'json'}
         params.update(kwargs)
-        response = yield self._select(params)
-        decoded = self.decoder.decode(response)
-
-        self.log.debug(
-            "Found '%s' search results.",
-            # cover both cases: there is no response key or value is None
-            (decoded.get('response', {}) or {}).get('numFound', 0)
-        )
-        return self.results_cls(decoded)
+        return ExportIterator(self, 'export?%s' % safe_urlencode(params, True))
 
     @gen.coroutine
-    def more_like_this(self, q, mltfl, **kwargs):
+    def more_like_this(self, q, mltfl, use_cache=True, **kwargs):
         """
         Finds and returns results similar to the provided query.
 
+        Optionally accepts ``use_cache``. Pass ``False`` to skip the :class:`ResponseCache`.
+
         Returns ``self.results_cls`` class object (defaults to
         ``pysolr.Results``)
 
@@ -746,8 +3767,15 @@ class Solr(object):
             'mlt.fl': mltfl,
         }
         params.update(kwargs)
-        response = yield self._mlt(params)
-        decoded = self.decoder.decode(response)
+        params.setdefault('wt', self.response_format)
+
+        if getattr(self.results_cls, 'raw_payload', False) and params['wt'] == 'json':
+            # the results class decodes the response itself
+            results = self.results_cls((yield self._query(self._mlt, params, use_cache, raw=True)))
+            self.log.debug("Found '%s' MLT results.", results.hits)
+            return results
+
+        decoded = yield self._query(self._mlt, params, use_cache, self.stream_decode)
 
         self.log.debug(
             "Found '%s' MLT results.",
@@ -757,13 +3785,15 @@ class Solr(object):
         return self.results_cls(decoded)
 
     @gen.coroutine
-    def suggest_terms(self, fields, prefix, **kwargs):
+    def suggest_terms(self, fields, prefix, use_cache=True, **kwargs):
         """
         Accepts a list of field names and a prefix
 
         Returns a dictionary keyed on field name containing a list of
         ``(term, count)`` pairs
 
+        Optionally accepts ``use_cache``. Pass ``False`` to skip the :class:`ResponseCache`.
+
         Requires Solr 1.4+.
         """
         params = {
@@ -771,8 +3801,7 @@ class Solr(object):
             'terms.prefix': prefix,
         }
         params.update(kwargs)
-        response = yield self._suggest_terms(params)
-        result = self.decoder.decode(response)
+        result = yield self._query(self._suggest_terms, params, use_cache)
         terms = result.get("terms", {})
         res = {}
 
@@ -784,13 +3813,9 @@ class Solr(object):
         if isinstance(terms, (list, tuple)):
             terms = dict(zip(terms[0::2], terms[1::2]))
 
+        # NOTE: don't modify "values", since the response may be cached
         for field, values in terms.items():
-            tmp = list()
-
-            while values:
-                tmp.append((values.pop(0), values.pop(0)))
-
-            res[field] = tmp
+            res[field] = list(zip(values[0::2], values[1::2]))
 
         self.log.debug("Found '%d' Term suggestions results.", sum(len(j) for i, j in res.items()))
         return res
@@ -829,15 +3854,209 @@ class Solr(object):
 
         return doc_elem
 
+    def _build_json_doc(self, doc, boost=None, fieldUpdates=None):
+        """
+        The JSON counterpart to :meth:`_build_doc`.
+
+        Returns a two-tuple with a dictionary of the document's fields, ready for a JSON encoder,
+        and the document boost (or ``None`` if there isn't one).
+        """
+        doc_boost = None
+        json_doc = {}
+
+        for key, value in doc.items():
+            if key == 'boost':
+                doc_boost = value
+                continue
+
+            if isinstance(value, (list, tuple)):
+                value = [self._to_json_value(bit) for bit in value if not self._is_null_value(bit)]
+                if not value:
+                    continue
+            elif self._is_null_value(value):
+                continue
+            else:
+                value = self._to_json_value(value)
+
+            if boost and key in boost:
+                value = {'boost': boost[key], 'value': value}
+
+            if fieldUpdates and key in fieldUpdates:
+                value = {fieldUpdates[key]: value}
+
+            json_doc[key] = value
+
+        return json_doc, doc_boost
+
+    def _build_json_add(self, docs, boost=None, fieldUpdates=None, commitWithin=None):
+        """
+        Build a JSON update message that adds ``docs``, encoded straight to UTF-8 bytes.
+
+        The message uses Solr's JSON command syntax (one ``"add"`` command per document) because
+        it's the only JSON syntax that supports document boosts and ``commitWithin`` in both
+        Solr 4 and Solr 5. Atomic updates from ``fieldUpdates`` work as they do with XML.
+        """
+        commands = [self._build_json_command(doc, boost=boost, fieldUpdates=fieldUpdates, commitWithin=commitWithin)
+                    for doc in docs]
+        return b'{' + b','.join(commands) + b'}'
+
+    def _build_json_command(self, doc, boost=None, fieldUpdates=None, commitWithin=None):
+        """
+        Build the ``"add"`` command for a single document in a JSON update message, as bytes.
+        """
+        json_doc, doc_boost = self._build_json_doc(doc, boost=boost, fieldUpdates=fieldUpdates)
+        command = {'doc': json_doc}
+
+        if doc_boost is not None:
+            command['boost'] = doc_boost
+        if commitWithin:
+            command['commitWithin'] = int(commitWithin)
+
+        return b'"add":' + _JSON_ENCODER.encode(command).encode('utf-8')
+
+    def _resolve_commit(self, commit):
+        """
+        Decide how a write should commit, given its ``commit`` argument.
+
+        Returns a three-tuple: the ``commit`` argument for :meth:`_update`, the ``commitWithin``
+        argument for :meth:`_update`, and whether to tell the :class:`CommitScheduler` about the
+        write once it succeeds. An explicit ``commit`` always wins over the scheduler.
+        """
+        if commit is not None:
+            return commit, None, False
+        elif self.commit_scheduler is None:
+            return True, None, False
+        else:
+            return False, self.commit_scheduler.commit_within_ms, True
+
+    def _add_message_parts(self, update_format, commitWithin=None):
+        """
+        Returns the pieces needed to assemble an add message from the fragments built by
+        :meth:`_build_add_fragment`. This is a four-tuple of the ``head``, ``separator``, and
+        ``tail`` bytes, then the message's content type.
+        """
+        if update_format == 'json':
+            return b'{', b',', b'}', _JSON_CONTENT_TYPE
+
+        head = b'<add>'
+        if commitWithin:
+            head = '<add commitWithin="{}">'.format(int(commitWithin)).encode('utf-8')
+        return head, b'', b'</add>', _XML_CONTENT_TYPE
+
+    def _build_add_fragment(self, doc, update_format, boost=None, fieldUpdates=None, commitWithin=None):
+        """
+        Serialize a single document for an add message in ``update_format``. Returns bytes that
+        are ready to send, without the need for :func:`sanitize`.
+        """
+        if update_format == 'json':
+            return self._build_json_command(doc, boost=boost, fieldUpdates=fieldUpdates, commitWithin=commitWithin)
+
+        parts = []
+        self._write_xml_docs(parts, (doc, ), boost, fieldUpdates)
+        return parts[0]
+
+    def _build_xml_add(self, docs, boost=None, fieldUpdates=None, commitWithin=None):
+        """
+        Build an XML update message that adds ``docs``. Returns a Unicode string.
+        """
+        message = ET.Element('add')
+
+        if commitWithin:
+            message.set('commitWithin', force_unicode(commitWithin))
+
+        for doc in docs:
+            message.append(self._build_doc(doc, boost=boost, fieldUpdates=fieldUpdates))
+
+        # This returns a bytestring. Ugh.
+        m = ET.tostring(message, encoding='utf-8')
+        # Convert back to Unicode please.
+        return force_unicode(m)
+
+    def _write_xml_add(self, docs, boost=None, fieldUpdates=None, commitWithin=None):
+        """
+        Build the same XML update message as :meth:`_build_xml_add`, but as bytes that are ready to
+        send, exactly like the output of :func:`sanitize`. This writes the XML directly instead of
+        building an ElementTree, so it's much faster.
+        """
+        parts = [None]  # the start tag goes first
+        self._write_xml_docs(parts, docs, boost, fieldUpdates)
+
+        start, empty = _xml_tags('add', {'commitWithin': force_unicode(commitWithin)} if commitWithin else {})
+        if len(parts) == 1:
+            return empty.encode('utf-8')
+        parts[0] = start.encode('utf-8')
+        parts.append(b'</add>')
+        return b''.join(parts)
+
+    def _write_xml_docs(self, parts, docs, boost=None, fieldUpdates=None):
+        """
+        For :meth:`_write_xml_add`, append the XML for every document to the ``parts`` list, as
+        one UTF-8 bytes object per document. Encoding every document on its own keeps the
+        memory use to about the size of the message.
+        """
+        if type(self)._build_doc is not Solr._build_doc:
+            # a subclass builds its own elements, so serialize them like _build_xml_add() did
+            for doc in docs:
+                element = self._build_doc(doc, boost=boost, fieldUpdates=fieldUpdates)
+                parts.append(force_bytes(sanitize(ET.tostring(element, encoding='unicode'))))
+            return
+
+        # subclasses may format the values differently
+        from_python = None if type(self)._from_python is Solr._from_python else self._from_python
+        is_null_value = self._is_null_value
+        field_tags = {}  # field name to its start tag and empty element
+        doc_parts = []  # the Unicode strings of one document
+
+        for doc in docs:
+            doc_parts.append(None)  # the start tag goes first
+            doc_attrs = {}
+            for key, value in doc.items():
+                if key == 'boost':
+                    doc_attrs['boost'] = force_unicode(value)
+                    continue
+
+                try:
+                    start, empty = field_tags[key]
+                except KeyError:
+                    attrs = {'name': key}
+                    if fieldUpdates and key in fieldUpdates:
+                        attrs['update'] = fieldUpdates[key]
+                    if boost and key in boost:
+                        attrs['boost'] = force_unicode(boost[key])
+                    start, empty = field_tags[key] = _xml_tags('field', attrs)
+
+                for bit in (value if isinstance(value, (list, tuple)) else (value, )):
+                    if is_null_value(bit):
+                        continue
+                    # ElementTree decides whether the element is empty before sanitize()
+                    text = _xml_text(bit) if from_python is None else from_python(bit)
+                    if text:
+                        doc_parts.append(start)
+                        doc_parts.append(text if from_python is None else text.translate(_XML_ANY_TEXT_TABLE))
+                        doc_parts.append('</field>')
+                    else:
+                        doc_parts.append(empty)
+
+            start, empty = _xml_tags('doc', doc_attrs)
+            if len(doc_parts) == 1:
+                doc_parts[0] = empty
+            else:
+                doc_parts[0] = start
+                doc_parts.append('</doc>')
+            parts.append(''.join(doc_parts).encode('utf-8'))
+            del doc_parts[:]
+
     @gen.coroutine
-    def add(self, docs, boost=None, fieldUpdates=None, commit=None, softCommit=None, commitWithin=None, waitFlush=None, waitSearcher=None):
+    def add(self, docs, boost=None, fieldUpdates=None, commit=None, softCommit=None, commitWithin=None, waitFlush=None, waitSearcher=None,
+            update_format=None):
         """
         Adds or updates documents.
 
         Requires ``docs``, which is a list of dictionaries. Each key is the
         field name and each value is the value to index.
 
-        Optionally accepts ``commit``. Default is ``True``.
+        Optionally accepts ``commit``. Default is ``True``, unless there is a
+        :class:`CommitScheduler`, which then takes care of committing.
 
         Optionally accepts ``softCommit``. Default is ``False``.
 
@@ -851,6 +4070,9 @@ class Solr(object):
 
         Optionally accepts ``waitSearcher``. Default is ``None``.
 
+        Optionally accepts ``update_format``, which is either ``'xml'`` or ``'json'``. Default is
+        the ``update_format`` given to the constructor.
+
         Usage::
 
             solr.add([
@@ -864,30 +4086,116 @@ class Solr(object):
                 },
             ])
         """
-        commit = True if commit is None else commit
+        commit, scheduled_within, scheduled = self._resolve_commit(commit)
         softCommit = False if softCommit is None else softCommit
 
+        update_format = self._check_update_format(update_format or self.update_format)
+
         start_time = time.time()
         self.log.debug("Starting to build add request...")
-        message = ET.Element('add')
 
-        if commitWithin:
-            message.set('commitWithin', commitWithin)
+        m = yield self._build_add(docs, update_format, boost=boost, fieldUpdates=fieldUpdates, commitWithin=commitWithin)
+        update_kwargs = {'clean_ctrl_chars': False}
+        if update_format == 'json':
+            update_kwargs['content_type'] = _JSON_CONTENT_TYPE
 
-        for doc in docs:
-            message.append(self._build_doc(doc, boost=boost, fieldUpdates=fieldUpdates))
+        end_time = time.time()
+        self.log.debug("Built add request of %s bytes in %0.2f seconds.", len(m), end_time - start_time)
+        resp = yield self._update(m, commit=commit, softCommit=softCommit, waitFlush=waitFlush, waitSearcher=waitSearcher,
+                                  commitWithin=scheduled_within, **update_kwargs)
+        if scheduled:
+            self.commit_scheduler.schedule()
+        return resp
 
-        # This returns a bytestring. Ugh.
-        m = ET.tostring(message, encoding='utf-8')
-        # Convert back to Unicode please.
-        m = force_unicode(m)
+    @gen.coroutine
+    def add_stream(self, docs, boost=None, fieldUpdates=None, commit=None, softCommit=None, commitWithin=None, waitFlush=None,
+                   waitSearcher=None, update_format=None, chunk_size=None, compress=False):
+        """
+        Adds or updates documents, streaming them to Solr as they are serialized.
 
-        end_time = time.time()
-        self.log.debug("Built add request of %s docs in %0.2f seconds.", len(message), end_time - start_time)
-        return (yield self._update(m, commit=commit, softCommit=softCommit, waitFlush=waitFlush, waitSearcher=waitSearcher))
+        This works like :meth:`add` except that ``docs`` may be any iterable of dictionaries,
+        including a generator, or an asynchronous iterator (Python 3.5+). Documents are serialized
+        one at a time and sent with chunked transfer encoding, so memory use doesn't grow with the
+        number of documents in the update request.
+
+        Optionally accepts ``chunk_size``, the number of bytes buffered before they are written to
+        the connection. Default is ``65536``.
+
+        Optionally accepts ``compress``. If ``True``, the stream is gzipped, which only works if
+        Solr is set up to decompress request bodies, as for the ``compress_updates`` argument of
+        :class:`Solr`. Default is ``False``.
+
+        The other arguments are the same as for :meth:`add`.
+
+        .. note:: Large updates take a long time, so you may need a longer ``timeout``. Streaming
+            requires Tornado's default "simple" HTTP client.
+
+        Usage::
+
+            def all_docs():
+                for row in database:
+                    yield {'id': row.id, 'title': row.title}
+
+            solr.add_stream(all_docs())
+        """
+        commit, scheduled_within, scheduled = self._resolve_commit(commit)
+        softCommit = False if softCommit is None else softCommit
+        update_format = self._check_update_format(update_format or self.update_format)
+        chunk_size = chunk_size or _STREAM_CHUNK_SIZE
+
+        head, separator, tail, content_type = self._add_message_parts(update_format, commitWithin=commitWithin)
+
+        def build(doc):
+            return self._build_add_fragment(doc, update_format, boost=boost, fieldUpdates=fieldUpdates,
+                                            commitWithin=commitWithin)
+
+        @gen.coroutine
+        def producer(write):
+            start_time = time.time()
+            num_docs = 0
+            buf = [head]
+            buf_size = len(head)
+
+            if hasattr(docs, '__aiter__'):
+                iterator = docs.__aiter__()
+            else:
+                iterator = iter(docs)
+
+            while True:
+                try:
+                    if hasattr(iterator, '__anext__'):
+                        doc = yield iterator.__anext__()
+                    else:
+                        doc = next(iterator)
+                except (StopIteration, StopAsyncIteration):
+                    break
+
+                chunk = build(doc)
+                if num_docs and separator:
+                    buf.append(separator)
+                    buf_size += len(separator)
+                buf.append(chunk)
+                buf_size += len(chunk)
+                num_docs += 1
+
+                if buf_size >= chunk_size:
+                    yield write(b''.join(buf))
+                    buf = []
+                    buf_size = 0
+
+            buf.append(tail)
+            yield write(b''.join(buf))
+            self.log.debug("Streamed add request of %s docs in %0.2f seconds.", num_docs, time.time() - start_time)
+
+        resp = yield self._update(None, commit=commit, softCommit=softCommit, waitFlush=waitFlush,
+                                  waitSearcher=waitSearcher, content_type=content_type, body_producer=producer,
+                                  commitWithin=scheduled_within, compress_stream=compress)
+        if scheduled:
+            self.commit_scheduler.schedule()
+        return resp
 
     @gen.coroutine
-    def delete(self, id=None, q=None, commit=True, waitFlush=None, waitSearcher=None):  # pylint: disable=redefined-builtin
+    def delete(self, id=None, q=None, commit=None, waitFlush=None, waitSearcher=None):  # pylint: disable=redefined-builtin
         """
         Deletes documents.
 
@@ -895,7 +4203,8 @@ class Solr(object):
         specific document id to remove. ``query`` is a Lucene-style query
         indicating a collection of documents to delete.
 
-        Optionally accepts ``commit``. Default is ``True``.
+        Optionally accepts ``commit``. Default is ``True``, unless there is a
+        :class:`CommitScheduler`, which then takes care of committing.
 
         Optionally accepts ``waitFlush``. Default is ``None``.
 
@@ -916,7 +4225,12 @@ class Solr(object):
         elif q is not None:
             m = '<delete><query>%s</query></delete>' % q
 
-        return (yield self._update(m, commit=commit, waitFlush=waitFlush, waitSearcher=waitSearcher))
+        commit, scheduled_within, scheduled = self._resolve_commit(commit)
+        resp = yield self._update(m, commit=commit, waitFlush=waitFlush, waitSearcher=waitSearcher,
+                                  commitWithin=scheduled_within)
+        if scheduled:
+            self.commit_scheduler.schedule()
+        return resp
 
     @gen.coroutine
     def commit(self, softCommit=False, waitFlush=None, waitSearcher=None, expungeDeletes=None):
@@ -938,9 +4252,15 @@ class Solr(object):
         """
         if expungeDeletes is not None:
             msg = '<commit expungeDeletes="%s" />' % str(bool(expungeDeletes)).lower()
+        elif softCommit:
+            msg = '<commit softCommit="true" />'
         else:
             msg = '<commit />'
 
+        if softCommit:
+            # otherwise _update() asks for a hard commit too
+            return (yield self._update(msg, commit=None, softCommit=True, waitFlush=waitFlush, waitSearcher=waitSearcher))
+
         return (yield self._update(msg, softCommit=softCommit, waitFlush=waitFlush, waitSearcher=waitSearcher))
 
     @gen.coroutine
@@ -1036,6 +4356,545 @@ class Solr(object):
         #return data
 
 
+class SolrNode(object):
+    """
+    One Solr node in a :class:`SolrPool`, and what the pool knows about it.
+
+    - ``url``: the node's base URL
+    - ``healthy``: whether the node passed its latest health check
+    - ``outstanding``: how many requests to the node are running
+    - ``ewma``: an exponentially-weighted moving average of the node's response time, in seconds,
+      where a failed request counts as taking the whole ``timeout``
+    - ``requests`` and ``failures``: how many requests the node received, and how many failed
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def __repr__(self):
+        return '<SolrNode {} {}>'.format(self.url, 'healthy' if self.healthy else 'ejected')
+
+
+class SolrPool(Solr):
+    """
+    A :class:`Solr` that spreads its requests across several Solr nodes.
+
+    :class:`SolrPool` offers the same API as :class:`Solr`. Read requests (``search()``,
+    ``more_like_this()``, and ``suggest_terms()``) are balanced across the healthy nodes. Every
+    other request goes to the first healthy node, in the order of ``urls``.
+
+    Requires ``urls``, a list of the base URLs of the nodes, like the ``url`` argument for
+    :class:`Solr`.
+
+    Optionally accepts ``balancer``, which is one of these. Default is ``'round_robin'``.
+
+    - ``'round_robin'``: each node in turn.
+    - ``'least_outstanding'``: the node with the fewest running requests.
+    - ``'ewma'``: the node with the lowest average response time, weighted by its running requests.
+
+    Optionally accepts ``health_check_interval``, the seconds between background health checks.
+    Each check requests ``admin/ping`` from every node; nodes that fail are ejected from the pool
+    until they pass again. If every node is ejected, requests go to all of them anyway. Default is
+    ``5``. Use ``0`` to disable health checks.
+
+    Optionally accepts ``health_check_timeout``, the most seconds to wait for a ping.
+    Default is ``2``. With ``max_clients``, pings wait for a connection like other requests, and a
+    ping that can't get one within this time is skipped, leaving the node as it was.
+
+    Every other argument is the same as for :class:`Solr`.
+
+    Usage::
+
+        solr = SolrPool(['http://solr1:8983/solr/collection1', 'http://solr2:8983/solr/collection1'],
+                        balancer='ewma')
+        results = yield solr.search('bananas')
+        solr.close()  # stop the health checks
+    """
+
+    BALANCERS = ('round_robin', 'least_outstanding', 'ewma')
+    # Handlers that only read, so any node can answer them.
+    READ_HANDLERS = ('select', 'mlt', 'terms')
+    # How much each new response time counts in SolrNode.ewma.
+    EWMA_WEIGHT = 0.3
+
+    _NO_URLS_ERROR = 'SolrPool needs at least one URL'
+    _BALANCER_ERROR = 'Unknown balancer "{}"'
+
+    def __init__(self, urls, balancer=None, health_check_interval=None, health_check_timeout=None, **kwargs):
+        if not urls:
+            raise ValueError(SolrPool._NO_URLS_ERROR)
+        super(SolrPool, self).__init__(urls[0], **kwargs)
+
+        self.balancer = balancer or 'round_robin'
+        if self.balancer not in SolrPool.BALANCERS:
+            raise ValueError(SolrPool._BALANCER_ERROR.format(self.balancer))
+
+        self.nodes = [SolrNode(url) for url in urls]
+        self._nodes_by_url = dict((node.url, node) for node in self.nodes)
+        self._next_node = 0  # for round-robin
+
+        self.health_check_interval = 5 if health_check_interval is None else health_check_interval
+        self.health_check_timeout = health_check_timeout or 2
+        self._health_timer = None
+        if self.health_check_interval:
+            self._health_timer = self._ioloop.call_later(self.health_check_interval, self._on_health_timer)
+
+    def close(self):
+        "Stop the background health checks."
+        if self._health_timer is not None:
+            self._ioloop.remove_timeout(self._health_timer)
+            self._health_timer = None
+        self.health_check_interval = 0
+
+    def stats(self):
+        """
+        Returns the same statistics as :meth:`Solr.stats`, and the ``nodes``: a dictionary with
+        the ``healthy``, ``outstanding``, ``ewma``, ``requests``, and ``failures`` of each node,
+        by URL.
+        """
+        stats = super(SolrPool, self).stats()
+        stats['nodes'] = dict((node.url, {'healthy': node.healthy, 'outstanding': node.outstanding,
+                                          'ewma': node.ewma, 'requests': node.requests,
+                                          'failures': node.failures})
+                              for node in self.nodes)
+        return stats
+
+    def _select_node(self, path, exclude=()):
+        if _handler_name(path) in SolrPool.READ_HANDLERS:
+            candidates = [node for node in self.nodes if node.healthy and node.url not in exclude]
+            if not candidates:
+                candidates = [node for node in self.nodes if node.url not in exclude] or self.nodes
+
+            # rotate the candidates, so round-robin breaks ties for the other balancers
+            start = self._next_node % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            self._next_node += 1
+
+            if self.balancer == 'round_robin':
+                node = candidates[0]
+            elif self.balancer == 'least_outstanding':
+                node = min(candidates, key=lambda node: node.outstanding)
+            else:
+                node = min(candidates, key=lambda node: node.ewma * (node.outstanding + 1))
+
+        else:
+            node = next((node for node in self.nodes if node.healthy), self.nodes[0])
+
+        node.outstanding += 1
+        node.requests += 1
+        return node.url
+
+    def _node_done(self, base_url, elapsed, failed):
+        node = self._nodes_by_url.get(base_url)
+        if node is None:
+            return
+        node.outstanding -= 1
+        if failed:
+            # a node that fails quickly isn't fast, so count a failure as a timeout
+            node.failures += 1
+            elapsed = max(elapsed, self.timeout)
+        if node.ewma:
+            node.ewma += SolrPool.EWMA_WEIGHT * (elapsed - node.ewma)
+        else:
+            node.ewma = elapsed
+
+    @gen.coroutine
+    def check_health(self):
+        """
+        Ping every node now, and eject or reinstate them by the result.
+        """
+        yield [self._check_node(node) for node in self.nodes]
+
+    @gen.coroutine
+    def _check_node(self, node):
+        # pings take a connection like any other request, so they count in pool_stats()
+        if self._slots is not None:
+            try:
+                yield self._slots.acquire(datetime.timedelta(seconds=self.health_check_timeout))
+            except gen.TimeoutError:
+                # a busy pool says nothing about the node, so try again next time
+                return
+
+        self._active += 1
+        try:
+            request = httpclient.HTTPRequest(self._create_full_url('admin/ping?wt=json', base_url=node.url),
+                                             request_timeout=self.health_check_timeout,
+                                             connect_timeout=self.health_check_timeout)
+            resp = yield self._client.fetch(request)
+            healthy = json.loads(force_unicode(resp.body)).get('status') == 'OK'
+        except Exception:  # pylint: disable=broad-except
+            healthy = False
+        finally:
+            self._active -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+        if healthy != node.healthy:
+            if healthy:
+                self.log.info("Solr node %s is healthy again", node.url)
+            else:
+                self.log.warning("Solr node %s failed its health check", node.url)
+        node.healthy = healthy
+
+    def _on_health_timer(self):
+        def reschedule(future):
+            if self.health_check_interval:
+                self._health_timer = self._ioloop.call_later(self.health_check_interval, self._on_health_timer)
+            future.result()
+
+        self._health_timer = None
+        self._ioloop.add_future(self.check_health(), reschedule)
+
+
+class CommitScheduler(object):
+    """
+    Coalesces the commits for many writes into at most one commit per interval.
+
+    By default :meth:`Solr.add` and :meth:`Solr.delete` commit every time, and each commit opens a
+    new searcher in Solr. Creating a :class:`CommitScheduler` attaches it to ``solr``. From then
+    on, writes that don't give an explicit ``commit`` argument don't commit; the scheduler sends one
+    commit for all of them at most ``interval`` seconds after the first one. Call :meth:`wait` to
+    find out when your writes are visible to searches.
+
+    Requires ``solr``, the :class:`Solr` instance whose writes to schedule.
+
+    Optionally accepts ``interval``, the most seconds between a write and its commit.
+    Default is ``1.0``.
+
+    Optionally accepts ``softCommit``. If ``True``, send soft commits. Default is ``False``.
+
+    Optionally accepts ``commitWithin``. If ``True``, the scheduler doesn't commit at all, but
+    asks Solr to commit each write within ``interval``, and :meth:`wait` waits until that time is
+    up. Default is ``False``.
+
+    Usage::
+
+        CommitScheduler(solr, interval=2.0, softCommit=True)
+        yield solr.add(docs)
+        yield solr.delete(id='doc_12')
+        yield solr.commit_scheduler.wait()  # both writes are visible now
+    """
+
+    def __init__(self, solr, interval=None, softCommit=False, commitWithin=False):
+        self.solr = solr
+        self.interval = 1.0 if interval is None else interval
+        self.softCommit = softCommit
+        self.commitWithin = commitWithin
+
+        #: How many writes were scheduled, and how many commits the scheduler sent for them.
+        self.writes = 0
+        self.commits = 0
+
+        # We number the writes; a commit covers every write numbered at or below the number of
+        # the newest write when the commit started.
+        self._written = 0
+        self._committed = 0
+        self._last_write = None
+        self._committing = False
+        self._running = None  # the Future of the running commit
+        self._timer = None
+        self._waiters = []  # two-tuples of write number and Future
+
+        solr.commit_scheduler = self
+
+    @property
+    def commit_within_ms(self):
+        "The ``commitWithin`` value for scheduled writes, or ``None`` if the scheduler commits."
+        if self.commitWithin:
+            return int(self.interval * 1000)
+        return None
+
+    @property
+    def pending(self):
+        "Whether there are writes that aren't committed yet."
+        return self._written > self._committed
+
+    def schedule(self):
+        "Record a successful write, and make sure a commit will cover it."
+        self.writes += 1
+        self._written += 1
+        self._last_write = self.solr._ioloop.time()
+
+        if self.commitWithin:
+            # Solr commits on its own, so we only keep track of the time for wait().
+            self._committed = self._written
+        elif self._timer is None and not self._committing:
+            self._timer = self.solr._ioloop.call_later(self.interval, self._on_timer)
+
+    def wait(self):
+        """
+        Returns a Future that resolves once every write made so far is visible to searches.
+
+        If the commit fails, the Future raises the commit's exception.
+        """
+        if self.commitWithin:
+            if self._last_write is None:
+                return gen.sleep(0)
+            remaining = self._last_write + self.interval - self.solr._ioloop.time()
+            return gen.sleep(max(remaining, 0))
+
+        future = Future()
+        if self.pending:
+            self._waiters.append((self._written, future))
+        else:
+            future.set_result(None)
+        return future
+
+    @gen.coroutine
+    def flush(self):
+        """
+        Commit now if there are pending writes, then wait for them to be visible. If a commit is
+        already running, writes it doesn't cover are committed as soon as it finishes.
+
+        If our commit fails, this raises its exception.
+        """
+        while self.pending:
+            if self._committing:
+                yield self._running
+                continue
+            if self._timer is not None:
+                self.solr._ioloop.remove_timeout(self._timer)
+                self._timer = None
+            error = yield self._start_commit()
+            if error is not None:
+                raise error
+        yield self.wait()
+
+    def _on_timer(self):
+        self._timer = None
+        self.solr._ioloop.add_future(self._start_commit(), lambda future: future.result())
+
+    def _start_commit(self):
+        self._running = self._commit()
+        return self._running
+
+    @gen.coroutine
+    def _commit(self):
+        "Commits every write so far. Returns the exception if the commit failed, or None."
+        self._committing = True
+        covered = self._written
+        error = None
+        try:
+            yield self.solr.commit(softCommit=self.softCommit)
+        except Exception as err:  # pylint: disable=broad-except
+            self.solr.log.error("Scheduled commit failed: %s", err)
+            error = err
+        else:
+            self.commits += 1
+            self._committed = covered
+        finally:
+            self._committing = False
+
+        waiters = self._waiters
+        self._waiters = []
+        for written, future in waiters:
+            if written > covered:
+                self._waiters.append((written, future))
+            elif error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+        # writes that arrived during the commit, or that the failed commit didn't cover
+        if self.pending and self._timer is None:
+            self._timer = self.solr._ioloop.call_later(self.interval, self._on_timer)
+        return error
+
+
+class BulkIndexer(object):
+    """
+    Batches documents into update requests, keeping several requests in flight at once.
+
+    Requires ``solr``, the :class:`Solr` instance to index with.
+
+    Optionally accepts ``batch_size``, the most documents to send in one update request.
+    Default is ``500``.
+
+    Optionally accepts ``max_bytes``, the most bytes of serialized documents to send in one update
+    request. A batch is sent as soon as it reaches either limit. Default is ``5242880`` (5 MiB).
+
+    Optionally accepts ``flush_interval``, the most seconds a document waits in a partial batch
+    before the batch is sent anyway. Default is ``None``, so partial batches wait for more
+    documents or for :meth:`flush`.
+
+    Optionally accepts ``max_in_flight``, the number of update requests that may run at once. When
+    all of them are busy, :meth:`add` waits for one to finish, which applies back-pressure to the
+    producer. Default is ``4``. Your HTTP client must allow at least this many connections.
+
+    Optionally accepts ``on_error``, a function called with the list of documents and the exception
+    for every batch that fails. Failed batches are also recorded in :attr:`failures`. A failed
+    batch never stops the other batches.
+
+    Optionally accepts ``update_format``, ``boost``, ``fieldUpdates``, ``commitWithin``, and
+    ``commit``, which apply to every batch as for :meth:`Solr.add`. By default (``commit=None``)
+    batches leave the committing to the :class:`CommitScheduler` if ``solr`` has one, and
+    otherwise don't commit. Use :meth:`close` with ``commit=True`` to commit once at the end.
+
+    Usage::
+
+        indexer = BulkIndexer(solr, batch_size=1000, max_in_flight=8)
+        for doc in all_docs():
+            yield indexer.add(doc)
+        yield indexer.close(commit=True)
+
+        for docs, error in indexer.failures:
+            print('{} docs failed: {}'.format(len(docs), error))
+    """
+
+    def __init__(self, solr, batch_size=None, max_bytes=None, flush_interval=None, max_in_flight=None,
+                 on_error=None, update_format=None, boost=None, fieldUpdates=None, commitWithin=None, commit=None):
+        self.solr = solr
+        self.batch_size = batch_size or 500
+        self.max_bytes = max_bytes or 5242880
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight or 4
+        self.on_error = on_error
+        self.update_format = solr._check_update_format(update_format or solr.update_format)
+        self.boost = boost
+        self.fieldUpdates = fieldUpdates
+        self.commitWithin = commitWithin
+        self.commit = commit
+
+        #: Two-tuples of ``(docs, exception)`` for every batch that failed.
+        self.failures = []
+        #: How many documents and batches were sent successfully.
+        self.docs_sent = 0
+        self.batches_sent = 0
+
+        self._parts = solr._add_message_parts(self.update_format, commitWithin=commitWithin)
+        self._window = locks.Semaphore(self.max_in_flight)
+        self._waiting = set()  # batches waiting for room in the window
+        self._pending = set()  # batches being sent
+        self._timer = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._docs = []
+        self._fragments = []
+        self._size = 0
+
+    @property
+    def in_flight(self):
+        "The number of update requests currently running."
+        return len(self._pending)
+
+    @gen.coroutine
+    def add(self, doc):
+        """
+        Adds a document to the current batch, sending the batch if it's full.
+
+        This only waits when a batch must be sent but :attr:`max_in_flight` requests are already
+        running, so remember to ``yield`` it.
+        """
+        fragment = self.solr._build_add_fragment(doc, self.update_format, boost=self.boost,
+                                                 fieldUpdates=self.fieldUpdates, commitWithin=self.commitWithin)
+        self._docs.append(doc)
+        self._fragments.append(fragment)
+        self._size += len(fragment)
+
+        if len(self._docs) >= self.batch_size or self._size >= self.max_bytes:
+            yield self._send_buffer()
+        elif self.flush_interval and self._timer is None:
+            self._timer = self.solr._ioloop.call_later(self.flush_interval, self._on_timer)
+
+    @gen.coroutine
+    def add_many(self, docs):
+        "Adds every document in the iterable ``docs``, as with :meth:`add`."
+        for doc in docs:
+            yield self.add(doc)
+
+    @gen.coroutine
+    def flush(self):
+        """
+        Sends the current partial batch, then waits for every running update request to finish,
+        including batches still waiting to start.
+        """
+        while True:
+            yield self._send_buffer()
+            running = self._waiting | self._pending
+            if not running:
+                break
+            yield list(running)
+
+    @gen.coroutine
+    def close(self, commit=False):
+        """
+        Flushes the remaining documents, as with :meth:`flush`.
+
+        Optionally accepts ``commit``. If ``True``, commit once everything is sent. Default is
+        ``False``.
+        """
+        yield self.flush()
+        if commit:
+            yield self.solr.commit()
+
+    def _on_timer(self):
+        self._timer = None
+        if self._docs:
+            self.solr._ioloop.add_future(self._send_buffer(), lambda future: future.result())
+
+    @gen.coroutine
+    def _send_buffer(self):
+        "Start sending the current batch as soon as there's room in the window."
+        if self._timer is not None:
+            self.solr._ioloop.remove_timeout(self._timer)
+            self._timer = None
+        if not self._docs:
+            return
+
+        docs, fragments = self._docs, self._fragments
+        self._reset_buffer()
+
+        head, separator, tail, _ = self._parts
+        message = head + separator.join(fragments) + tail
+        # don't hold two copies of the batch while we wait for the window
+        del fragments
+
+        # so flush() knows about the batch before it has room in the window
+        future = self._start_batch(message, docs)
+        self._waiting.add(future)
+        future.add_done_callback(self._waiting.discard)
+        yield future
+
+    @gen.coroutine
+    def _start_batch(self, message, docs):
+        "Start sending a batch once there's room in the window."
+        yield self._window.acquire()
+        future = self._send_batch(message, docs)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    @gen.coroutine
+    def _send_batch(self, message, docs):
+        content_type = self._parts[3]
+        commit, scheduled_within, scheduled = self.commit, None, False
+        if commit is None:
+            if self.solr.commit_scheduler is None:
+                commit = False
+            else:
+                commit, scheduled_within, scheduled = self.solr._resolve_commit(None)
+        try:
+            yield self.solr._update(message, clean_ctrl_chars=False, commit=commit, content_type=content_type,
+                                    commitWithin=scheduled_within)
+            if scheduled:
+                self.solr.commit_scheduler.schedule()
+        except Exception as err:  # pylint: disable=broad-except
+            self.solr.log.error("BulkIndexer batch of %s docs failed: %s", len(docs), err)
+            self.failures.append((docs, err))
+            if self.on_error is not None:
+                self.on_error(docs, err)
+        else:
+            self.docs_sent += len(docs)
+            self.batches_sent += 1
+        finally:
+            self._window.release()
+
+
 class SolrCoreAdmin(object):
     """
     Handles core admin operations: see http://wiki.apache.org/solr/CoreAdmin
@@ -1166,10 +5025,12 @@ REPLACEMENTS = (
     (b'\x1f', b''), # Unit separator
 )
 
-def sanitize(data):
-    fixed_string = force_bytes(data)
-
+def _sanitize_bytes(data):
     for bad, good in REPLACEMENTS:
-        fixed_string = fixed_string.replace(bad, good)
+        data = data.replace(bad, good)
+
+    return data
 
-    return force_unicode(fixed_string)
+
+def sanitize(data):
+    return force_unicode(_sanitize_bytes(force_bytes(data)))
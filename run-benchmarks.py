@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for the CPU-bound parts of pysolr-tornado.
+
+None of these benchmarks need a Solr server: they measure how quickly the client builds request
+bodies and handles responses. Run all of them with ``python run-benchmarks.py``, or just some of
+them by naming them, like ``python run-benchmarks.py add_xml add_json``.
+
+Besides the speed, we report the peak memory allocated during one run and its share per document
+(with Python 3.4+), and the size of the result if it's a request body.
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import pysolrtornado
+from tests.javabin import DocList, encode_javabin
+
+DEFAULT_DOCS = 5000  # documents per run
+DEFAULT_REPEAT = 5  # runs per benchmark; we report the best one
+
+
+def make_docs(num_docs):
+    "Build documents that look like what our indexing workers send."
+    docs = []
+    for i in range(num_docs):
+        docs.append({
+            'id': 'doc_{}'.format(i),
+            'title': 'Example document number {} ☃ with <markup> & stuff'.format(i),
+            'text': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4,
+            'price': i * 1.25,
+            'popularity': i % 10,
+            'in_stock': bool(i % 2),
+            'pub_date': datetime.datetime(2016, 1, 1, 12, 30, i % 60),
+            'word_ss': ['alpha', 'beta', 'gamma'],
+        })
+    return docs
+
+
+_RESPONSES = {}  # number of docs to search response text
+
+
+def search_response(docs):
+    "The JSON text of a search response with these ``docs``, as Solr sends it."
+    if len(docs) not in _RESPONSES:
+        _RESPONSES[len(docs)] = json.dumps({
+            'responseHeader': {'status': 0, 'QTime': 12, 'params': {'q': '*:*', 'rows': str(len(docs))}},
+            'response': {'numFound': len(docs) * 10, 'start': 0, 'docs': docs},
+        }, default=lambda value: value.isoformat() + 'Z')
+    return _RESPONSES[len(docs)]
+
+
+def search_response_bytes(docs):
+    "The same search response as :func:`search_response`, encoded in UTF-8 like Solr sends it."
+    if ('bytes', len(docs)) not in _RESPONSES:
+        _RESPONSES['bytes', len(docs)] = search_response(docs).encode('utf-8')
+    return _RESPONSES['bytes', len(docs)]
+
+
+_JAVABIN_RESPONSES = {}  # number of docs to javabin search response
+
+
+def javabin_search_response(docs):
+    "The javabin body of the same search response as :func:`search_response`."
+    if len(docs) not in _JAVABIN_RESPONSES:
+        _JAVABIN_RESPONSES[len(docs)] = encode_javabin({
+            'responseHeader': {'status': 0, 'QTime': 12, 'params': {'q': '*:*', 'rows': str(len(docs))}},
+            'response': DocList(docs, num_found=len(docs) * 10),
+        })
+    return _JAVABIN_RESPONSES[len(docs)]
+
+
+_CSV_RESPONSES = {}  # number of docs to CSV search response
+
+
+def csv_search_response(docs):
+    "The CSV body of a search for these ``docs``, as Solr sends it."
+    if len(docs) not in _CSV_RESPONSES:
+        out = io.StringIO(newline='')
+        writer = csv.writer(out, lineterminator='\n')
+        fields = sorted(docs[0])
+        writer.writerow(fields)
+        for doc in docs:
+            row = []
+            for field in fields:
+                value = doc[field]
+                if isinstance(value, list):
+                    value = ','.join(value)
+                elif isinstance(value, datetime.datetime):
+                    value = value.isoformat() + 'Z'
+                elif isinstance(value, bool):
+                    value = 'true' if value else 'false'
+                row.append(value)
+            writer.writerow(row)
+        _CSV_RESPONSES[len(docs)] = out.getvalue().encode('utf-8')
+    return _CSV_RESPONSES[len(docs)]
+
+
+_CSV_TYPES = {'price': float, 'popularity': int, 'in_stock': bool, 'pub_date': datetime.datetime, 'word_ss': [str]}
+
+
+def bench_add_xml_etree(solr, docs):
+    "The XML pipeline that add() used before: build an ElementTree, serialize, sanitize, and encode."
+    message = solr._build_xml_add(docs)
+    message = pysolrtornado.sanitize(message)
+    return pysolrtornado.force_bytes(message)
+
+
+def bench_add_xml(solr, docs):
+    "The XML pipeline in add(), which writes the same bytes directly."
+    return solr._write_xml_add(docs)
+
+
+def bench_add_json(solr, docs):
+    "The JSON pipeline in add(), which produces bytes directly."
+    return solr._build_json_add(docs)
+
+
+def bench_results_hits(solr, docs):
+    "Count the hits of a search with Results, which decodes the whole response."
+    return pysolrtornado.Results(solr.decoder.decode(search_response(docs))).hits
+
+
+def bench_lazy_results_hits(solr, docs):
+    "Count the hits of a search with LazyResults, which decodes only the response header."
+    return pysolrtornado.LazyResults(search_response(docs)).hits
+
+
+def bench_results_top10(solr, docs):
+    "The first ten documents of a search with Results."
+    return pysolrtornado.Results(solr.decoder.decode(search_response(docs)))[:10]
+
+
+def bench_lazy_results_top10(solr, docs):
+    "The first ten documents of a search with LazyResults, which decodes only those."
+    return pysolrtornado.LazyResults(search_response(docs))[:10]
+
+
+def bench_decode_json(solr, docs):
+    "Decode a whole JSON search response."
+    return solr.decoder.decode(search_response(docs))
+
+
+def bench_decode_json_bytes(solr, docs):
+    "What search() does by default: decode the response bytes to Unicode, then decode the JSON."
+    return solr.decoder.decode(pysolrtornado.force_unicode(search_response_bytes(docs)))
+
+
+def make_bytes_decoder_bench(backend):
+    "Make a benchmark for BytesJSONDecoder with ``backend``, which decodes the response bytes."
+    def bench(solr, docs):
+        decoder = _BYTES_DECODERS.get(backend) or _BYTES_DECODERS.setdefault(
+            backend, pysolrtornado.BytesJSONDecoder(backend))
+        return decoder.decode(search_response_bytes(docs))
+    bench.__doc__ = 'Decode the response bytes with BytesJSONDecoder("{}").'.format(backend)
+    return bench
+
+
+_BYTES_DECODERS = {}  # backend name to BytesJSONDecoder
+
+
+def bench_decode_javabin(solr, docs):
+    "Decode the same search response in javabin."
+    return pysolrtornado.JavabinDecoder().decode(javabin_search_response(docs))
+
+
+def bench_decode_json_typed(solr, docs):
+    "Decode a JSON search response, and parse its dates like search_csv() does."
+    decoded = solr.decoder.decode(search_response(docs))
+    for doc in decoded['response']['docs']:
+        doc['pub_date'] = pysolrtornado._parse_datetime(doc['pub_date'])
+    return decoded
+
+
+def bench_decode_csv(solr, docs):
+    "Parse and type the same documents as CSV, in 64 KiB chunks like search_csv()."
+    body = csv_search_response(docs)
+    parser = pysolrtornado._CsvStreamParser(_CSV_TYPES)
+    rows = []
+    for start in range(0, len(body), 65536):
+        rows.extend(parser.feed(body[start:start + 65536]))
+    rows.extend(parser.close())
+    return rows
+
+
+_RECORDS = {}  # number of docs to a list of RequestRecords
+
+
+def bench_request_stats(solr, docs):
+    "Record one request per document in RequestStats, which collect_stats does for every request."
+    if len(docs) not in _RECORDS:
+        records = _RECORDS[len(docs)] = []
+        for i in range(len(docs)):
+            record = pysolrtornado.RequestRecord(('select', 'mlt', 'update')[i % 3], 'GET')
+            record.total_time = (i % 1000) / 1000.0
+            record.qtime = i % 100
+            record.bytes_received = 1000 + i
+            record.decode_time = 0.001
+            records.append(record)
+    stats = pysolrtornado.RequestStats()
+    for record in _RECORDS[len(docs)]:
+        stats(record)
+    return stats
+
+
+BENCHMARKS = (
+    ('add_xml_etree', bench_add_xml_etree),
+    ('add_xml', bench_add_xml),
+    ('add_json', bench_add_json),
+    ('results_hits', bench_results_hits),
+    ('lazy_results_hits', bench_lazy_results_hits),
+    ('results_top10', bench_results_top10),
+    ('lazy_results_top10', bench_lazy_results_top10),
+    ('decode_json', bench_decode_json),
+    ('decode_json_bytes', bench_decode_json_bytes),
+) + tuple(
+    ('decode_bytes_' + backend, make_bytes_decoder_bench(backend)) for backend in pysolrtornado.BytesJSONDecoder.BACKENDS
+) + (
+    ('decode_javabin', bench_decode_javabin),
+    ('decode_json_typed', bench_decode_json_typed),
+    ('decode_csv', bench_decode_csv),
+    ('request_stats', bench_request_stats),
+)
+
+
+def run_benchmark(name, func, num_docs, repeat):
+    solr = pysolrtornado.Solr('http://localhost:8983/solr/collection1')
+    docs = make_docs(num_docs)
+    try:
+        func(solr, docs)  # warm up, and prepare any input that's shared between runs
+    except ImportError as exc:
+        # an optional library isn't installed
+        print('{:<20} skipped: {}'.format(name, exc))
+        return
+
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        body = func(solr, docs)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    peak = per_doc = '-'
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func(solr, docs)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        peak = '{:.0f} KiB'.format(peak_bytes / 1024.0)
+        per_doc = '{:.0f} B'.format(peak_bytes / float(num_docs))
+
+    size = '{} bytes'.format(len(body)) if isinstance(body, (bytes, str)) else '-'
+    print('{:<20} {:>12.0f} docs/sec {:>12} peak {:>8} /doc {:>14}'.format(name, num_docs / best, peak, per_doc,
+                                                                           size))
+
+
+def main():
+    names = [name for name, _ in BENCHMARKS]
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help='benchmarks to run, from: {} (default: all)'.format(', '.join(names)))
+    parser.add_argument('--docs', type=int, default=DEFAULT_DOCS, help='documents per run')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs per benchmark')
+    args = parser.parse_args()
+
+    chosen = args.benchmarks or names
+    for name in chosen:
+        if name not in names:
+            parser.error('unknown benchmark "{}"'.format(name))
+
+    for name, func in BENCHMARKS:
+        if name in chosen:
+            run_benchmark(name, func, args.docs, args.repeat)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -59,7 +59,7 @@ setup(
     url='https://github.com/CANTUS-Project/pysolr-tornado/',
     license='BSD',
     install_requires=[
-        'tornado>=4.0,<5'
+        'tornado>=4.2,<5'
     ],
     extras_require={
         'tomcat': [
@@ -1,2 +1,18 @@
 from .client import *
 from .admin import *
+from .indexer import *
+from .pool import *
+from .retry import *
+from .cache import *
+from .cursor import *
+from .export import *
+from .schema import *
+from .columns import *
+from .javabin import *
+from .csv_search import *
+from .compression import *
+from .executor import *
+from .bytes_decoder import *
+from .search_many import *
+from .observers import *
+from .stats import *
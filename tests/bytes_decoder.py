@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import importlib
+from io import BytesIO
+import json
+import pickle
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import BytesJSONDecoder, LazyResults, Solr
+
+
+RESPONSE = {'responseHeader': {'status': 0, 'QTime': 2},
+            'response': {'numFound': 2, 'start': 0, 'docs': [{'id': 'doc_1', 'title': 'Ünïcödé ☃', 'price': 1.5},
+                                                              {'id': 'doc_2', 'big': 2 ** 62}]}}
+BODY = json.dumps(RESPONSE, ensure_ascii=False).encode('utf-8')
+
+
+def installed(backend):
+    try:
+        importlib.import_module(backend)
+        return True
+    except ImportError:
+        return False
+
+
+class BytesJSONDecoderTestCase(unittest.TestCase):
+    "Tests for BytesJSONDecoder, with every backend that's installed."
+
+    def test_backends(self):
+        for backend in BytesJSONDecoder.BACKENDS:
+            if not installed(backend):
+                continue
+            decoder = BytesJSONDecoder(backend)
+            self.assertEqual(decoder.backend, backend)
+            self.assertEqual(decoder.decode(BODY), RESPONSE)
+            self.assertEqual(decoder.decode(BODY.decode('utf-8')), RESPONSE)
+            self.assertEqual(decoder.decode(memoryview(BODY)), RESPONSE)
+            self.assertRaises(ValueError, decoder.decode, b'{"response":')
+
+    def test_auto(self):
+        expected = [backend for backend in BytesJSONDecoder.BACKENDS if installed(backend)][0]
+        self.assertEqual(BytesJSONDecoder().backend, expected)
+        self.assertEqual(BytesJSONDecoder('auto').backend, expected)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, BytesJSONDecoder, 'yaml')
+
+    def test_pickle(self):
+        decoder = pickle.loads(pickle.dumps(BytesJSONDecoder()))
+        self.assertEqual(decoder.decode(BODY), RESPONSE)
+
+
+class RecordingDecoder(BytesJSONDecoder):
+    "Remembers the type of everything it decodes."
+
+    def __init__(self):
+        super(RecordingDecoder, self).__init__('json')
+        self.types = []
+
+    def decode(self, data):
+        self.types.append(type(data))
+        return super(RecordingDecoder, self).decode(data)
+
+
+class BytesSolrTestCase(testing.AsyncTestCase):
+    "Tests for Solr with a decoder that accepts bytes, with a mock HTTP client."
+
+    def setUp(self):
+        super(BytesSolrTestCase, self).setUp()
+        self.decoder = RecordingDecoder()
+        self.solr = self.make_solr(self.decoder)
+
+    def make_solr(self, decoder, **kwargs):
+        solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, decoder=decoder, **kwargs)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            yield gen.moment
+            if request.streaming_callback is not None:
+                request.streaming_callback(BODY)
+                return httpclient.HTTPResponse(request, 200, buffer=BytesIO(b''))
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(BODY))
+
+        solr._client.fetch = mock_fetch
+        return solr
+
+    def test_init(self):
+        self.assertIsInstance(Solr('http://localhost:8983/solr', decoder='auto').decoder, BytesJSONDecoder)
+        self.assertEqual(Solr('http://localhost:8983/solr', decoder='json').decoder.backend, 'json')
+        self.assertRaises(ValueError, Solr, 'http://localhost:8983/solr', decoder='yaml')
+
+    @testing.gen_test
+    def test_search(self):
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.docs, RESPONSE['response']['docs'])
+        results = yield self.solr.more_like_this('*:*', 'title')
+        self.assertEqual(results.hits, 2)
+        self.assertEqual(self.decoder.types, [bytes, bytes])
+
+    @testing.gen_test
+    def test_auto(self):
+        solr = self.make_solr('auto')
+        results = yield solr.search('*:*')
+        self.assertEqual(results.docs, RESPONSE['response']['docs'])
+
+    @testing.gen_test
+    def test_lazy_results(self):
+        "LazyResults still get a Unicode string."
+        solr = self.make_solr(self.decoder, results_cls=LazyResults)
+        results = yield solr.search('*:*')
+        self.assertEqual(results.hits, 2)
+        self.assertEqual(results[0]['title'], 'Ünïcödé ☃')
+
+    @testing.gen_test
+    def test_stream_decode(self):
+        "Streaming uses our own decoder, since it needs raw_decode()."
+        solr = self.make_solr(self.decoder, stream_decode=True)
+        results = yield solr.search('*:*')
+        self.assertEqual(results.docs, RESPONSE['response']['docs'])
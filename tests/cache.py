@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import time
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import LazyResults, ResponseCache, Solr, SolrError
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    "Tests for ResponseCache on its own."
+
+    def test_get_set(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'x': 1}, 10)
+        self.assertEqual(cache.get('a'), {'x': 1})
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 10})
+
+        cache.set('a', {'x': 2}, 20)
+        self.assertEqual(cache.get('a'), {'x': 2})
+        self.assertEqual(cache.size, 20)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1, 1)
+        cache.set('b', 2, 1)
+        cache.get('a')
+        cache.set('c', 3, 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_bytes(self):
+        cache = ResponseCache(max_bytes=100)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 30)
+        cache.set('c', 3, 30)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 60)
+
+        # too big to cache at all
+        cache.set('d', 4, 101)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.01)
+        cache.set('a', 1, 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class SolrCacheTestCase(testing.AsyncTestCase):
+    "Tests for the cache in Solr, with a mock HTTP client that counts the requests."
+
+    def setUp(self):
+        super(SolrCacheTestCase, self).setUp()
+        self.fetched = []
+        self.delay = 0.001
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop,
+                         cache=ResponseCache())
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            yield gen.sleep(self.delay)
+            if '/terms/' in request.url:
+                body = b'{"terms":{"title":["dance",23,"dancers",10]}}'
+            else:
+                body = b'{"response":{"numFound":1,"docs":[{"id":"doc_1"}]}}'
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_search(self):
+        "Identical searches are cached, regardless of the order of the parameters."
+        first = yield self.solr.search('*:*', df='title', rows=10)
+        second = yield self.solr.search('*:*', rows=10, df='title')
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(second.docs, first.docs)
+        self.assertIsNot(second, first)
+
+        yield self.solr.search('*:*', rows=20, df='title')
+        yield self.solr.more_like_this('*:*', 'title', rows=10, df='title')
+        self.assertEqual(len(self.fetched), 3)
+        self.assertEqual(self.solr.cache.hits, 1)
+
+    @testing.gen_test
+    def test_lazy_results(self):
+        "LazyResults get the response text, which is cached separately from decoded responses."
+        yield self.solr.search('*:*')
+        self.solr.results_cls = LazyResults
+        results = yield self.solr.search('*:*')
+        self.assertIsInstance(results, LazyResults)
+        self.assertEqual(results.hits, 1)
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.docs, [{'id': 'doc_1'}])
+        self.assertEqual(len(self.fetched), 2)
+
+    @testing.gen_test
+    def test_bypass(self):
+        yield self.solr.search('*:*')
+        yield self.solr.search('*:*', use_cache=False)
+        self.assertEqual(len(self.fetched), 2)
+        self.assertNotIn('use_cache', self.fetched[1])
+
+    @testing.gen_test
+    def test_suggest_terms(self):
+        "The cached response isn't changed when suggest_terms() reads it."
+        expected = {'title': [('dance', 23), ('dancers', 10)]}
+        self.assertEqual((yield self.solr.suggest_terms('title', 'danc')), expected)
+        self.assertEqual((yield self.solr.suggest_terms('title', 'danc')), expected)
+        self.assertEqual(len(self.fetched), 1)
+
+
+class CoalesceTestCase(testing.AsyncTestCase):
+    "Tests for coalescing identical queries in Solr, with a slow mock HTTP client."
+
+    def setUp(self):
+        super(CoalesceTestCase, self).setUp()
+        self.fetched = []
+        self.fail = False
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, coalesce=True)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            yield gen.sleep(0.01)
+            if self.fail:
+                raise httpclient.HTTPError(500, response=httpclient.HTTPResponse(request, 500))
+            body = b'{"response":{"numFound":1,"docs":[{"id":"doc_1"}]}}'
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_coalesce(self):
+        results = yield [self.solr.search('*:*', rows=1, df='id') for _ in range(5)]
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.solr.coalesced, 4)
+        self.assertEqual(len(set(id(each) for each in results)), 5)
+        self.assertEqual([each.hits for each in results], [1] * 5)
+        self.assertEqual(self.solr._in_flight, {})
+
+        # different queries, or queries after the first finished, aren't coalesced
+        yield [self.solr.search('*:*'), self.solr.search('id:doc_1')]
+        yield self.solr.search('*:*')
+        self.assertEqual(len(self.fetched), 4)
+
+    @testing.gen_test
+    def test_coalesce_error(self):
+        "Every caller gets the error."
+        self.fail = True
+        futures = [self.solr.search('*:*') for _ in range(3)]
+        for future in futures:
+            with self.assertRaises(SolrError):
+                yield future
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.solr._in_flight, {})
+
+    @testing.gen_test
+    def test_with_cache(self):
+        self.solr.cache = ResponseCache()
+        yield [self.solr.search('*:*') for _ in range(3)]
+        yield self.solr.search('*:*')
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.solr.cache.stats()['hits'], 1)
+        self.assertEqual(self.solr.coalesced, 2)
+
+    @testing.gen_test
+    def test_off(self):
+        self.solr.coalesce = False
+        yield [self.solr.search('*:*') for _ in range(3)]
+        self.assertEqual(len(self.fetched), 3)
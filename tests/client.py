@@ -5,12 +5,13 @@ import datetime
 import subprocess
 import sys
 
-from tornado import httpclient, testing
+from tornado import gen, httpclient, locks, simple_httpclient, testing
 from tornado import ioloop as ioloop_module
+from tornado.concurrent import Future
 
-from pysolrtornado import (Solr, Results, SolrError, unescape_html, safe_urlencode,
+from pysolrtornado import (Solr, Results, LazyResults, SolrError, unescape_html, safe_urlencode,
                            force_unicode, force_bytes, sanitize, json, ET, IS_PY3,
-                           clean_xml_string)
+                           clean_xml_string, StopAsyncIteration)
 
 
 try:
@@ -160,6 +161,323 @@ class ResultsTestCase(unittest.TestCase):
         self.assertFalse(empty_results)
 
 
+class LazyResultsTestCase(unittest.TestCase):
+    "Tests for LazyResults, which should behave like Results."
+
+    RESPONSE = {
+        'responseHeader': {'status': 0, 'QTime': 3, 'params': {'q': 'docs:[* TO *]'}},
+        'response': {'numFound': 7, 'start': 0, 'docs': [{'id': 1}, {'id': 2}, {'id': 3}]},
+        'highlighting': {'1': {}},
+        'facet_counts': {'facet_fields': {}},
+        'nextCursorMark': 'AoE=',
+    }
+
+    def make_results(self, response=None):
+        return LazyResults(json.dumps(response or LazyResultsTestCase.RESPONSE, indent=1))
+
+    def test_same_as_results(self):
+        expected = Results(LazyResultsTestCase.RESPONSE)
+        for results in (self.make_results(), LazyResults(LazyResultsTestCase.RESPONSE)):
+            for attr in ('docs', 'hits', 'debug', 'highlighting', 'facets', 'spellcheck', 'stats',
+                         'qtime', 'grouped', 'nextCursorMark'):
+                self.assertEqual(getattr(results, attr), getattr(expected, attr), attr)
+            self.assertEqual(len(results), 3)
+            self.assertTrue(results)
+
+        empty = LazyResults('{}')
+        self.assertFalse(empty)
+        self.assertEqual(list(empty), [])
+        self.assertEqual(empty.qtime, None)
+        self.assertFalse(hasattr(empty, '__dict__'))
+
+    def test_hits_only(self):
+        "Reading the hits decodes none of the documents."
+        results = self.make_results()
+        self.assertEqual(results.hits, 7)
+        self.assertEqual(results.qtime, 3)
+        self.assertEqual(results._docs, [])
+        self.assertIsNone(results._decoded)
+
+    def test_top_n(self):
+        "Indexing and iterating decode one document at a time."
+        results = self.make_results()
+        self.assertEqual(results[0], {'id': 1})
+        self.assertEqual(len(results._docs), 1)
+        self.assertEqual(results[:2], [{'id': 1}, {'id': 2}])
+        self.assertEqual(len(results._docs), 2)
+        for doc in results:
+            break
+        self.assertEqual(len(results._docs), 2)
+        self.assertEqual(list(results), [{'id': 1}, {'id': 2}, {'id': 3}])
+        self.assertEqual(results[-1], {'id': 3})
+        self.assertIsNone(results._decoded)
+
+    def test_full_decode(self):
+        "The documents already returned are kept when the whole response is decoded."
+        results = self.make_results()
+        first = results[0]
+        self.assertEqual(results.highlighting, {'1': {}})
+        self.assertIs(results.docs[0], first)
+        self.assertEqual(results.docs, [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    def test_full_decode_first(self):
+        "The header is still there after the whole response was decoded first."
+        for attr in ('debug', 'highlighting', 'facets', 'spellcheck', 'stats', 'grouped', 'nextCursorMark'):
+            results = self.make_results()
+            getattr(results, attr)
+            self.assertEqual(results.hits, 7, attr)
+            self.assertEqual(results.qtime, 3, attr)
+            self.assertTrue(results, attr)
+            self.assertEqual(list(results), [{'id': 1}, {'id': 2}, {'id': 3}], attr)
+
+    def test_no_docs(self):
+        results = self.make_results({'grouped': {'title': {'matches': 2}}})
+        self.assertEqual(results.hits, 0)
+        self.assertEqual(results.grouped, {'title': {'matches': 2}})
+        self.assertEqual(results.docs, ())
+
+
+class UpdateMessageTestCase(unittest.TestCase):
+    "Tests for building update messages, which doesn't need a Solr server."
+
+    def setUp(self):
+        super(UpdateMessageTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1')
+
+    def test_update_format(self):
+        self.assertEqual(self.solr.update_format, 'xml')
+        self.assertEqual(Solr('http://localhost:8983/solr', update_format='json').update_format, 'json')
+        self.assertRaises(ValueError, Solr, 'http://localhost:8983/solr', update_format='yaml')
+
+    def test__build_json_doc(self):
+        doc = {
+            'id': 'doc_1',
+            'title': 'Example doc ☃ 1',
+            'price': 12.59,
+            'popularity': 10,
+            'in_stock': True,
+            'pub_date': datetime.date(2013, 1, 18),
+            'word_ss': ['alpha', None, '', 'beta'],
+            'empty': '',
+            'nothing': None,
+            'boost': 2.5,
+        }
+        json_doc, doc_boost = self.solr._build_json_doc(doc)
+        self.assertEqual(doc_boost, 2.5)
+        self.assertEqual(json_doc, {
+            'id': 'doc_1',
+            'title': 'Example doc ☃ 1',
+            'price': 12.59,
+            'popularity': 10,
+            'in_stock': True,
+            'pub_date': '2013-01-18T00:00:00Z',
+            'word_ss': ['alpha', 'beta'],
+        })
+
+    def test__build_json_doc_updates(self):
+        "Field boosts and atomic updates."
+        doc = {'id': 'doc_1', 'title': 'Important doc', 'popularity': 5}
+        json_doc, doc_boost = self.solr._build_json_doc(doc, boost={'title': 10.0},
+                                                        fieldUpdates={'popularity': 'inc'})
+        self.assertIsNone(doc_boost)
+        self.assertEqual(json_doc['title'], {'boost': 10.0, 'value': 'Important doc'})
+        self.assertEqual(json_doc['popularity'], {'inc': 5})
+
+    def test__build_json_add(self):
+        message = self.solr._build_json_add([{'id': 'doc_1', 'title': '☃'}, {'id': 'doc_2', 'boost': 3}],
+                                            commitWithin=5000)
+        self.assertIsInstance(message, bytes)
+        self.assertEqual(message,
+                         '{"add":{"doc":{"id":"doc_1","title":"☃"},"commitWithin":5000},'
+                         '"add":{"doc":{"id":"doc_2"},"boost":3,"commitWithin":5000}}'.encode('utf-8'))
+        self.assertEqual(self.solr._build_json_add([]), b'{}')
+
+    def test__build_xml_add(self):
+        message = self.solr._build_xml_add([{'id': 'doc_1'}], commitWithin=5000)
+        self.assertEqual(message, '<add commitWithin="5000"><doc><field name="id">doc_1</field></doc></add>')
+
+    def test__write_xml_add(self):
+        "The direct XML writer makes exactly the same bytes as the ElementTree pipeline."
+        docs = [
+            {'id': 'doc_1', 'title': 'Tom & <Jerry> "quoted" \x00\x01\x0b\t\r\n \ud800 \ufffe ☃ \U0001F600',
+             'price': 12.59, 'popularity': 10, 'in_stock': True, 'discontinued': False,
+             'pub_date': datetime.datetime(2013, 1, 18, 3, 4, 5, 600), 'day': datetime.date(2013, 1, 18),
+             'raw': b'caf\xc3\xa9\xff', 'empty': '', 'missing': None, 'control': '\x01\x02',
+             'word_ss': ['alpha', '', None, 'beta', 3], 'tuple': ('x', ),
+             'odd "<&>\x01\t\n name': 'value', 'boost': 2.5},
+            {},
+            {'boost': 3},
+        ]
+        for kwargs in ({}, {'commitWithin': 5000},
+                       {'boost': {'title': 2, 'price': 'x"&'}, 'fieldUpdates': {'popularity': 'inc', 'title': 'set'}}):
+            expected = force_bytes(sanitize(self.solr._build_xml_add(docs, **kwargs)))
+            self.assertEqual(self.solr._write_xml_add(docs, **kwargs), expected)
+        self.assertEqual(self.solr._write_xml_add([]), b'<add />')
+
+        for doc in docs:
+            self.assertEqual(self.solr._build_add_fragment(doc, 'xml'),
+                             force_bytes(sanitize(force_unicode(ET.tostring(self.solr._build_doc(doc), encoding='utf-8')))))
+
+    def test__write_xml_add_from_python(self):
+        "A subclass's _from_python() still formats the values."
+        class CustomSolr(Solr):
+            def _from_python(self, value):
+                return {'control': '\x01', 'escapes': '\ud800&<', 'empty': ''}.get(value, 'custom')
+
+        solr = CustomSolr('http://localhost:8983/solr/collection1')
+        doc = {'a': 'control', 'b': 'escapes', 'c': 'empty', 'd': 7}
+        self.assertEqual(solr._write_xml_add([doc]),
+                         b'<add><doc><field name="a"></field><field name="b">&#55296;&amp;&lt;</field>'
+                         b'<field name="c" /><field name="d">custom</field></doc></add>')
+
+    def test__write_xml_add_build_doc(self):
+        "A subclass's _build_doc() still builds the documents."
+        class CustomSolr(Solr):
+            def _build_doc(self, doc, boost=None, fieldUpdates=None):
+                elem = super(CustomSolr, self)._build_doc(doc, boost=boost, fieldUpdates=fieldUpdates)
+                elem.append(ET.Element('field', name='source'))
+                elem[-1].text = 'custom \x01☃'
+                return elem
+
+        solr = CustomSolr('http://localhost:8983/solr/collection1')
+        docs = [{'id': 'doc_1', 'title': 'a & b'}, {'id': 'doc_2'}]
+        message = solr._write_xml_add(docs, commitWithin=1000)
+        self.assertEqual(message, force_bytes(sanitize(solr._build_xml_add(docs, commitWithin=1000))))
+        self.assertIn('<field name="source">custom ☃</field></doc>'.encode('utf-8'), message)
+        self.assertTrue(solr._build_add_fragment(docs[1], 'xml').endswith(
+            '<field name="source">custom ☃</field></doc>'.encode('utf-8')))
+
+
+class AsyncDocs(object):
+    "An asynchronous iterator over some documents, without needing Python 3.5 syntax."
+
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = Future()
+        try:
+            future.set_result(next(self._docs))
+        except StopIteration:
+            future.set_exception(StopAsyncIteration())
+        return future
+
+
+class StreamingAddTestCase(testing.AsyncTestCase):
+    "Tests for Solr.add_stream() that capture the body instead of sending it to Solr."
+
+    def setUp(self):
+        super(StreamingAddTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.docs = [{'id': 'doc_{}'.format(i), 'title': 'Streamed\x01 ☃ doc'} for i in range(3)]
+        self.update_calls = []
+
+        @gen.coroutine
+        def mock_update(message, **kwargs):
+            self.update_calls.append((message, kwargs))
+            chunks = []
+
+            @gen.coroutine
+            def write(chunk):
+                chunks.append(chunk)
+
+            yield kwargs['body_producer'](write)
+            return chunks
+
+        self.solr._update = mock_update
+
+    @testing.gen_test
+    def test_xml(self):
+        chunks = yield self.solr.add_stream(iter(self.docs), commitWithin=5000)
+        message, kwargs = self.update_calls[0]
+        self.assertIsNone(message)
+        self.assertEqual(kwargs['content_type'], 'text/xml; charset=utf-8')
+        self.assertEqual(kwargs['commit'], True)
+        self.assertEqual(b''.join(chunks).decode('utf-8'),
+                         force_unicode(self.solr._build_xml_add(self.docs)).replace('\x01', '').replace(
+                             '<add>', '<add commitWithin="5000">'))
+
+    @testing.gen_test
+    def test_json(self):
+        chunks = yield self.solr.add_stream(AsyncDocs(self.docs), update_format='json', commit=False)
+        message, kwargs = self.update_calls[0]
+        self.assertEqual(kwargs['content_type'], 'application/json; charset=utf-8')
+        self.assertEqual(kwargs['commit'], False)
+        self.assertEqual(b''.join(chunks), self.solr._build_json_add(self.docs))
+
+    @testing.gen_test
+    def test_chunk_size(self):
+        "Small chunks are written as they fill, without waiting for the end of the documents."
+        chunks = yield self.solr.add_stream(self.docs, update_format='json', chunk_size=1)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[0], b'{' + self.solr._build_json_command(self.docs[0]))
+        self.assertEqual(chunks[-1], b'}')
+
+
+class ConnectionPoolTestCase(testing.AsyncTestCase):
+    "Tests for the connection pool, with a mock HTTP client."
+
+    def setUp(self):
+        super(ConnectionPoolTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.fetched = []
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request)
+            yield gen.sleep(0.01)
+            return httpclient.HTTPResponse(request, 200, buffer=StringIO('{}'))
+
+        self.solr._client.fetch = mock_fetch
+
+    def use_slots(self, max_clients):
+        "Give the Solr a queue of its own, as the constructor does with ``max_clients``."
+        self.solr.max_clients = max_clients
+        self.solr._slots = locks.Semaphore(max_clients)
+
+    def test__http_client_class(self):
+        self.assertIs(Solr._http_client_class('simple'), simple_httpclient.SimpleAsyncHTTPClient)
+        self.assertIn(Solr._http_client_class('auto').__name__, ('SimpleAsyncHTTPClient', 'CurlAsyncHTTPClient'))
+        self.assertRaises(ValueError, Solr._http_client_class, 'urllib')
+
+    def test_default_client(self):
+        "Without pool arguments, Tornado's client does the queueing."
+        self.assertIsNone(self.solr._slots)
+        self.assertIsNone(self.solr.max_clients)
+        self.assertEqual(self.solr.pool_stats()['queued'], 0)
+
+    @testing.gen_test
+    def test_queue(self):
+        "Requests past max_clients wait in the queue."
+        self.use_slots(2)
+        futures = [self.solr._send_request('get', 'select/?q=*:*') for _ in range(5)]
+        stats = self.solr.pool_stats()
+        self.assertEqual(stats['max_clients'], 2)
+        self.assertEqual(stats['active'], 2)
+        self.assertEqual(stats['queued'], 3)
+        self.assertEqual(len(self.fetched), 2)
+
+        yield futures
+        self.assertEqual(len(self.fetched), 5)
+        stats = self.solr.pool_stats()
+        self.assertEqual((stats['active'], stats['queued']), (0, 0))
+
+    @testing.gen_test
+    def test_queue_timeout(self):
+        "A request that waits too long in the queue fails, and the others don't."
+        self.use_slots(1)
+        self.solr.queue_timeout = 0.001
+        first = self.solr._send_request('get', 'select/?q=*:*')
+        with self.assertRaises(SolrError) as cm:
+            yield self.solr._send_request('get', 'select/?q=*:*')
+        self.assertTrue(cm.exception.args[0].startswith(Solr._FETCH_QUEUE_ERROR[:20]))
+        self.assertEqual((yield first), '{}')
+        self.assertEqual(self.solr.pool_stats()['queue_timeouts'], 1)
+
+
 class SolrTestCase(testing.AsyncTestCase):
     def setUp(self):
         super(SolrTestCase, self).setUp()
@@ -207,6 +525,15 @@ class SolrTestCase(testing.AsyncTestCase):
         self.assertEqual(self.solr.timeout, self.timeout)
         self.assertIs(self.solr._ioloop, self.io_loop)
 
+    def test_init_pool(self):
+        solr = Solr(self.solr_url, ioloop=self.io_loop, max_clients=20, http_backend='simple',
+                    queue_timeout=1, connect_timeout=2)
+        self.assertIsNot(solr._client, self.solr._client)
+        self.assertEqual(solr.pool_stats(), {'backend': 'simple', 'max_clients': 20, 'active': 0,
+                                             'queued': 0, 'queue_timeouts': 0})
+        self.assertEqual(solr.queue_timeout, 1)
+        self.assertEqual(solr.connect_timeout, 2)
+
     def test__create_full_url(self):
         # Nada.
         self.assertEqual(self.solr._create_full_url(path=''), self.solr_url)
@@ -535,6 +862,36 @@ class SolrTestCase(testing.AsyncTestCase):
         self.assertEqual(len(res), 5)  # there are 2 instead of 5
         self.assertEqual('doc_6', res.docs[0]['id'])  # this passes
 
+    @testing.gen_test
+    def test_add_3(self):
+        "Test with JSON update messages"
+        yield self.solr.add([
+            {
+                'id': 'doc_6',
+                'title': 'Newly added doc',
+            },
+            {
+                'id': 'doc_7',
+                'title': 'Another example doc',
+            },
+        ], update_format='json')
+
+        res_doc = yield self.solr.search('doc', df='title')
+        res_exa = yield self.solr.search('example', df='title')
+
+        self.assertEqual(len(res_doc), 5)
+        self.assertEqual(len(res_exa), 3)
+
+    @testing.gen_test
+    def test_add_stream(self):
+        def docs():
+            for i in range(6, 106):
+                yield {'id': 'doc_{}'.format(i), 'title': 'Streamed doc'}
+
+        yield self.solr.add_stream(docs())
+        self.assertEqual(len((yield self.solr.search('streamed', df='title', rows=1))), 1)
+        self.assertEqual((yield self.solr.search('streamed', df='title')).hits, 100)
+
     @testing.gen_test
     def test_field_update(self):
         originalDocs = yield self.solr.search('doc', df='title')
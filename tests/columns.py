@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import array
+import datetime
+import json
+import sys
+import unittest
+from unittest import mock
+
+from pysolrtornado import Column, LazyResults, Results
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+UTC = datetime.timezone.utc
+
+RESPONSE = {
+    'response': {
+        'numFound': 3,
+        'docs': [
+            {'id': 'a', 'price': 1.5, 'count': 3, 'in_stock': True, 'tags': ['x', 'y'], 'ratings': [1, 2],
+             'pub_date': datetime.datetime(2016, 1, 2, 3, 4, 5, 678000, tzinfo=UTC)},
+            {'id': 'b', 'price': 2, 'count': 4, 'in_stock': False, 'tags': [], 'ratings': [3],
+             'pub_date': datetime.datetime(1960, 1, 1)},
+            {'id': 'c', 'count': 5, 'in_stock': True, 'ratings': 4},
+        ],
+    },
+}
+FIELDS = ['id', 'price', 'count', 'in_stock', 'tags', 'ratings', 'pub_date', 'missing']
+
+
+class ToColumnsTestCase(unittest.TestCase):
+    "Tests for Results.to_columns() and LazyResults.to_columns()."
+
+    def test_columns(self):
+        columns = Results(RESPONSE).to_columns(FIELDS)
+        self.assertEqual(list(columns), FIELDS)
+        self.assertTrue(all(isinstance(column, Column) for column in columns.values()))
+
+        self.assertEqual(columns['id'].kind, 'object')
+        self.assertEqual(columns['id'].values, ['a', 'b', 'c'])
+        self.assertIsNone(columns['id'].valid)
+
+        self.assertEqual(columns['price'].kind, 'float')
+        self.assertEqual(columns['price'].values, array.array('d', [1.5, 2.0, 0.0]))
+        self.assertEqual(columns['price'].valid, bytearray([1, 1, 0]))
+        self.assertEqual(columns['price'].to_list(), [1.5, 2.0, None])
+
+        self.assertEqual(columns['count'].values, array.array('q', [3, 4, 5]))
+        self.assertEqual(columns['in_stock'].to_list(), [True, False, True])
+
+        self.assertEqual(columns['missing'].to_list(), [None, None, None])
+        self.assertEqual(len(columns['missing']), 3)
+
+    def test_multivalued(self):
+        columns = Results(RESPONSE).to_columns('tags, ratings')
+        tags = columns['tags']
+        self.assertEqual(tags.kind, 'object')
+        self.assertEqual(tags.values, ['x', 'y'])
+        self.assertEqual(list(tags.offsets), [0, 2, 2, 2])
+        self.assertEqual(tags.to_list(), [['x', 'y'], [], None])
+
+        ratings = columns['ratings']
+        self.assertEqual(ratings.kind, 'int')
+        self.assertEqual(ratings.values, array.array('q', [1, 2, 3, 4]))
+        self.assertEqual(ratings.to_list(), [[1, 2], [3], [4]])
+
+    def test_dates(self):
+        column = Results(RESPONSE).to_columns(['pub_date'])['pub_date']
+        self.assertEqual(column.kind, 'datetime')
+        self.assertEqual(column.values[0], 1451703845678000)
+        self.assertEqual(column.to_list(), [RESPONSE['response']['docs'][0]['pub_date'],
+                                            datetime.datetime(1960, 1, 1, tzinfo=UTC), None])
+
+    def test_mixed_and_huge(self):
+        docs = [{'a': 1, 'b': 2 ** 70}, {'a': 'one', 'b': 1}]
+        columns = Results({'response': {'docs': docs}}).to_columns(['a', 'b'])
+        self.assertEqual(columns['a'].kind, 'object')
+        self.assertEqual(columns['b'].kind, 'object')
+        self.assertEqual(columns['b'].to_list(), [2 ** 70, 1])
+
+    def test_lazy_results(self):
+        "LazyResults give the same columns, without keeping the documents."
+        response = {'response': {'numFound': 3, 'docs': [{'id': 'a', 'n': 1}, {'id': 'b'}, {'id': 'c', 'n': 3.5}]}}
+        results = LazyResults(json.dumps(response))
+        first = results[0]
+        columns = results.to_columns(['id', 'n'])
+        self.assertEqual(columns['id'].values, ['a', 'b', 'c'])
+        self.assertEqual(columns['n'].to_list(), [1.0, None, 3.5])
+        self.assertEqual(results._docs, [first])
+
+    def test_numpy_missing(self):
+        "NumPy is only imported for use_numpy=True, which says so if it isn't installed."
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            self.assertEqual(Results(RESPONSE).to_columns('id')['id'].values, ['a', 'b', 'c'])
+            with self.assertRaises(ImportError) as context:
+                Results(RESPONSE).to_columns('id', use_numpy=True)
+        self.assertIn('requires NumPy', str(context.exception))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy(self):
+        columns = Results(RESPONSE).to_columns(FIELDS, use_numpy=True)
+        self.assertEqual(columns['price'].values.dtype, numpy.float64)
+        self.assertEqual(columns['price'].valid.tolist(), [True, True, False])
+        self.assertEqual(columns['count'].values.tolist(), [3, 4, 5])
+        self.assertEqual(columns['in_stock'].values.tolist(), [True, False, True])
+        self.assertEqual(columns['pub_date'].values.dtype, numpy.dtype('datetime64[us]'))
+        self.assertEqual(columns['ratings'].offsets.tolist(), [0, 2, 3, 4])
+        self.assertEqual(columns['ratings'].to_list(), [[1, 2], [3], [4]])
+        self.assertEqual(columns['price'].to_list(), [1.5, 2.0, None])
+        self.assertEqual(columns['pub_date'][1], datetime.datetime(1960, 1, 1, tzinfo=UTC))
+        self.assertEqual(columns['id'].values, ['a', 'b', 'c'])
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import gzip
+from io import BytesIO
+import json
+import zlib
+
+from tornado import gen, httpclient, httputil, testing
+
+from pysolrtornado import Solr, SolrError
+
+
+RESPONSE = {'responseHeader': {'status': 0}, 'response': {'numFound': 50, 'start': 0,
+                                                           'docs': [{'id': 'doc_{}'.format(i), 'title': 'Ünïcödé ☃'}
+                                                                    for i in range(50)]}}
+BODY = json.dumps(RESPONSE).encode('utf-8')
+
+
+class CompressionTestCase(testing.AsyncTestCase):
+    "Tests for compressed responses and update messages, with a mock HTTP client."
+
+    def setUp(self):
+        super(CompressionTestCase, self).setUp()
+        self.requests = []
+        self.bodies = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, compress_responses=True,
+                         compress_updates=1000)
+        self.encoding = 'gzip'
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.requests.append(request)
+            if request.body_producer is not None:
+                chunks = []
+
+                @gen.coroutine
+                def write(chunk):
+                    chunks.append(chunk)
+
+                yield request.body_producer(write)
+                self.bodies.append(b''.join(chunks))
+            else:
+                self.bodies.append(request.body)
+            yield gen.moment
+
+            if self.encoding == 'gzip':
+                body = gzip.compress(BODY)
+            elif self.encoding == 'deflate':
+                body = zlib.compress(BODY)
+            else:
+                body = BODY
+            headers = httputil.HTTPHeaders({'Content-Type': 'application/json'})
+            if self.encoding:
+                headers['Content-Encoding'] = self.encoding
+
+            if request.streaming_callback is not None:
+                request.header_callback('HTTP/1.1 200 OK\r\n')
+                for name, value in headers.get_all():
+                    request.header_callback('{}: {}\r\n'.format(name, value))
+                request.header_callback('\r\n')
+                for i in range(0, len(body), 7):
+                    request.streaming_callback(body[i:i + 7])
+                body = b''
+            return httpclient.HTTPResponse(request, 200, headers=headers, buffer=BytesIO(body))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_responses(self):
+        for encoding in ('gzip', 'deflate', None):
+            self.encoding = encoding
+            results = yield self.solr.search('*:*', use_cache=False)
+            self.assertEqual(results.docs, RESPONSE['response']['docs'])
+            self.assertEqual(self.requests[-1].headers['Accept-Encoding'], 'gzip, deflate')
+            self.assertFalse(self.requests[-1].decompress_response)
+
+        stats = self.solr.compression_stats()
+        self.assertEqual(stats['responses'], 2)
+        self.assertEqual(stats['response_bytes'], 2 * len(BODY))
+        self.assertEqual(stats['response_bytes_received'], len(gzip.compress(BODY)) + len(zlib.compress(BODY)))
+        self.assertEqual(stats['response_bytes_saved'], stats['response_bytes'] - stats['response_bytes_received'])
+        self.assertGreater(stats['response_bytes_saved'], 0)
+
+    @testing.gen_test
+    def test_streamed_responses(self):
+        self.solr.stream_decode = True
+        for encoding in ('gzip', None):
+            self.encoding = encoding
+            results = yield self.solr.search('*:*')
+            self.assertEqual(results.docs, RESPONSE['response']['docs'])
+        self.assertEqual(self.solr.compression_stats()['responses'], 1)
+        self.assertEqual(self.solr.compression_stats()['response_bytes'], len(BODY))
+
+    @testing.gen_test
+    def test_not_asked(self):
+        "Without compress_responses, Tornado does the decompression."
+        self.solr.compress_responses = False
+        self.encoding = None
+        yield self.solr.search('*:*')
+        self.assertNotIn('Accept-Encoding', self.requests[0].headers)
+        self.assertTrue(self.requests[0].decompress_response)
+        self.assertEqual(self.solr.compression_stats()['responses'], 0)
+
+    @testing.gen_test
+    def test_invalid(self):
+        @gen.coroutine
+        def mock_fetch(request):
+            headers = httputil.HTTPHeaders({'Content-Encoding': 'gzip'})
+            return httpclient.HTTPResponse(request, 200, headers=headers, buffer=BytesIO(b'not gzip'))
+
+        self.solr._client.fetch = mock_fetch
+        with self.assertRaises(SolrError):
+            yield self.solr.search('*:*')
+
+    @testing.gen_test
+    def test_updates(self):
+        small = [{'id': 'doc_1'}]
+        large = [{'id': 'doc_{}'.format(i), 'title': 'Ünïcödé ☃'} for i in range(100)]
+        yield self.solr.add(small)
+        yield self.solr.add(large, update_format='json')
+
+        self.assertNotIn('Content-Encoding', self.requests[0].headers)
+        self.assertIn(b'<field name="id">doc_1</field>', self.bodies[0])
+        self.assertEqual(self.requests[1].headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.bodies[1]), self.solr._build_json_add(large))
+
+        stats = self.solr.compression_stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['request_bytes'], len(self.solr._build_json_add(large)))
+        self.assertEqual(stats['request_bytes_sent'], len(self.bodies[1]))
+        self.assertGreater(stats['request_bytes_saved'], 0)
+
+    @testing.gen_test
+    def test_add_stream(self):
+        "Streamed updates are only compressed when asked, since we don't know their size in advance."
+        docs = [{'id': 'doc_1'}, {'id': 'doc_2'}]
+        yield self.solr.add_stream(docs, update_format='json', chunk_size=1)
+        self.assertNotIn('Content-Encoding', self.requests[0].headers)
+        self.assertEqual(self.bodies[0], self.solr._build_json_add(docs))
+        self.assertEqual(self.solr.compression_stats()['requests'], 0)
+
+        yield self.solr.add_stream(docs, update_format='json', chunk_size=1, compress=True)
+        self.assertEqual(self.requests[1].headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.bodies[1]), self.solr._build_json_add(docs))
+        self.assertEqual(self.solr.compression_stats()['requests'], 1)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from io import BytesIO
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import LazyResults, Results, SchemaConverter, Solr, SolrError, _CsvStreamParser
+
+from .schema import DYNAMIC_FIELDS, FIELD_TYPES, FIELDS
+
+
+UTC = datetime.timezone.utc
+
+BODY = ('id,title,price,popularity,in_stock,pub_date,tags,score\n'
+        'doc_1,"Ünïcödé ☃, with ""quotes""\nand a line break",1.5,3,true,2016-01-02T03:04:05.678Z,"a,b\\,c",1.25\n'
+        'doc_2,,,10,false,,,0.5\n'
+        'doc_3,plain,2,,,,single,0.25\n').encode('utf-8')
+
+TYPES = {'price': float, 'popularity': int, 'in_stock': bool, 'pub_date': datetime.datetime, 'tags': [str]}
+
+DOCS = [
+    {'id': 'doc_1', 'title': 'Ünïcödé ☃, with "quotes"\nand a line break', 'price': 1.5, 'popularity': 3,
+     'in_stock': True, 'pub_date': datetime.datetime(2016, 1, 2, 3, 4, 5, 678000, tzinfo=UTC), 'tags': ['a', 'b,c'],
+     'score': 1.25},
+    {'id': 'doc_2', 'popularity': 10, 'in_stock': False, 'score': 0.5},
+    {'id': 'doc_3', 'title': 'plain', 'price': 2.0, 'tags': ['single'], 'score': 0.25},
+]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class CsvStreamParserTestCase(unittest.TestCase):
+    "Tests for _CsvStreamParser."
+
+    def parse(self, chunks, **kwargs):
+        parser = _CsvStreamParser(**kwargs)
+        docs = []
+        for chunk in chunks:
+            docs.extend(parser.feed(chunk))
+        return docs + parser.close()
+
+    def test_chunk_sizes(self):
+        "The response is split anywhere, even inside quotes or a UTF-8 character."
+        for size in (1, 2, 3, 7, 64, len(BODY)):
+            self.assertEqual(self.parse(chunked(BODY, size), types=TYPES), DOCS)
+
+    def test_incremental(self):
+        "Each row is available as soon as its line ends outside quotes."
+        parser = _CsvStreamParser(types={'n': int})
+        self.assertEqual(parser.feed(b'id,n\na,1'), [])
+        self.assertEqual(parser.feed(b'\nb,"2'), [{'id': 'a', 'n': 1}])
+        self.assertEqual(parser.feed(b'"\n'), [{'id': 'b', 'n': 2}])
+        self.assertEqual(parser.feed(b'c,3'), [])
+        self.assertEqual(parser.close(), [{'id': 'c', 'n': 3}])
+
+    def test_untyped(self):
+        "Without types, values stay strings, except for the score."
+        docs = self.parse([BODY])
+        self.assertEqual(docs[1], {'id': 'doc_2', 'popularity': '10', 'in_stock': 'false', 'score': 0.5})
+
+    def test_schema(self):
+        schema = SchemaConverter(FIELDS + [{'name': 'tags', 'type': 'strings'}], FIELD_TYPES, DYNAMIC_FIELDS)
+        docs = self.parse([b'id,popularity,ratings,years_is,attr_colour\n1,3,"4,5",2016,"red,blue"\n'],
+                          schema=schema, types={'id': int})
+        self.assertEqual(docs, [{'id': 1, 'popularity': 3, 'ratings': [4, 5], 'years_is': [2016],
+                                 'attr_colour': ['red', 'blue']}])
+
+    def test_mv_separator(self):
+        docs = self.parse([b'tags\n"a|b,c|d\\|e"\n'], types={'tags': [str]}, mv_separator='|')
+        self.assertEqual(docs, [{'tags': ['a', 'b,c', 'd|e']}])
+
+    def test_no_trailing_newline(self):
+        "The last row may end without a line break, even after a quoted line break."
+        body = b'id,t\na,"x\ny"'
+        for size in (1, 4, len(body)):
+            self.assertEqual(self.parse(chunked(body, size)), [{'id': 'a', 't': 'x\ny'}])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.parse, [b'id\n"unfinished\n'])
+        self.assertRaises(ValueError, self.parse, [b'id\n"unfinished\nstill'])
+        self.assertRaises(ValueError, self.parse, [b'n\nx\n'], types={'n': int})
+
+
+class SearchCsvTestCase(testing.AsyncTestCase):
+    "Tests for Solr.search_csv(), with a mock HTTP client that sends the response in chunks."
+
+    def setUp(self):
+        super(SearchCsvTestCase, self).setUp()
+        self.fetched = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.body = BODY
+        self.code = 200
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            for chunk in chunked(self.body, 10):
+                yield gen.moment
+                request.streaming_callback(chunk)
+            response = httpclient.HTTPResponse(request, self.code, buffer=BytesIO(b''))
+            if self.code != 200:
+                raise httpclient.HTTPError(self.code, response=response)
+            return response
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_search_csv(self):
+        results = yield self.solr.search_csv('*:*', types=TYPES, fl='id,title', rows=3, start=6)
+        self.assertIsInstance(results, Results)
+        self.assertEqual(results.docs, DOCS)
+        self.assertEqual((results.hits, len(results)), (3, 3))
+        self.assertIn('wt=csv', self.fetched[0])
+        self.assertIn('fl=id%2Ctitle', self.fetched[0])
+
+    @testing.gen_test
+    def test_lazy_results(self):
+        "LazyResults want the response text, so we make Results instead."
+        self.solr.results_cls = LazyResults
+        results = yield self.solr.search_csv('*:*')
+        self.assertIsInstance(results, Results)
+
+    @testing.gen_test
+    def test_errors(self):
+        self.body = b'id,n\n"unfinished'
+        with self.assertRaises(SolrError):
+            yield self.solr.search_csv('*:*')
+
+        self.body = b'Server error'
+        self.code = 500
+        with self.assertRaises(SolrError):
+            yield self.solr.search_csv('*:*')
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import json
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import Results, SearchIterator, Solr, StopAsyncIteration
+
+try:
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from urlparse import parse_qs, urlsplit
+
+
+class SearchIteratorTestCase(testing.AsyncTestCase):
+    "Tests for Solr.search_iter(), with a mock HTTP client that pages through 25 documents."
+
+    NUM_DOCS = 25
+
+    def setUp(self):
+        super(SearchIteratorTestCase, self).setUp()
+        self.fetched = []  # the parameters of each request
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            params = parse_qs(urlsplit(request.url).query)
+            self.fetched.append(params)
+            yield gen.sleep(0.001)
+            # our cursor marks are the offset of the next page
+            start = int(params['cursorMark'][0].replace('*', '0'))
+            end = min(start + int(params.get('rows', ['10'])[0]), SearchIteratorTestCase.NUM_DOCS)
+            body = {
+                'response': {'numFound': SearchIteratorTestCase.NUM_DOCS,
+                             'docs': [{'id': 'doc_{}'.format(i)} for i in range(start, end)]},
+                'nextCursorMark': str(end) if end > start else params['cursorMark'][0],
+            }
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(json.dumps(body).encode('utf-8')))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_docs(self):
+        results = self.solr.search_iter('*:*', rows=10)
+        self.assertIsInstance(results, SearchIterator)
+        docs = []
+        while (yield results.fetch_next):
+            docs.append(results.next_object())
+
+        self.assertEqual([doc['id'] for doc in docs], ['doc_{}'.format(i) for i in range(25)])
+        # three pages with documents, and one to learn there aren't any more
+        self.assertEqual([params['cursorMark'] for params in self.fetched], [['*'], ['10'], ['20'], ['25']])
+        self.assertEqual(self.fetched[0]['sort'], ['id asc'])
+        self.assertFalse((yield results.fetch_next))
+
+    @testing.gen_test
+    def test_pages(self):
+        results = self.solr.search_iter('*:*', pages=True, prefetch=False, rows=10, sort='id desc',
+                                        cursorMark='10')
+        pages = []
+        while (yield results.fetch_next):
+            pages.append(results.next_object())
+
+        self.assertTrue(all(isinstance(page, Results) for page in pages))
+        self.assertEqual([len(page) for page in pages], [10, 5])
+        self.assertEqual(self.fetched[0]['sort'], ['id desc'])
+        self.assertEqual(results.cursor_mark, '25')
+
+    @testing.gen_test
+    def test_prefetch(self):
+        "The next page is requested before the caller asks for it."
+        results = self.solr.search_iter('*:*', rows=10)
+        yield results.fetch_next
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(self.fetched[1]['cursorMark'], ['10'])
+
+        self.fetched = []
+        results = self.solr.search_iter('*:*', rows=10, prefetch=False)
+        yield results.fetch_next
+        yield gen.sleep(0.01)
+        self.assertEqual(len(self.fetched), 1)
+
+    @testing.gen_test
+    def test_anext(self):
+        "The asynchronous iterator protocol, as used by 'async for'."
+        results = self.solr.search_iter('*:*', rows=20).__aiter__()
+        docs = []
+        while True:
+            try:
+                docs.append((yield results.__anext__()))
+            except StopAsyncIteration:
+                break
+        self.assertEqual(len(docs), 25)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from concurrent import futures
+from io import BytesIO
+import json
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import Solr, SolrError
+
+from .javabin import DocList, encode_javabin
+
+
+DOCS = [{'id': 'doc_{}'.format(i), 'title': 'Ünïcödé ☃ {}'.format(i)} for i in range(20)]
+RESPONSE = {'responseHeader': {'status': 0}, 'response': {'numFound': 20, 'start': 0, 'docs': DOCS}}
+
+
+class CountingExecutor(futures.ThreadPoolExecutor):
+    "A thread pool that counts the functions it runs."
+
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn.__name__)
+        return super(CountingExecutor, self).submit(fn, *args, **kwargs)
+
+
+class ExecutorTestCase(testing.AsyncTestCase):
+    "Tests for offloading decoding and serializing to an executor, with a mock HTTP client."
+
+    def setUp(self):
+        super(ExecutorTestCase, self).setUp()
+        self.executor = CountingExecutor(2)
+        self.bodies = []
+        self.solr = self.make_solr(self.executor)
+        self.body = json.dumps(RESPONSE).encode('utf-8')
+
+    def tearDown(self):
+        self.executor.shutdown()
+        super(ExecutorTestCase, self).tearDown()
+
+    def make_solr(self, executor, **kwargs):
+        solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, executor=executor,
+                    executor_min_bytes=1000, executor_min_docs=10, **kwargs)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.bodies.append(request.body)
+            yield gen.moment
+            body = self.body if '/select' in request.url else b'{"responseHeader":{"status":0}}'
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        solr._client.fetch = mock_fetch
+        return solr
+
+    def test_init(self):
+        solr = Solr('http://localhost:8983/solr/collection1')
+        self.assertIsNone(solr.executor)
+        self.assertEqual((solr.executor_min_bytes, solr.executor_min_docs), (1048576, 1000))
+
+    @testing.gen_test
+    def test_decode(self):
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.docs, DOCS)
+        self.assertEqual(self.executor.submitted, ['_decode_response'])
+
+        # small responses stay on the IOLoop
+        self.body = b'{"response":{"numFound":0,"docs":[]}}'
+        results = yield self.solr.search('id:none')
+        self.assertEqual(results.hits, 0)
+        self.assertEqual(len(self.executor.submitted), 1)
+
+    @testing.gen_test
+    def test_decode_javabin(self):
+        self.body = encode_javabin({'response': DocList(DOCS * 3)})
+        results = yield self.solr.search('*:*', wt='javabin')
+        self.assertEqual(results.docs, DOCS * 3)
+        self.assertEqual(self.executor.submitted, ['_decode_response'])
+
+        self.body = b'\x03not javabin' * 200
+        with self.assertRaises(SolrError):
+            yield self.solr.search('*:*', wt='javabin')
+
+    @testing.gen_test
+    def test_custom_decoder(self):
+        class Decoder(json.JSONDecoder):
+            pass
+
+        solr = self.make_solr(self.executor, decoder=Decoder(object_hook=lambda obj: dict(obj, seen=True)))
+        results = yield solr.search('*:*')
+        self.assertTrue(results.docs[0]['seen'])
+
+    @testing.gen_test
+    def test_add(self):
+        yield self.solr.add(DOCS)
+        yield self.solr.add(DOCS, update_format='json')
+        yield self.solr.add(DOCS[:5])
+        yield self.solr.add(iter(DOCS))
+        self.assertEqual(self.executor.submitted, ['_build_add_message'] * 2)
+        self.assertEqual(self.bodies[0], self.solr._write_xml_add(DOCS))
+        self.assertEqual(self.bodies[1], self.solr._build_json_add(DOCS))
+        self.assertEqual(self.bodies[3], self.solr._write_xml_add(DOCS))
+
+    @testing.gen_test
+    def test_subclass(self):
+        "The executor uses the serializers of a subclass."
+        class CustomSolr(Solr):
+            def _from_python(self, value):
+                return 'custom'
+
+        solr = CustomSolr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, executor=self.executor,
+                          executor_min_docs=1)
+        message = yield solr._build_add(DOCS[:1], 'xml')
+        self.assertEqual(message, b'<add><doc><field name="id">custom</field><field name="title">custom</field></doc></add>')
+
+    @testing.gen_test
+    def test_stateful_subclass(self):
+        "Serializers may use attributes set in __init__(), with or without a thread pool."
+        class StatefulSolr(Solr):
+            def __init__(self, *args, **kwargs):
+                super(StatefulSolr, self).__init__(*args, **kwargs)
+                self.suffix = '!'
+
+            def _from_python(self, value):
+                return super(StatefulSolr, self)._from_python(value) + self.suffix
+
+        expected = ('<add><doc><field name="id">doc_0!</field><field name="title">Ünïcödé ☃ 0!</field></doc></add>'
+                    .encode('utf-8'))
+        for executor in (None, self.executor):
+            solr = StatefulSolr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, executor=executor,
+                                executor_min_docs=1)
+            message = yield solr._build_add(DOCS[:1], 'xml')
+            self.assertEqual(message, expected)
+
+    @testing.gen_test
+    def test_process_pool(self):
+        "Everything we send to the executor can be pickled."
+        executor = futures.ProcessPoolExecutor(1)
+        try:
+            solr = self.make_solr(executor)
+            results = yield solr.search('*:*')
+            self.assertEqual(results.docs, DOCS)
+            yield solr.add(DOCS)
+            self.assertEqual(self.bodies[-1], solr._write_xml_add(DOCS))
+        finally:
+            executor.shutdown()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import json
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import ExportIterator, Solr, SolrError, _DocStreamParser
+
+
+RESPONSE = {
+    'responseHeader': {'status': 0, 'params': {'q': '"docs":[{"id": "trap"}]', 'fl': 'id'}},
+    'response': {
+        'numFound': 3,
+        'start': 0,
+        'docs': [
+            {'id': 'doc_1', 'title': ['Ünïcödé ☃', 'with "quotes" and ]brackets['], 'price': 1.5},
+            {'id': 'doc_2', 'nested': {'docs': [1, 2]}, 'empty': []},
+            {'id': 'doc_3', 'text': '\\\\ backslashes \\" and escapes \n'},
+        ],
+    },
+    'facet_counts': {'facet_fields': {'docs': ['a', 1]}},
+}
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class DocStreamParserTestCase(unittest.TestCase):
+    "Tests for _DocStreamParser."
+
+    def parse(self, chunks):
+        parser = _DocStreamParser()
+        docs = []
+        for chunk in chunks:
+            docs.extend(parser.feed(chunk))
+        last_docs, rest = parser.close()
+        return docs + last_docs, rest
+
+    def test_chunk_sizes(self):
+        "The response is split anywhere, even in the middle of a UTF-8 character."
+        body = json.dumps(RESPONSE, ensure_ascii=False, indent=1).encode('utf-8')
+        expected_rest = json.loads(body.decode('utf-8'))
+        expected_rest['response']['docs'] = []
+        for size in (1, 2, 3, 7, 64, len(body)):
+            docs, rest = self.parse(chunked(body, size))
+            self.assertEqual(docs, RESPONSE['response']['docs'])
+            self.assertEqual(rest, expected_rest)
+
+    def test_incremental(self):
+        "Each document is available as soon as it arrives."
+        parser = _DocStreamParser()
+        self.assertEqual(parser.feed(b'{"response":{"numFound":2,"docs":[{"id":"a"'), [])
+        self.assertEqual(parser.feed(b'},{"id":'), [{'id': 'a'}])
+        self.assertEqual(parser.feed(b'"b"}]}}'), [{'id': 'b'}])
+        self.assertEqual(parser.close(), ([], {'response': {'numFound': 2, 'docs': []}}))
+
+    def test_large_document(self):
+        "A document that spans many chunks is only parsed a few times, even with '}' in every chunk."
+        calls = []
+
+        class CountingDecoder(json.JSONDecoder):
+            "Our own decoder, so we don't patch the module's shared one."
+            def raw_decode(self, *args, **kwargs):
+                calls.append(1)
+                return super(CountingDecoder, self).raw_decode(*args, **kwargs)
+
+        parser = _DocStreamParser(CountingDecoder())
+        body = json.dumps({'response': {'docs': [{'text': 'x}' * 50000}]}}).encode('utf-8')
+        docs = []
+        for chunk in chunked(body, 1000):
+            docs.extend(parser.feed(chunk))
+        docs.extend(parser.close()[0])
+        self.assertEqual(len(docs), 1)
+        self.assertLess(len(calls), 20)
+
+    def test_no_docs(self):
+        docs, rest = self.parse([b'{"responseHeader":{"status":400},', b'"error":{"msg":"bad"}}'])
+        self.assertEqual(docs, [])
+        self.assertEqual(rest['error']['msg'], 'bad')
+
+    def test_truncated(self):
+        parser = _DocStreamParser()
+        parser.feed(b'{"response":{"docs":[{"id":"a"},{"id"')
+        self.assertRaises(ValueError, parser.close)
+
+
+class ExportTestCase(testing.AsyncTestCase):
+    "Tests for Solr.export(), with a mock HTTP client that streams the response in small chunks."
+
+    def setUp(self):
+        super(ExportTestCase, self).setUp()
+        self.fetched = []
+        self.body = json.dumps(RESPONSE).encode('utf-8')
+        self.code = 200
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            for chunk in chunked(self.body, 50):
+                yield gen.moment
+                request.streaming_callback(chunk)
+            if self.code != 200:
+                raise httpclient.HTTPError(self.code, response=httpclient.HTTPResponse(request, self.code))
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(b''))
+
+        self.solr._client.fetch = mock_fetch
+
+    @gen.coroutine
+    def export_all(self, docs):
+        exported = []
+        while (yield docs.fetch_next):
+            exported.append(docs.next_object())
+        return exported
+
+    @testing.gen_test
+    def test_export(self):
+        docs = self.solr.export('*:*', 'id,price', 'id asc', fq='price:[1 TO *]')
+        self.assertIsInstance(docs, ExportIterator)
+        self.assertEqual(self.fetched, [])
+        exported = yield self.export_all(docs)
+        self.assertEqual(exported, RESPONSE['response']['docs'])
+        self.assertEqual(len(self.fetched), 1)
+        self.assertTrue(self.fetched[0].startswith('http://localhost:8983/solr/collection1/export?'))
+        self.assertIn('fq=price', self.fetched[0])
+
+    @testing.gen_test
+    def test_export_exception(self):
+        "Errors in the middle of the export come after the documents that arrived before them."
+        self.body = b'{"responseHeader":{"status":0},"response":{"numFound":2,"docs":[{"id":"doc_1"},' + \
+                    b'{"EXCEPTION":"java.io.IOException: sort field has no docValues"}]}}'
+        docs = self.solr.export('*:*', 'id', 'title asc')
+        self.assertTrue((yield docs.fetch_next))
+        self.assertEqual(docs.next_object(), {'id': 'doc_1'})
+        with self.assertRaises(SolrError) as cm:
+            yield docs.fetch_next
+        self.assertIn('docValues', cm.exception.args[0])
+
+    @testing.gen_test
+    def test_export_failed(self):
+        self.code = 400
+        self.body = b'{"error":{"msg":"bad request"}}'
+        docs = self.solr.export('*:*', 'id', 'id asc')
+        with self.assertRaises(SolrError) as cm:
+            yield docs.fetch_next
+        self.assertEqual(cm.exception.code, 400)
+
+    @testing.gen_test
+    def test_export_truncated(self):
+        self.body = self.body[:-20]
+        docs = self.solr.export('*:*', 'id', 'id asc')
+        with self.assertRaises(SolrError):
+            yield self.export_all(docs)
+
+
+class StreamDecodeTestCase(testing.AsyncTestCase):
+    "Tests for Solr(stream_decode=True), with a mock HTTP client that streams when asked to."
+
+    def setUp(self):
+        super(StreamDecodeTestCase, self).setUp()
+        self.body = json.dumps(RESPONSE).encode('utf-8')
+        self.code = 200
+        self.streamed = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, stream_decode=True)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            yield gen.moment
+            self.streamed.append(request.streaming_callback is not None)
+            if request.streaming_callback is None:
+                buffer = BytesIO(self.body)
+            else:
+                for chunk in chunked(self.body, 10):
+                    request.streaming_callback(chunk)
+                buffer = BytesIO(b'')
+            if self.code != 200:
+                raise httpclient.HTTPError(self.code, response=httpclient.HTTPResponse(request, self.code))
+            return httpclient.HTTPResponse(request, 200, buffer=buffer)
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_search(self):
+        "The results are the same with and without streaming."
+        streamed = yield self.solr.search('*:*')
+        self.solr.stream_decode = False
+        buffered = yield self.solr.search('*:*')
+        self.assertEqual(self.streamed, [True, False])
+        self.assertEqual(streamed.docs, RESPONSE['response']['docs'])
+        self.assertEqual(streamed.docs, buffered.docs)
+        self.assertEqual(streamed.hits, 3)
+        self.assertEqual(streamed.facets, buffered.facets)
+
+    @testing.gen_test
+    def test_more_like_this(self):
+        results = yield self.solr.more_like_this('id:doc_1', 'title')
+        self.assertEqual(results.docs, RESPONSE['response']['docs'])
+        self.assertEqual(self.streamed, [True])
+
+    @testing.gen_test
+    def test_suggest_terms(self):
+        "Terms responses have no documents, so they aren't streamed."
+        self.body = b'{"terms":{"title":["dance",23]}}'
+        self.assertEqual((yield self.solr.suggest_terms('title', 'd')), {'title': [('dance', 23)]})
+        self.assertEqual(self.streamed, [False])
+
+    @testing.gen_test
+    def test_errors(self):
+        self.code = 500
+        self.body = b'<html>Internal Server Error</html>'
+        with self.assertRaises(SolrError) as cm:
+            yield self.solr.search('*:*')
+        self.assertEqual(cm.exception.code, 500)
+
+        self.code = 200
+        self.body = b'{"response":{"docs":[{"id":'
+        with self.assertRaises(SolrError):
+            yield self.solr.search('*:*')
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from tornado import gen, testing
+
+from pysolrtornado import BulkIndexer, CommitScheduler, Solr, SolrError, force_unicode
+
+
+class BulkIndexerTestCase(testing.AsyncTestCase):
+    "Tests for BulkIndexer, with a mock Solr._update() so we can control each request."
+
+    def setUp(self):
+        super(BulkIndexerTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.docs = [{'id': 'doc_{}'.format(i)} for i in range(10)]
+        self.sent = []  # the messages given to _update()
+        self.running = 0  # how many mock requests are running
+        self.most_running = 0
+        self.fail_message = None  # if a message contains this, the mock request fails
+
+        @gen.coroutine
+        def mock_update(message, **kwargs):
+            self.sent.append((message, kwargs))
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+            try:
+                yield gen.sleep(0.01)
+                if self.fail_message and self.fail_message in message:
+                    raise SolrError('500: Internal Server Error')
+            finally:
+                self.running -= 1
+            return '<int name="status">0</int>'
+
+        self.solr._update = mock_update
+
+    @testing.gen_test
+    def test_batch_size(self):
+        "Documents go out in batches of batch_size, and flush() sends the remainder."
+        indexer = BulkIndexer(self.solr, batch_size=4, update_format='json')
+        yield indexer.add_many(self.docs)
+        self.assertEqual(len(self.sent), 2)
+        yield indexer.flush()
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(indexer.docs_sent, 10)
+        self.assertEqual(indexer.batches_sent, 3)
+        self.assertEqual(self.sent[0][0], self.solr._build_json_add(self.docs[:4]))
+        self.assertEqual(self.sent[0][1]['commit'], False)
+        self.assertEqual(self.sent[2][0], self.solr._build_json_add(self.docs[8:]))
+
+    @testing.gen_test
+    def test_max_bytes(self):
+        "A batch goes out as soon as it's big enough."
+        indexer = BulkIndexer(self.solr, max_bytes=1)
+        yield indexer.add_many(self.docs[:3])
+        yield indexer.flush()
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(self.sent[0][0], b'<add><doc><field name="id">doc_0</field></doc></add>')
+
+    @testing.gen_test
+    def test_window(self):
+        "No more than max_in_flight requests run at once."
+        indexer = BulkIndexer(self.solr, batch_size=1, max_in_flight=3)
+        yield indexer.add_many(self.docs)
+        self.assertLessEqual(indexer.in_flight, 3)
+        yield indexer.close()
+        self.assertEqual(self.most_running, 3)
+        self.assertEqual(indexer.in_flight, 0)
+        self.assertEqual(indexer.docs_sent, 10)
+
+    @testing.gen_test
+    def test_flush_interval(self):
+        "A partial batch goes out after flush_interval."
+        indexer = BulkIndexer(self.solr, flush_interval=0.01)
+        yield indexer.add(self.docs[0])
+        self.assertEqual(len(self.sent), 0)
+        yield gen.sleep(0.05)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(indexer.docs_sent, 1)
+
+    @testing.gen_test
+    def test_flush_waits_for_window(self):
+        "close() waits for a batch that the timer sent while the window was full."
+        finished = []
+        update = self.solr._update
+
+        @gen.coroutine
+        def mock_update(message, **kwargs):
+            message = force_unicode(message)
+            if message.startswith('<commit'):
+                self.assertIn('doc_b', ''.join(finished))
+            yield update(message, **kwargs)
+            finished.append(message)
+
+        self.solr._update = mock_update
+        indexer = BulkIndexer(self.solr, batch_size=1, max_in_flight=1, flush_interval=0.001)
+        yield indexer.add({'id': 'doc_a'})  # starts the only request in the window
+        indexer.batch_size = 10
+        yield indexer.add({'id': 'doc_b'})  # waits for the timer, then for the window
+        yield gen.sleep(0.005)
+        yield indexer.close(commit=True)
+        self.assertEqual(indexer.docs_sent, 2)
+        self.assertEqual(len(finished), 3)
+
+    @testing.gen_test
+    def test_commit_scheduler(self):
+        "Batches leave committing to the CommitScheduler, unless asked to commit."
+        scheduler = CommitScheduler(self.solr, interval=0.01)
+        indexer = BulkIndexer(self.solr, batch_size=2)
+        yield indexer.add_many(self.docs[:4])
+        yield indexer.close()
+        self.assertEqual([kwargs['commit'] for _, kwargs in self.sent], [False, False])
+        self.assertEqual(scheduler.writes, 2)
+        yield scheduler.wait()
+        self.assertEqual(scheduler.commits, 1)
+
+        indexer = BulkIndexer(self.solr, batch_size=2, commit=True)
+        yield indexer.add_many(self.docs[:2])
+        self.assertEqual(self.sent[-1][1]['commit'], True)
+        self.assertEqual(scheduler.writes, 2)
+
+    @testing.gen_test
+    def test_failures(self):
+        "A failed batch is reported, and the other batches still go through."
+        errors = []
+        indexer = BulkIndexer(self.solr, batch_size=2, on_error=lambda docs, err: errors.append(docs))
+        self.fail_message = b'doc_3'
+        yield indexer.add_many(self.docs)
+        yield indexer.close()
+        self.assertEqual(indexer.docs_sent, 8)
+        self.assertEqual(len(indexer.failures), 1)
+        self.assertEqual(indexer.failures[0][0], self.docs[2:4])
+        self.assertIsInstance(indexer.failures[0][1], SolrError)
+        self.assertEqual(errors, [self.docs[2:4]])
+
+
+class CommitSchedulerTestCase(testing.AsyncTestCase):
+    "Tests for CommitScheduler, with a mock Solr._send_request() that records the update URLs."
+
+    def setUp(self):
+        super(CommitSchedulerTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.requests = []  # two-tuples of path and body
+        self.fail_commits = False
+        self.commit_delay = 0.001
+
+        @gen.coroutine
+        def mock_send_request(method, path='', body=None, headers=None, files=None, **kwargs):
+            body = force_unicode(body)
+            self.requests.append((path, body))
+            yield gen.sleep(self.commit_delay if '<commit' in body else 0.001)
+            if self.fail_commits and '<commit' in body:
+                raise SolrError('503: Service Unavailable')
+            return '<int name="status">0</int>'
+
+        self.solr._send_request = mock_send_request
+
+    def commits(self):
+        return [path for path, body in self.requests if '<commit' in body]
+
+    @testing.gen_test
+    def test_without_scheduler(self):
+        "Writes commit every time, as before."
+        yield self.solr.add([{'id': 'doc_1'}])
+        yield self.solr.delete(id='doc_1')
+        self.assertEqual(self.requests[0][0], 'update/?commit=true')
+        self.assertEqual(self.requests[1][0], 'update/?commit=true')
+
+    @testing.gen_test
+    def test_coalesce(self):
+        "Many writes share one commit."
+        scheduler = CommitScheduler(self.solr, interval=0.02)
+        self.assertIs(self.solr.commit_scheduler, scheduler)
+
+        yield self.solr.add([{'id': 'doc_1'}])
+        yield self.solr.add([{'id': 'doc_2'}], update_format='json')
+        yield self.solr.delete(id='doc_1')
+        self.assertEqual([path for path, _ in self.requests], ['update/?commit=false'] * 3)
+        self.assertTrue(scheduler.pending)
+
+        yield scheduler.wait()
+        self.assertFalse(scheduler.pending)
+        self.assertEqual(self.commits(), ['update/?commit=true'])
+        self.assertEqual(scheduler.writes, 3)
+        self.assertEqual(scheduler.commits, 1)
+
+        # nothing pending, so this doesn't wait or commit
+        yield scheduler.wait()
+        self.assertEqual(scheduler.commits, 1)
+
+    @testing.gen_test
+    def test_explicit_commit(self):
+        "An explicit commit argument wins over the scheduler."
+        scheduler = CommitScheduler(self.solr, interval=0.01)
+        yield self.solr.add([{'id': 'doc_1'}], commit=True)
+        self.assertEqual(self.requests[0][0], 'update/?commit=true')
+        self.assertFalse(scheduler.pending)
+
+    @testing.gen_test
+    def test_soft_commit(self):
+        scheduler = CommitScheduler(self.solr, interval=0.01, softCommit=True)
+        yield self.solr.add([{'id': 'doc_1'}])
+        yield scheduler.flush()
+        self.assertEqual(self.requests[-1], ('update/?softCommit=true', '<commit softCommit="true" />'))
+
+    @testing.gen_test
+    def test_flush_during_commit(self):
+        "Writes made while a commit runs are committed as soon as it finishes, not an interval later."
+        scheduler = CommitScheduler(self.solr, interval=0.001)
+        self.commit_delay = 0.05
+        yield self.solr.add([{'id': 'doc_1'}])
+        yield gen.sleep(0.01)  # the timer starts the first commit
+        self.assertTrue(scheduler._committing)
+        scheduler.interval = 10
+        yield self.solr.add([{'id': 'doc_2'}])
+        start = self.io_loop.time()
+        yield scheduler.flush()
+        self.assertLess(self.io_loop.time() - start, 1)
+        self.assertFalse(scheduler.pending)
+        self.assertEqual(scheduler.commits, 2)
+        self.assertIsNone(scheduler._timer)
+
+    @testing.gen_test
+    def test_commit_within(self):
+        "In commitWithin mode, Solr does the committing."
+        scheduler = CommitScheduler(self.solr, interval=0.02, commitWithin=True)
+        yield self.solr.delete(q='*:*')
+        self.assertEqual(self.requests[0][0], 'update/?commit=false&commitWithin=20')
+        start = self.io_loop.time()
+        yield scheduler.wait()
+        self.assertGreater(self.io_loop.time() - start, 0.01)
+        self.assertEqual(self.commits(), [])
+
+    @testing.gen_test
+    def test_failed_commit(self):
+        "Waiters hear about a failed commit, and the writes stay pending."
+        scheduler = CommitScheduler(self.solr, interval=0.01)
+        self.fail_commits = True
+        yield self.solr.add([{'id': 'doc_1'}])
+        with self.assertRaises(SolrError):
+            yield scheduler.wait()
+        self.assertTrue(scheduler.pending)
+        with self.assertRaises(SolrError):
+            yield scheduler.flush()
+        self.assertTrue(scheduler.pending)
+
+        self.fail_commits = False
+        yield scheduler.flush()
+        self.assertFalse(scheduler.pending)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from io import BytesIO
+import struct
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import JavabinDecoder, Results, Solr, SolrError
+
+
+class NamedList(list):
+    "A list of (name, value) pairs, to encode as a javabin NAMED_LST."
+
+
+class Float(float):
+    "A float to encode as a javabin FLOAT, rather than a DOUBLE."
+
+
+class DocList(object):
+    "A list of documents to encode as a javabin SOLRDOCLST."
+
+    def __init__(self, docs, num_found=None, start=0, max_score=None):
+        self.docs = docs
+        self.num_found = len(docs) if num_found is None else num_found
+        self.start = start
+        self.max_score = max_score
+
+
+class JavabinWriter(object):
+    """
+    Encodes Python values in javabin, for test and benchmark fixtures. Dictionaries become
+    ORDERED_MAP, and field names in documents are EXTERN_STRING, like Solr does.
+    """
+
+    def __init__(self):
+        self._out = bytearray()
+        self._strings = {}
+
+    def encode(self, value):
+        self._out = bytearray([2])
+        self._strings = {}
+        self._write(value)
+        return bytes(self._out)
+
+    def _vint(self, value):
+        while value & ~0x7f:
+            self._out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        self._out.append(value)
+
+    def _tag_and_size(self, tag, size):
+        if size < 0x1f:
+            self._out.append(tag | size)
+        else:
+            self._out.append(tag | 0x1f)
+            self._vint(size - 0x1f)
+
+    def _str(self, value):
+        data = value.encode('utf-8')
+        self._tag_and_size(1 << 5, len(data))
+        self._out += data
+
+    def _extern_str(self, value):
+        if value in self._strings:
+            self._tag_and_size(7 << 5, self._strings[value])
+        else:
+            self._tag_and_size(7 << 5, 0)
+            self._str(value)
+            self._strings[value] = len(self._strings) + 1
+
+    def _write(self, value):
+        out = self._out
+        if value is None:
+            out.append(0)
+        elif value is True:
+            out.append(1)
+        elif value is False:
+            out.append(2)
+        elif isinstance(value, Float):
+            out.append(8)
+            out += struct.pack('>f', value)
+        elif isinstance(value, float):
+            out.append(5)
+            out += struct.pack('>d', value)
+        elif isinstance(value, int):
+            if 0 <= value < 2 ** 31:
+                out.append((2 << 5) | (value & 0x0f) | (0x10 if value > 0x0f else 0))
+                if value > 0x0f:
+                    self._vint(value >> 4)
+            elif -2 ** 31 <= value < 2 ** 31:
+                out.append(6)
+                out += struct.pack('>i', value)
+            else:
+                out.append(7)
+                out += struct.pack('>q', value)
+        elif isinstance(value, str):
+            self._str(value)
+        elif isinstance(value, bytes):
+            out.append(13)
+            self._vint(len(value))
+            out += value
+        elif isinstance(value, datetime.datetime):
+            out.append(9)
+            epoch = datetime.datetime(1970, 1, 1, tzinfo=value.tzinfo)
+            out += struct.pack('>q', (value - epoch) // datetime.timedelta(milliseconds=1))
+        elif isinstance(value, NamedList):
+            self._tag_and_size(6 << 5, len(value))
+            for name, each in value:
+                self._write(name)
+                self._write(each)
+        elif isinstance(value, dict):
+            self._tag_and_size(5 << 5, len(value))
+            for name, each in value.items():
+                self._write(name)
+                self._write(each)
+        elif isinstance(value, DocList):
+            out.append(12)
+            self._write([value.num_found, value.start, value.max_score])
+            self._tag_and_size(4 << 5, len(value.docs))
+            for doc in value.docs:
+                out.append(11)
+                self._tag_and_size(5 << 5, len(doc))
+                for name, each in doc.items():
+                    self._extern_str(name)
+                    self._write(each)
+        elif isinstance(value, (list, tuple)):
+            self._tag_and_size(4 << 5, len(value))
+            for each in value:
+                self._write(each)
+        else:
+            raise TypeError(value)
+
+
+def encode_javabin(value):
+    return JavabinWriter().encode(value)
+
+
+DOCS = [
+    {'id': 'doc_1', 'title': 'Ünïcödé ☃ ' * 5, 'popularity': 7, 'price': 12.5, 'score': Float(1.1),
+     'big': 2 ** 40, 'negative': -3, 'in_stock': True, 'pub_date': datetime.datetime(2016, 1, 2, 3, 4, 5),
+     'tags': ['a', 'b']},
+    {'id': 'doc_2', 'popularity': 123456, 'pub_date': datetime.datetime(1960, 1, 1, 0, 0, 0, 678000),
+     'payload': b'\x00\x01binary'},
+]
+
+
+class JavabinDecoderTestCase(unittest.TestCase):
+    "Tests for JavabinDecoder, with responses from our own encoder."
+
+    def test_response(self):
+        body = encode_javabin({
+            'responseHeader': {'status': 0, 'QTime': 3, 'params': {'q': '*:*', 'wt': 'javabin'}},
+            'response': DocList(DOCS, num_found=120, max_score=Float(1.1)),
+            'facet_counts': {'facet_fields': {'tags': NamedList([('a', 2), ('b', 1)])}},
+        })
+        decoded = JavabinDecoder().decode(body)
+        self.assertEqual(decoded['responseHeader'], {'status': 0, 'QTime': 3, 'params': {'q': '*:*', 'wt': 'javabin'}})
+        self.assertEqual(decoded['facet_counts'], {'facet_fields': {'tags': ['a', 2, 'b', 1]}})
+
+        response = decoded['response']
+        self.assertEqual((response['numFound'], response['start'], response['maxScore']), (120, 0, 1.1))
+        self.assertEqual(response['docs'], [
+            {'id': 'doc_1', 'title': 'Ünïcödé ☃ ' * 5, 'popularity': 7, 'price': 12.5, 'score': 1.1,
+             'big': 2 ** 40, 'negative': -3, 'in_stock': True, 'pub_date': '2016-01-02T03:04:05Z',
+             'tags': ['a', 'b']},
+            {'id': 'doc_2', 'popularity': 123456, 'pub_date': '1960-01-01T00:00:00.678Z', 'payload': 'AAFiaW5hcnk='},
+        ])
+
+        results = Results(decoded)
+        self.assertEqual(results.hits, 120)
+        self.assertEqual(results.qtime, 3)
+
+    def test_named_list_response(self):
+        "Named lists become flat lists, except the whole response, which is always a dictionary."
+        decoded = JavabinDecoder().decode(encode_javabin(NamedList([('terms', NamedList([('title', NamedList([('dance', 23)]))]))])))
+        self.assertEqual(decoded, {'terms': ['title', ['dance', 23]]})
+
+    def test_iterators(self):
+        "Solr streams some lists and maps without knowing their size."
+        # {'list': <iterator of 'a', 1>, 'map': <map entry iterator of 'a': 1>}
+        body = bytes(bytearray([2, 0xa2, 0x24]) + b'list' + bytearray([14, 0x21, ord('a'), 0x41, 15]) +
+                     bytearray([0x23]) + b'map' + bytearray([17, 0x21, ord('a'), 0x41, 15]))
+        self.assertEqual(JavabinDecoder().decode(body), {'list': ['a', 1], 'map': {'a': 1}})
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, JavabinDecoder().decode, b'')
+        self.assertRaises(ValueError, JavabinDecoder().decode, b'{"response":{}}')
+        self.assertRaises(ValueError, JavabinDecoder().decode, encode_javabin({'a': 'bcdef'})[:-2])
+
+    def test_date_out_of_range(self):
+        "Solr dates that datetime can't represent are invalid, not an OverflowError."
+        for millis in (253402300800000, -62135596800001):  # 10000-01-01, and just before 0001-01-01
+            body = bytes(bytearray([2, 0xa1, 0x21, ord('d'), 9]) + struct.pack('>q', millis))
+            with self.assertRaises(ValueError) as context:
+                JavabinDecoder().decode(body)
+            self.assertIn(str(millis), str(context.exception))
+
+
+class JavabinSolrTestCase(testing.AsyncTestCase):
+    "Tests for choosing the javabin format in Solr, with a mock HTTP client."
+
+    def setUp(self):
+        super(JavabinSolrTestCase, self).setUp()
+        self.fetched = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, response_format='javabin')
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            yield gen.moment
+            response = {'response': DocList([{'id': 'doc_1'}])}
+            if 'wt=javabin' in request.url:
+                body = encode_javabin(response)
+            else:
+                body = b'{"response":{"numFound":1,"start":0,"docs":[{"id":"doc_1"}]}}'
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        self.solr._client.fetch = mock_fetch
+
+    def test_init(self):
+        self.assertEqual(Solr('http://localhost:8983/solr').response_format, 'json')
+        self.assertRaises(ValueError, Solr, 'http://localhost:8983/solr', response_format='xml')
+
+    @testing.gen_test
+    def test_search(self):
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.docs, [{'id': 'doc_1'}])
+        self.assertIn('wt=javabin', self.fetched[0])
+
+        # per call
+        results = yield self.solr.more_like_this('*:*', 'title', wt='json')
+        self.assertEqual(results.docs, [{'id': 'doc_1'}])
+        self.assertIn('wt=json', self.fetched[1])
+
+        with self.assertRaises(ValueError):
+            yield self.solr.search('*:*', wt='xml')
+
+    @testing.gen_test
+    def test_search_date_out_of_range(self):
+        @gen.coroutine
+        def mock_fetch(request):
+            yield gen.moment
+            body = bytes(bytearray([2, 0xa1, 0x21, ord('d'), 9]) + struct.pack('>q', 253402300800000))
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        self.solr._client.fetch = mock_fetch
+        with self.assertRaises(SolrError):
+            yield self.solr.search('*:*')
+
+    @testing.gen_test
+    def test_search_stream_decode(self):
+        "Javabin isn't decoded incrementally, even when asked."
+        self.solr.stream_decode = True
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.hits, 1)
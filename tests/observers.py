@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import json
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import RequestRecord, ResponseCache, RetryPolicy, Solr, SolrError
+
+
+RESPONSE = {'responseHeader': {'status': 0, 'QTime': 7},
+            'response': {'numFound': 2, 'start': 0, 'docs': [{'id': 'doc_1'}, {'id': 'doc_2'}]}}
+BODY = json.dumps(RESPONSE).encode('utf-8')
+
+
+class ObserverTestCase(testing.AsyncTestCase):
+    """
+    Tests for Solr.add_observer() and the RequestRecord given to observers, with a mock HTTP
+    client. The first ``self.failures`` requests fail with ``self.fail_code``.
+    """
+
+    def setUp(self):
+        super(ObserverTestCase, self).setUp()
+        self.records = []
+        self.failures = 0
+        self.fail_code = 503
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.solr.add_observer(self.records.append)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            yield gen.moment
+            if self.failures > 0:
+                self.failures -= 1
+                raise httpclient.HTTPError(self.fail_code,
+                                           response=httpclient.HTTPResponse(request, self.fail_code))
+            if request.streaming_callback is not None:
+                for start in range(0, len(BODY), 50):
+                    request.streaming_callback(BODY[start:start + 50])
+                return httpclient.HTTPResponse(request, 200, buffer=BytesIO(b''), request_time=0.25)
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(BODY), request_time=0.25,
+                                           time_info={'connect': 0.01, 'starttransfer': 0.2})
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_search(self):
+        results = yield self.solr.search('*:*')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertIsInstance(record, RequestRecord)
+        self.assertEqual(record.handler, 'select')
+        self.assertEqual(record.method, 'GET')
+        self.assertEqual(record.status, 200)
+        self.assertTrue(record.url.startswith('http://localhost:8983/solr/collection1/select/?'))
+        self.assertEqual(record.attempts, 1)
+        self.assertFalse(record.hedged)
+        self.assertEqual(record.request_time, 0.25)
+        self.assertEqual(record.time_info, {'connect': 0.01, 'starttransfer': 0.2})
+        self.assertEqual(record.bytes_sent, 0)
+        self.assertEqual(record.bytes_received, len(BODY))
+        self.assertEqual(record.qtime, 7)
+        self.assertGreaterEqual(record.decode_time, 0.0)
+        self.assertIsNone(record.error)
+        self.assertGreaterEqual(record.total_time, record.decode_time)
+        self.assertEqual(record.as_dict()['handler'], 'select')
+
+    @testing.gen_test
+    def test_stream_decode(self):
+        "Bytes received are counted chunk by chunk, and decoding time includes every chunk."
+        self.solr.stream_decode = True
+        results = yield self.solr.search('*:*')
+        self.assertEqual(len(results), 2)
+        record = self.records[0]
+        self.assertEqual(record.bytes_received, len(BODY))
+        self.assertEqual(record.qtime, 7)
+        self.assertIsNotNone(record.decode_time)
+
+    @testing.gen_test
+    def test_update(self):
+        yield self.solr.add([{'id': 'doc_1'}])
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual(record.handler, 'update')
+        self.assertEqual(record.method, 'POST')
+        self.assertGreater(record.bytes_sent, 0)
+        self.assertIsNone(record.qtime)
+        self.assertIsNone(record.decode_time)
+
+    @testing.gen_test
+    def test_error(self):
+        self.failures = 1
+        with self.assertRaises(SolrError):
+            yield self.solr.search('*:*')
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual(record.status, 503)
+        self.assertEqual(record.error, httpclient.HTTPError.__name__)
+        self.assertIsNone(record.qtime)
+
+    @testing.gen_test
+    def test_retries(self):
+        "Retries make one record, which counts the attempts."
+        self.solr.retry_policy = RetryPolicy(backoff=0.001)
+        self.failures = 2
+        yield self.solr.search('*:*')
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual(record.attempts, 3)
+        self.assertEqual(record.status, 200)
+        self.assertIsNone(record.error)
+
+    @testing.gen_test
+    def test_cache_hit(self):
+        "Responses from the cache didn't make a request, so there's no record."
+        self.solr.cache = ResponseCache()
+        yield self.solr.search('*:*')
+        yield self.solr.search('*:*')
+        self.assertEqual(len(self.records), 1)
+
+    @testing.gen_test
+    def test_failing_observer(self):
+        "An observer's exception doesn't fail the request, or stop other observers."
+        def broken(record):
+            raise RuntimeError('oops')
+
+        others = []
+        self.solr.remove_observer(self.records.append)
+        self.solr.add_observer(broken)
+        self.solr.add_observer(others.append)
+        results = yield self.solr.search('*:*')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(others), 1)
+        self.assertEqual(self.records, [])
+
+    @testing.gen_test
+    def test_no_observers(self):
+        "Without observers, nothing is measured."
+        self.solr.remove_observer(self.records.append)
+        results = yield self.solr.search('*:*')
+        self.assertEqual(len(results), 2)
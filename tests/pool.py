@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+
+from tornado import gen, httpclient, locks, testing
+
+from pysolrtornado import HedgePolicy, Results, RetryPolicy, SolrError, SolrNode, SolrPool
+
+
+URLS = ['http://solr1:8983/solr/collection1', 'http://solr2:8983/solr/collection1',
+        'http://solr3:8983/solr/collection1']
+
+
+class SolrPoolTestCase(testing.AsyncTestCase):
+    "Tests for SolrPool, with a mock HTTP client that records which node gets each request."
+
+    def setUp(self):
+        super(SolrPoolTestCase, self).setUp()
+        self.fetched = []  # URLs of the requests
+        self.delays = {}  # base URL to seconds before the mock responds
+        self.down = set()  # base URLs that refuse connections
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault('health_check_interval', 0)
+        pool = SolrPool(URLS, ioloop=self.io_loop, **kwargs)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            base_url = next(url for url in URLS if request.url.startswith(url))
+            yield gen.sleep(self.delays.get(base_url, 0.001))
+            if base_url in self.down:
+                raise ConnectionRefusedError('whatever')
+            if '/admin/ping' in request.url:
+                body = b'{"status":"OK"}'
+            else:
+                body = b'{"response":{"numFound":1,"docs":[{"id":"doc_1"}]}}'
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(body))
+
+        pool._client.fetch = mock_fetch
+        return pool
+
+    def nodes_used(self):
+        return [next(i for i, url in enumerate(URLS) if fetched.startswith(url)) for fetched in self.fetched]
+
+    def test_init(self):
+        pool = self.make_pool()
+        self.assertEqual(pool.url, URLS[0])
+        self.assertEqual([node.url for node in pool.nodes], URLS)
+        self.assertEqual(pool.balancer, 'round_robin')
+        self.assertRaises(ValueError, SolrPool, [], ioloop=self.io_loop)
+        self.assertRaises(ValueError, SolrPool, URLS, balancer='random', ioloop=self.io_loop)
+
+    @testing.gen_test
+    def test_round_robin(self):
+        pool = self.make_pool()
+        for _ in range(6):
+            results = yield pool.search('*:*')
+        self.assertIsInstance(results, Results)
+        self.assertEqual(self.nodes_used(), [0, 1, 2, 0, 1, 2])
+        self.assertEqual([node.outstanding for node in pool.nodes], [0, 0, 0])
+        self.assertEqual([node.requests for node in pool.nodes], [2, 2, 2])
+
+    @testing.gen_test
+    def test_writes(self):
+        "Writes go to the first healthy node."
+        pool = self.make_pool()
+        yield pool.add([{'id': 'doc_1'}])
+        yield pool.more_like_this('id:doc_1', 'title')
+        pool.nodes[0].healthy = False
+        yield pool.delete(id='doc_1')
+        self.assertEqual(self.nodes_used(), [0, 0, 1])
+
+    @testing.gen_test
+    def test_least_outstanding(self):
+        pool = self.make_pool(balancer='least_outstanding')
+        self.delays[URLS[0]] = 0.05
+        slow = pool.search('*:*')
+        for _ in range(3):
+            # each pair runs at once, and neither should wait behind the slow request
+            yield [pool.search('*:*'), pool.search('*:*')]
+        yield slow
+        self.assertEqual(self.nodes_used().count(0), 1)
+
+    @testing.gen_test
+    def test_ewma(self):
+        "The slow node gets fewer requests once we know it's slow."
+        pool = self.make_pool(balancer='ewma')
+        self.delays[URLS[1]] = 0.02
+        for _ in range(10):
+            yield pool.search('*:*')
+        self.assertGreater(pool.nodes[1].ewma, pool.nodes[0].ewma)
+        self.assertEqual(self.nodes_used().count(1), 1)
+
+    @testing.gen_test
+    def test_ewma_failures(self):
+        "A node that fails quickly counts as slow, so it gets fewer requests."
+        pool = self.make_pool(balancer='ewma')
+        self.down.add(URLS[1])
+        for _ in range(10):
+            try:
+                yield pool.search('*:*')
+            except SolrError:
+                pass
+        self.assertEqual(pool.nodes[1].failures, 1)
+        self.assertGreaterEqual(pool.nodes[1].ewma, pool.timeout)
+        self.assertEqual(self.nodes_used().count(1), 1)
+
+    @testing.gen_test
+    def test_request_setup_fails(self):
+        "If preparing the request fails, the node and the connection slot are given back."
+        pool = self.make_pool()
+        pool._slots = locks.Semaphore(1)
+        pool.queue_timeout = 0.1  # so a slot that isn't given back fails the second search
+
+        def broken_url(path, base_url=None):
+            raise TypeError('broken')
+
+        pool._create_full_url = broken_url
+        for _ in range(2):
+            with self.assertRaises(TypeError):
+                yield pool.search('*:*')
+        self.assertEqual([node.outstanding for node in pool.nodes], [0, 0, 0])
+        self.assertEqual(pool._active, 0)
+
+    @testing.gen_test
+    def test_health_checks(self):
+        "Nodes that fail their ping are ejected, then reinstated once they pass again."
+        pool = self.make_pool()
+        self.down.add(URLS[1])
+        yield pool.check_health()
+        self.assertEqual([node.healthy for node in pool.nodes], [True, False, True])
+
+        self.fetched = []
+        for _ in range(4):
+            yield pool.search('*:*')
+        self.assertNotIn(1, self.nodes_used())
+
+        self.down.clear()
+        yield pool.check_health()
+        self.assertTrue(pool.nodes[1].healthy)
+
+    @testing.gen_test
+    def test_health_checks_use_slots(self):
+        "Pings take a connection slot, count as active, and are skipped if no slot comes in time."
+        pool = self.make_pool(health_check_timeout=0.05)
+        pool._slots = locks.Semaphore(1)
+        active = []
+        fetch = pool._client.fetch
+
+        @gen.coroutine
+        def counting_fetch(request):
+            active.append(pool._active)
+            return (yield fetch(request))
+
+        pool._client.fetch = counting_fetch
+        self.down.add(URLS[1])
+        yield pool.check_health()
+        self.assertEqual(active, [1, 1, 1])
+        self.assertEqual(pool._active, 0)
+        self.assertEqual([node.healthy for node in pool.nodes], [True, False, True])
+
+        # with the only slot taken, nothing is checked and nothing changes
+        yield pool._slots.acquire()
+        self.down.clear()
+        yield pool.check_health()
+        self.assertEqual(len(active), 3)
+        self.assertFalse(pool.nodes[1].healthy)
+        pool._slots.release()
+
+    @testing.gen_test
+    def test_background_health_checks(self):
+        pool = self.make_pool(health_check_interval=0.01)
+        self.down.add(URLS[2])
+        yield gen.sleep(0.05)
+        pool.close()
+        self.assertFalse(pool.nodes[2].healthy)
+        self.assertIsNone(pool._health_timer)
+
+    @testing.gen_test
+    def test_all_ejected(self):
+        "With no healthy nodes, we try them anyway."
+        pool = self.make_pool()
+        for node in pool.nodes:
+            node.healthy = False
+        yield pool.search('*:*')
+        self.assertEqual(len(self.fetched), 1)
+
+    @testing.gen_test
+    def test_failures(self):
+        pool = self.make_pool()
+        self.down.add(URLS[0])
+        with self.assertRaises(SolrError):
+            yield pool.search('*:*')
+        self.assertEqual(pool.nodes[0].failures, 1)
+        self.assertEqual(pool.nodes[0].outstanding, 0)
+
+    @testing.gen_test
+    def test_retry_other_node(self):
+        "A retry goes to another node than the one that failed."
+        pool = self.make_pool(retry_policy=RetryPolicy(backoff=0.001))
+        self.down.add(URLS[0])
+        yield pool.search('*:*')
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(self.nodes_used()[0], 0)
+        self.assertNotEqual(self.nodes_used()[1], 0)
+
+    @testing.gen_test
+    def test_hedging(self):
+        "A slow search is sent to another node too, and the faster response wins."
+        pool = self.make_pool(hedge_policy=HedgePolicy(delay=0.01))
+        self.delays[URLS[0]] = 0.2
+        results = yield pool.search('*:*')
+        self.assertEqual(results.hits, 1)
+        self.assertEqual(len(self.fetched), 2)
+        self.assertNotEqual(self.nodes_used()[1], 0)
+        self.assertEqual(pool.hedge_policy.stats()['hedges'], 1)
+        self.assertEqual(pool.hedge_policy.wins, 1)
+
+        # fast requests and updates aren't hedged
+        self.fetched = []
+        yield pool.search('*:*')
+        yield pool.add([{'id': 'doc_1'}])
+        self.assertEqual(len(self.fetched), 2)
+        yield gen.sleep(0.2)  # let the slow request finish
+
+    @testing.gen_test
+    def test_hedging_failure(self):
+        "If the hedged request fails, we still get the original response."
+        pool = self.make_pool(hedge_policy=HedgePolicy(delay=0.01))
+        self.delays[URLS[0]] = 0.05
+        self.down.update(URLS[1:])
+        results = yield pool.search('*:*')
+        self.assertEqual(results.hits, 1)
+        self.assertEqual(pool.hedge_policy.hedges, 1)
+        self.assertEqual(pool.hedge_policy.wins, 0)
+
+    @testing.gen_test
+    def test_hedging_budget(self):
+        pool = self.make_pool(hedge_policy=HedgePolicy(delay=0.001, max_budget=1))
+        self.delays[URLS[0]] = self.delays[URLS[1]] = self.delays[URLS[2]] = 0.01
+        yield pool.search('*:*')
+        yield pool.search('*:*')
+        self.assertEqual(pool.hedge_policy.hedges, 1)
+        self.assertEqual(len(self.fetched), 3)
+        yield gen.sleep(0.02)
+
+    def test_hedge_delay(self):
+        "With a percentile, the delay adapts to the recent latencies."
+        policy = HedgePolicy(delay=0.5, percentile=90, window=20)
+        for latency in range(1, 10):
+            policy.record_latency(latency / 100.0)
+        self.assertEqual(policy.hedge_delay(), 0.5)
+        for latency in range(10, 41):
+            policy.record_latency(latency / 100.0)
+        # the window holds 0.21 to 0.40
+        self.assertEqual(policy.hedge_delay(), 0.39)
+        self.assertTrue(policy.applies_to('mlt/?q=id:1'))
+        self.assertFalse(policy.applies_to('update/?commit=true'))
+
+    @testing.gen_test
+    def test_stats(self):
+        "The stats include every node."
+        pool = self.make_pool(collect_stats=True)
+        yield pool.search('*:*')
+        stats = pool.stats()
+        self.assertEqual(sorted(stats['nodes']), sorted(URLS))
+        self.assertEqual(sum(node['requests'] for node in stats['nodes'].values()), 1)
+        self.assertTrue(all(node['healthy'] for node in stats['nodes'].values()))
+        self.assertEqual(stats['requests']['select']['requests'], 1)
+
+    def test_node_repr(self):
+        self.assertEqual(repr(SolrNode('http://solr1')), '<SolrNode http://solr1 healthy>')
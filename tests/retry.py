@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import RetryPolicy, Solr, SolrError
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    "Tests for RetryPolicy on its own."
+
+    def test_retryable(self):
+        policy = RetryPolicy(jitter=False)
+        self.assertEqual(policy.retry_delay('GET', 'select/?q=*:*', SolrError(code=503), 1), 0.1)
+        self.assertEqual(policy.retry_delay('POST', 'select/', SolrError(code=599), 2), 0.2)
+        self.assertEqual(policy.retries, 2)
+
+    def test_not_retryable(self):
+        policy = RetryPolicy()
+        # wrong status, or none at all
+        self.assertIsNone(policy.retry_delay('GET', 'select/', SolrError(code=400), 1))
+        self.assertIsNone(policy.retry_delay('GET', 'select/', SolrError(), 1))
+        # not idempotent
+        self.assertIsNone(policy.retry_delay('POST', 'update/', SolrError(code=503), 1))
+        # out of attempts
+        self.assertIsNone(policy.retry_delay('GET', 'select/', SolrError(code=503), 3))
+        self.assertEqual(policy.retries, 0)
+
+    def test_backoff(self):
+        policy = RetryPolicy(max_attempts=10, backoff=0.5, max_backoff=3.0, jitter=False)
+        delays = [policy.retry_delay('GET', 'select/', SolrError(code=503), i) for i in range(1, 6)]
+        self.assertEqual(delays, [0.5, 1.0, 2.0, 3.0, 3.0])
+
+        policy.jitter = True
+        for _ in range(5):
+            self.assertTrue(0 <= policy.retry_delay('GET', 'select/', SolrError(code=503), 3) <= 2.0)
+
+    def test_budget(self):
+        "After the budget runs out, each request earns a fraction of a retry."
+        policy = RetryPolicy(budget=0.5, max_budget=2)
+        error = SolrError(code=503)
+        self.assertIsNotNone(policy.retry_delay('GET', 'select/', error, 1))
+        self.assertIsNotNone(policy.retry_delay('GET', 'select/', error, 1))
+        self.assertIsNone(policy.retry_delay('GET', 'select/', error, 1))
+        policy.record_request()
+        self.assertIsNone(policy.retry_delay('GET', 'select/', error, 1))
+        policy.record_request()
+        self.assertIsNotNone(policy.retry_delay('GET', 'select/', error, 1))
+        self.assertEqual(policy.stats(), {'retries': 3, 'exhausted': 2, 'budget': 0.0})
+
+
+class SolrRetryTestCase(testing.AsyncTestCase):
+    "Tests for retries in Solr._send_request(), with a mock HTTP client that fails on cue."
+
+    def setUp(self):
+        super(SolrRetryTestCase, self).setUp()
+        self.failures = []  # status codes for the next requests, before they succeed
+        self.fetched = 0
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop,
+                         retry_policy=RetryPolicy(backoff=0.001))
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched += 1
+            if self.failures:
+                code = self.failures.pop(0)
+                if code == 599:
+                    # like a timeout: there's no response
+                    raise httpclient.HTTPError(599, 'Timeout')
+                raise httpclient.HTTPError(code, response=httpclient.HTTPResponse(request, code))
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(b'{"response":{"numFound":0,"docs":[]}}'))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_retries(self):
+        self.failures = [599, 503]
+        results = yield self.solr.search('*:*')
+        self.assertEqual(results.hits, 0)
+        self.assertEqual(self.fetched, 3)
+        self.assertEqual(self.solr.retry_policy.retries, 2)
+
+    @testing.gen_test
+    def test_gives_up(self):
+        self.failures = [503, 503, 503, 503]
+        with self.assertRaises(SolrError) as cm:
+            yield self.solr.search('*:*')
+        self.assertEqual(cm.exception.code, 503)
+        self.assertEqual(self.fetched, 3)
+
+    @testing.gen_test
+    def test_no_retry_for_updates(self):
+        self.failures = [503]
+        with self.assertRaises(SolrError):
+            yield self.solr.add([{'id': 'doc_1'}])
+        self.assertEqual(self.fetched, 1)
+
+    @testing.gen_test
+    def test_no_policy(self):
+        "Without a policy nothing is retried, and a missing response doesn't crash the error handling."
+        self.solr.retry_policy = None
+        self.failures = [599]
+        with self.assertRaises(SolrError) as cm:
+            yield self.solr.search('*:*')
+        self.assertEqual(cm.exception.args[0], '599: Timeout')
+        self.assertEqual(cm.exception.code, 599)
+        self.assertEqual(self.fetched, 1)
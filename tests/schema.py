@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from io import BytesIO
+import json
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import SchemaConverter, Solr, _parse_datetime
+
+
+UTC = datetime.timezone.utc
+
+FIELD_TYPES = [
+    {'name': 'string', 'class': 'solr.StrField'},
+    {'name': 'strings', 'class': 'solr.StrField', 'multiValued': True},
+    {'name': 'pint', 'class': 'solr.IntPointField'},
+    {'name': 'plong', 'class': 'solr.LongPointField'},
+    {'name': 'pdouble', 'class': 'solr.DoublePointField'},
+    {'name': 'tfloat', 'class': 'solr.TrieFloatField'},
+    {'name': 'boolean', 'class': 'solr.BoolField'},
+    {'name': 'pdate', 'class': 'solr.DatePointField'},
+    {'name': 'pdates', 'class': 'solr.DatePointField', 'multiValued': True},
+]
+FIELDS = [
+    {'name': 'id', 'type': 'string'},
+    {'name': 'zip_code', 'type': 'string'},
+    {'name': 'popularity', 'type': 'pint'},
+    {'name': 'price', 'type': 'pdouble'},
+    {'name': 'in_stock', 'type': 'boolean'},
+    {'name': 'pub_date', 'type': 'pdate'},
+    {'name': 'editions', 'type': 'pdates'},
+    {'name': 'ratings', 'type': 'pint', 'multiValued': True},
+    {'name': '_version_', 'type': 'plong'},
+]
+DYNAMIC_FIELDS = [
+    {'name': '*_i', 'type': 'pint'},
+    {'name': '*_is', 'type': 'pint', 'multiValued': True},
+    {'name': '*_dt', 'type': 'pdate'},
+    {'name': 'attr_*', 'type': 'strings'},
+    {'name': 'attr_n_*', 'type': 'tfloat'},
+]
+
+
+class ParseDatetimeTestCase(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(_parse_datetime('2013-01-18T00:30:28Z'), datetime.datetime(2013, 1, 18, 0, 30, 28, tzinfo=UTC))
+        self.assertEqual(_parse_datetime('2013-01-18T00:30:28.5Z'),
+                         datetime.datetime(2013, 1, 18, 0, 30, 28, 500000, tzinfo=UTC))
+        self.assertEqual(_parse_datetime('2013-01-18T00:30:28.123456789Z'),
+                         datetime.datetime(2013, 1, 18, 0, 30, 28, 123456, tzinfo=UTC))
+
+    def test_not_dates(self):
+        for value in ('', '2013-01-18', 'not a date at all Z', '2013-01-18T00:30:28+01:00', '2013-13-18T00:30:28Z',
+                      '-0001-01-01T00:00:00Z'):
+            self.assertEqual(_parse_datetime(value), value)
+
+
+class SchemaConverterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.schema = SchemaConverter(FIELDS, FIELD_TYPES, DYNAMIC_FIELDS)
+
+    def test_convert_docs(self):
+        docs = [{
+            'id': '123',
+            'zip_code': '01234',
+            'popularity': 7,
+            'price': '1.5',
+            'in_stock': 'true',
+            'pub_date': '2016-01-02T03:04:05.678Z',
+            'editions': ['2016-01-02T03:04:05Z', '2017-01-02T03:04:05Z'],
+            'ratings': ['4', 5],
+            '_version_': 1553249817438027776,
+            'score': 1.25,
+        }]
+        self.schema.convert_docs(docs)
+        self.assertEqual(docs, [{
+            'id': '123',
+            'zip_code': '01234',
+            'popularity': 7,
+            'price': 1.5,
+            'in_stock': True,
+            'pub_date': datetime.datetime(2016, 1, 2, 3, 4, 5, 678000, tzinfo=UTC),
+            'editions': [datetime.datetime(2016, 1, 2, 3, 4, 5, tzinfo=UTC),
+                         datetime.datetime(2017, 1, 2, 3, 4, 5, tzinfo=UTC)],
+            'ratings': [4, 5],
+            '_version_': 1553249817438027776,
+            'score': 1.25,
+        }])
+
+        # converting again changes nothing
+        before = dict(docs[0])
+        self.schema.convert_docs(docs)
+        self.assertEqual(docs[0], before)
+
+    def test_dynamic_fields(self):
+        self.assertEqual(self.schema.convert_value('year_i', '1999'), 1999)
+        self.assertEqual(self.schema.convert_value('years_is', ['1999', '2000']), [1999, 2000])
+        self.assertEqual(self.schema.convert_value('seen_dt', '2016-01-02T03:04:05Z'),
+                         datetime.datetime(2016, 1, 2, 3, 4, 5, tzinfo=UTC))
+        # the longest pattern wins
+        self.assertEqual(self.schema.convert_value('attr_n_weight', '2.5'), 2.5)
+        self.assertEqual(self.schema.convert_value('attr_colour', ['1', '2']), ['1', '2'])
+        self.assertIsNone(self.schema.converter('unknown'))
+
+    def test_multi_valued(self):
+        self.assertTrue(self.schema.multi_valued('ratings'))
+        self.assertTrue(self.schema.multi_valued('editions'))
+        self.assertFalse(self.schema.multi_valued('price'))
+        self.assertTrue(self.schema.multi_valued('years_is'))
+        self.assertTrue(self.schema.multi_valued('attr_colour'))
+        self.assertFalse(self.schema.multi_valued('attr_n_weight'))
+        self.assertFalse(self.schema.multi_valued('unknown'))
+
+    def test_convert_response(self):
+        decoded = {'response': {'docs': [{'popularity': '3'}]}}
+        self.schema.convert_response(decoded)
+        self.assertEqual(decoded['response']['docs'], [{'popularity': 3}])
+        self.schema.convert_response({'terms': {}})
+
+
+class LoadSchemaTestCase(testing.AsyncTestCase):
+    "Tests for Solr.load_schema(), with a mock HTTP client that serves the Schema API."
+
+    def setUp(self):
+        super(LoadSchemaTestCase, self).setUp()
+        self.fetched = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            self.fetched.append(request.url)
+            yield gen.moment
+            if '/schema/fields' in request.url:
+                body = {'fields': FIELDS}
+            elif '/schema/fieldtypes' in request.url:
+                body = {'fieldTypes': FIELD_TYPES}
+            elif '/schema/dynamicfields' in request.url:
+                body = {'dynamicFields': DYNAMIC_FIELDS}
+            else:
+                body = {'response': {'numFound': 1, 'docs': [{'id': '123', 'pub_date': '2016-01-02T03:04:05Z',
+                                                              'year_i': 2016}]}}
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(json.dumps(body).encode('utf-8')))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_load_schema(self):
+        results = yield self.solr.search('id:123')
+        self.assertEqual(results.docs[0]['pub_date'], '2016-01-02T03:04:05Z')
+
+        schema = yield self.solr.load_schema()
+        self.assertIs(schema, self.solr.schema)
+        self.assertEqual(len(self.fetched), 4)
+
+        results = yield self.solr.search('id:123')
+        self.assertEqual(results.docs, [{'id': '123', 'pub_date': datetime.datetime(2016, 1, 2, 3, 4, 5, tzinfo=UTC),
+                                         'year_i': 2016}])
+        self.assertEqual(self.solr._to_python('123', field='id'), '123')
+        self.assertEqual(self.solr._to_python('123'), 123)
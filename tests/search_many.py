@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import json
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import Results, Solr, SolrError
+
+try:
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from urlparse import parse_qs, urlsplit
+
+
+class SearchManyTestCase(testing.AsyncTestCase):
+    """
+    Tests for Solr.search_many(), with a mock HTTP client. The query "slow" takes a second, "error"
+    fails, and every other query takes a moment.
+    """
+
+    def setUp(self):
+        super(SearchManyTestCase, self).setUp()
+        self.running = 0
+        self.most_running = 0
+        self.finished = []
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+
+        @gen.coroutine
+        def mock_fetch(request):
+            params = parse_qs(urlsplit(request.url).query)
+            q = params['q'][0]
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+            try:
+                yield gen.sleep(1 if q == 'slow' else 0.01)
+            finally:
+                self.running -= 1
+            self.finished.append(q)
+            if q == 'error':
+                raise httpclient.HTTPError(500, response=httpclient.HTTPResponse(request, 500))
+            body = {'response': {'numFound': int(params.get('rows', ['0'])[0]), 'docs': [{'id': q}]}}
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(json.dumps(body).encode('utf-8')))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_search_many(self):
+        results = yield self.solr.search_many(['a', ('b', {'rows': 5}), 'error', ('c', {})])
+        self.assertEqual(len(results), 4)
+        self.assertIsInstance(results[0], Results)
+        self.assertEqual([results[i].docs[0]['id'] for i in (0, 1, 3)], ['a', 'b', 'c'])
+        self.assertEqual(results[1].hits, 5)
+        self.assertIsInstance(results[2], SolrError)
+        self.assertEqual(results[2].code, 500)
+
+    @testing.gen_test
+    def test_concurrency(self):
+        results = yield self.solr.search_many([str(i) for i in range(10)], concurrency=3)
+        self.assertEqual([result.docs[0]['id'] for result in results], [str(i) for i in range(10)])
+        self.assertEqual(self.most_running, 3)
+
+        self.most_running = 0
+        yield self.solr.search_many([str(i) for i in range(20)])
+        self.assertEqual(self.most_running, 10)
+
+    @testing.gen_test
+    def test_deadline(self):
+        "Queries still running at the deadline fail, and queries still waiting never start."
+        results = yield self.solr.search_many(['slow', 'a', 'slow', 'b'], concurrency=3, deadline=0.2)
+        self.assertEqual([type(result) for result in results], [SolrError, Results, SolrError, Results])
+        self.assertIn('deadline', str(results[0]))
+
+        results = yield self.solr.search_many(['slow', 'slow', 'never'], concurrency=2, deadline=0.1)
+        self.assertTrue(all(isinstance(result, SolrError) for result in results))
+        self.assertNotIn('never', self.finished)
+
+    @testing.gen_test
+    def test_empty(self):
+        results = yield self.solr.search_many([])
+        self.assertEqual(results, [])
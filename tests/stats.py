@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import BytesIO
+import json
+import unittest
+
+from tornado import gen, httpclient, testing
+
+from pysolrtornado import LatencyHistogram, RequestRecord, RequestStats, ResponseCache, Solr, SolrError
+
+
+BODY = json.dumps({'responseHeader': {'status': 0, 'QTime': 12},
+                   'response': {'numFound': 1, 'start': 0, 'docs': [{'id': 'doc_1'}]}}).encode('utf-8')
+
+
+def make_record(handler='select', total_time=0.01, **kwargs):
+    "A RequestRecord for a finished request."
+    record = RequestRecord(handler, 'GET')
+    record.total_time = total_time
+    for name, value in kwargs.items():
+        setattr(record, name, value)
+    return record
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+    "Tests for LatencyHistogram."
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 0)
+        self.assertIsNone(snapshot['mean'])
+        self.assertIsNone(snapshot['p99'])
+
+    def test_percentiles(self):
+        "Percentiles are within a bucket of the exact value, and never more than the maximum."
+        histogram = LatencyHistogram()
+        for millis in range(1, 1001):
+            histogram.record(millis / 1000.0)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.sum, 500.5)
+        self.assertEqual(histogram.max, 1.0)
+        for percent, exact in ((50, 0.5), (90, 0.9), (99, 0.99)):
+            estimate = histogram.percentile(percent)
+            self.assertGreaterEqual(estimate, exact)
+            self.assertLessEqual(estimate, exact * 1.2)
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_bounds(self):
+        "Times at a bound go in its bucket, and times past the last bound go in the last bucket."
+        histogram = LatencyHistogram()
+        histogram.record(0.0)
+        histogram.record(LatencyHistogram.BOUNDS[4])
+        histogram.record(1000.0)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[4], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(100), 1000.0)
+
+
+class RequestStatsTestCase(unittest.TestCase):
+    "Tests for RequestStats."
+
+    def setUp(self):
+        self.stats = RequestStats()
+        self.stats(make_record(total_time=0.02, qtime=12, bytes_received=300, decode_time=0.001))
+        self.stats(make_record(total_time=0.5, error='HTTPError', status=503, attempts=3))
+        self.stats(make_record('update', total_time=0.1, bytes_sent=2000, hedged=True))
+
+    def test_snapshot(self):
+        snapshot = self.stats.snapshot()
+        self.assertEqual(sorted(snapshot), ['select', 'update'])
+        select = snapshot['select']
+        self.assertEqual(select['requests'], 2)
+        self.assertGreater(select['throughput'], 0)
+        self.assertEqual(select['errors'], {'HTTPError': 1})
+        self.assertEqual(select['retries'], 2)
+        self.assertEqual(select['bytes_received'], 300)
+        self.assertEqual(select['decode_seconds'], 0.001)
+        self.assertEqual(select['latency']['count'], 2)
+        self.assertEqual(select['latency']['max'], 0.5)
+        self.assertEqual(select['qtime']['count'], 1)
+        self.assertEqual(select['qtime']['max'], 0.012)
+        update = snapshot['update']
+        self.assertEqual(update['bytes_sent'], 2000)
+        self.assertEqual(update['hedged'], 1)
+        self.assertEqual(update['errors'], {})
+        json.dumps(snapshot)
+
+    def test_reset(self):
+        self.stats.reset()
+        self.assertEqual(self.stats.snapshot(), {})
+
+    def test_render_prometheus(self):
+        lines = self.stats.render_prometheus(prefix='solr', labels={'core': 'a"b'})
+        self.assertIn('# TYPE solr_request_duration_seconds histogram', lines)
+        self.assertIn('solr_request_duration_seconds_bucket{core="a\\"b",handler="select",le="0.016"} 0', lines)
+        self.assertIn('solr_request_duration_seconds_bucket{core="a\\"b",handler="select",le="0.032"} 1', lines)
+        self.assertIn('solr_request_duration_seconds_bucket{core="a\\"b",handler="select",le="+Inf"} 2', lines)
+        self.assertIn('solr_request_duration_seconds_count{core="a\\"b",handler="select"} 2', lines)
+        self.assertIn('solr_request_retries_total{core="a\\"b",handler="select"} 2', lines)
+        self.assertIn('solr_request_errors_total{core="a\\"b",error="HTTPError",handler="select"} 1', lines)
+        self.assertIn('solr_request_bytes_sent_total{core="a\\"b",handler="update"} 2000', lines)
+
+
+class SolrStatsTestCase(testing.AsyncTestCase):
+    "Tests for Solr.stats() and Solr.render_prometheus() with collect_stats, and a mock HTTP client."
+
+    def setUp(self):
+        super(SolrStatsTestCase, self).setUp()
+        self.solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop, collect_stats=True,
+                         cache=ResponseCache())
+        self.fail = False
+
+        @gen.coroutine
+        def mock_fetch(request):
+            yield gen.moment
+            if self.fail:
+                raise httpclient.HTTPError(500, response=httpclient.HTTPResponse(request, 500))
+            return httpclient.HTTPResponse(request, 200, buffer=BytesIO(BODY))
+
+        self.solr._client.fetch = mock_fetch
+
+    @testing.gen_test
+    def test_stats(self):
+        yield self.solr.search('a')
+        yield self.solr.search('a')  # from the cache
+        self.fail = True
+        with self.assertRaises(SolrError):
+            yield self.solr.search('b')
+
+        stats = self.solr.stats()
+        self.assertEqual(stats['requests']['select']['requests'], 2)
+        self.assertEqual(stats['requests']['select']['errors'], {httpclient.HTTPError.__name__: 1})
+        self.assertEqual(stats['requests']['select']['qtime']['max'], 0.012)
+        self.assertEqual(stats['cache']['hits'], 1)
+        self.assertEqual(stats['pool']['active'], 0)
+        self.assertNotIn('retries', stats)
+        self.assertNotIn('compression', stats)
+
+    @testing.gen_test
+    def test_render_prometheus(self):
+        yield self.solr.search('a')
+        text = self.solr.render_prometheus(labels={'collection': 'collection1'})
+        self.assertTrue(text.endswith('\n'))
+        lines = text.splitlines()
+        self.assertIn('pysolrtornado_request_duration_seconds_count{collection="collection1",handler="select"} 1',
+                      lines)
+        self.assertIn('pysolrtornado_pool_active{collection="collection1"} 0', lines)
+        self.assertIn('# TYPE pysolrtornado_cache_misses_total counter', lines)
+        self.assertIn('pysolrtornado_cache_misses_total{collection="collection1"} 1', lines)
+
+    def test_disabled(self):
+        "Without collect_stats, there are no request statistics and no observer."
+        solr = Solr('http://localhost:8983/solr/collection1', ioloop=self.io_loop)
+        self.assertIsNone(solr.request_stats)
+        self.assertEqual(solr._observers, [])
+        self.assertEqual(sorted(solr.stats()), ['pool'])
+        self.assertNotIn('request_duration_seconds', solr.render_prometheus())